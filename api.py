@@ -1,30 +1,229 @@
-import requests
-from flask import Blueprint, jsonify, request
+import json
+from flask import Blueprint, Response, jsonify, request, stream_with_context, \
+    url_for
+from data_management.BulkImport import parse_titles
+from data_management.CollectionQuery import CollectionQuery
+from data_management.OMDbClient import omdb_client
+from data_management.SQLDataManager import LEADERBOARD_COLUMNS, \
+    LEADERBOARD_SIZE, LIST_COLUMNS, bulk_add_movies, collection_page, \
+    find_movie, iter_users, most_favorited_movies, movie_fields, \
+    rating_stats, search_movies, search_users, top_rated_movies, users_page
 from data_management.SQL_Data_Models import db, Movies, UserMovies, User
+from response_cache import USERS_TAG, response_cache, user_tag
 
-# OMDB API to get movie data
-API: str = 'http://www.omdbapi.com/?apikey=6f0c3bf6&t='
+# Largest number of titles accepted by one bulk import request
+MAX_BULK_TITLES = 1000
+# Concurrent OMDb lookups of one bulk import
+DEFAULT_BULK_WORKERS = 8
+MAX_BULK_WORKERS = 16
+
+# Longest leaderboard served
+MAX_LEADERBOARD_SIZE = 100
+
+# Page sizes for the paginated user listings
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
 api = Blueprint('api', __name__)
 
 
+def page_args(args, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """
+    Read the keyset pagination parameters ?after=<id>&limit=<n>.
+    Returns:
+        tuple: (after cursor or None, limit clamped to 1..maximum).
+    Raises:
+        ValueError: If after or limit is not an integer.
+    """
+    after = args.get('after')
+    after = int(after) if after not in (None, '') else None
+    limit = int(args.get('limit', default))
+    return after, max(1, min(limit, maximum))
+
+
+def bulk_workers(value):
+    """
+    Read the max_workers of a bulk import, from JSON or a form field.
+    Returns:
+        int: The number of workers, clamped to 1..MAX_BULK_WORKERS.
+    Raises:
+        ValueError: If value is not a positive integer.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"Invalid max_workers: {value!r}")
+    workers = int(value)
+    if workers < 1:
+        raise ValueError(f"Invalid max_workers: {value!r}")
+    return min(workers, MAX_BULK_WORKERS)
+
+
 @api.route('/users', methods=['GET'])
+@response_cache.cached(lambda: [USERS_TAG])
 def get_users():
-    users = User.query.all()
-    user_list = [user.to_dict() for user in users]
-    return jsonify(user_list)
+    """
+    List users one page at a time, ordered by id.
+    Query parameters: after (cursor from the previous page) and limit.
+    The next page is advertised in the Link and X-Next-Cursor headers.
+    """
+    try:
+        after, limit = page_args(request.args)
+    except ValueError:
+        return jsonify({"message": "after and limit must be integers."}), 400
+    users, next_cursor = users_page(after, limit)
+    response = jsonify([user.to_dict() for user in users])
+    if next_cursor is not None:
+        next_url = url_for('api.get_users', after=next_cursor, limit=limit)
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
+
+
+@api.route('/users/export', methods=['GET'])
+def export_users():
+    """
+    Stream every user as JSON lines (one object per line). Users are read
+    in keyset batches, so the full list is never held in memory.
+    """
+    def generate():
+        for user in iter_users():
+            yield json.dumps(user) + '\n'
+
+    return Response(stream_with_context(generate()),
+                    mimetype='application/x-ndjson')
+
+
+def search_args(args):
+    """
+    Read the search parameters ?q=<text>&limit=<n>&offset=<n>.
+    Returns:
+        tuple: (query text, limit clamped to 1..MAX_PAGE_SIZE, offset).
+    Raises:
+        ValueError: If limit or offset is not an integer.
+    """
+    limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    offset = int(args.get('offset', 0))
+    return (args.get('q', '').strip(), max(1, min(limit, MAX_PAGE_SIZE)),
+            max(0, offset))
+
+
+@api.route('/search/<scope>', methods=['GET'])
+def search(scope):
+    """
+    Ranked full-text search with prefix matching.
+    scope is "movies" (title, director, actors, genre, plot and reviews;
+    ?user_id= limits it to one collection) or "users" (name, email).
+    Returns {"results": [...], "next_offset": n or null}.
+    """
+    try:
+        query, limit, offset = search_args(request.args)
+        user_id = request.args.get('user_id', type=int)
+    except ValueError:
+        return jsonify({"message": "limit and offset must be integers."}), 400
+    if scope == 'movies':
+        results, next_offset = search_movies(query, user_id, limit, offset)
+    elif scope == 'users':
+        results, next_offset = search_users(query, limit, offset)
+    else:
+        return jsonify({"message": "Unknown search scope."}), 404
+    return jsonify({"results": [result.to_dict() for result in results],
+                    "next_offset": next_offset})
+
+
+def leaderboard_entry(movie, **values):
+    entry = {column: getattr(movie, column) for column in LEADERBOARD_COLUMNS}
+    entry.update(values)
+    return entry
+
+
+@api.route('/movies/top-rated', methods=['GET'])
+def top_rated():
+    """
+    Movies with the highest average user rating, from the precomputed
+    aggregates. Query parameters: limit and min_ratings (default 1).
+    """
+    try:
+        limit = int(request.args.get('limit', LEADERBOARD_SIZE))
+        min_ratings = int(request.args.get('min_ratings', 1))
+    except ValueError:
+        return jsonify({"message": "limit and min_ratings must be "
+                                   "integers."}), 400
+    rows = top_rated_movies(max(1, min(limit, MAX_LEADERBOARD_SIZE)),
+                            min_ratings)
+    return jsonify([leaderboard_entry(movie,
+                                      average_rating=round(
+                                          stats.average_rating, 2),
+                                      rating_count=stats.rating_count)
+                    for movie, stats in rows])
+
+
+@api.route('/movies/most-favorited', methods=['GET'])
+def most_favorited():
+    """
+    Movies in the most collections, from the precomputed favorite counts.
+    Query parameter: limit.
+    """
+    try:
+        limit = int(request.args.get('limit', LEADERBOARD_SIZE))
+    except ValueError:
+        return jsonify({"message": "limit must be an integer."}), 400
+    rows = most_favorited_movies(max(1, min(limit, MAX_LEADERBOARD_SIZE)))
+    return jsonify([leaderboard_entry(movie, favorite_count=count)
+                    for movie, count in rows])
+
+
+@api.route('/movies/<int:movie_id>/ratings', methods=['GET'])
+def movie_ratings(movie_id):
+    """
+    A movie's rating count, sum, average and histogram (bucket 0..10).
+    """
+    stats = rating_stats(movie_id)
+    if stats is None:
+        return jsonify({"message": "No ratings for this movie."}), 404
+    return jsonify(stats)
 
 
 @api.route('/users/<user_id>/movies', methods=['GET'])
+@response_cache.cached(lambda user_id: [user_tag(user_id)])
 def user_favorite_movies(user_id):
-    # Retrieve all movies associated with the user
-    user_favorite_movies = db.session.query(UserMovies, Movies). \
-        join(Movies, UserMovies.movie_id == Movies.movie_id). \
-        filter(UserMovies.user_id == user_id).all()
+    """
+    One page of a user's movies.
+    Query parameters: sort (added, title, year, rating), order (asc, desc),
+    genre, year_from, year_to, min_rating, after (cursor), limit, and
+    fields: a comma separated list of movie fields, or "all". By default
+    only the fields shown in lists are loaded and returned.
+    The next page is advertised in the Link and X-Next-Cursor headers.
+    """
+    try:
+        query = CollectionQuery.from_args(request.args)
+    except ValueError as error:
+        return jsonify({"message": str(error)}), 400
+    fields = request.args.get('fields')
+    if fields == 'all':
+        columns = None
+    elif fields:
+        columns = tuple(field.strip() for field in fields.split(','))
+        unknown = set(columns) - set(Movies.__table__.columns.keys())
+        if unknown:
+            return jsonify({"message": f"Unknown fields: "
+                                       f"{', '.join(sorted(unknown))}"}), 400
+        columns = tuple(dict.fromkeys(('movie_id',) + columns))
+    else:
+        columns = LIST_COLUMNS
 
-    # Access the Movie object in the tuple
-    movie_list = [movie[1].to_dict() for movie in user_favorite_movies]
-    return jsonify(movie_list)
+    rows, next_cursor = collection_page(user_id, query, columns)
+    if columns is None:
+        movie_list = [movie.to_dict() for _, movie in rows]
+    else:
+        movie_list = [{column: getattr(movie, column) for column in columns}
+                      for _, movie in rows]
+    response = jsonify(movie_list)
+    if next_cursor is not None:
+        next_url = url_for('api.user_favorite_movies', user_id=user_id,
+                           after=next_cursor, fields=fields,
+                           **query.args())
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
 
 
 @api.route('/users/<user_id>/movies', methods=['POST'])
@@ -35,45 +234,80 @@ def add_movie_to_user(user_id):
     # Check if the movie exists in the Movies table
     existing_movie = Movies.query.filter_by(title=movie_title).first()
 
-    if existing_movie:
-        # Movie exists in the Movies table, add a new UserMovies row
-        new_user_movie = UserMovies(
-            user_id=user_id, movie_id=existing_movie.movie_id, note="")
-        db.session.add(new_user_movie)
-        db.session.commit()
-    else:
-        # Movie doesn't exist, fetch data from OMDB API
-        omdb_url = API + movie_title
-        response = requests.get(omdb_url)
-        if response.status_code == 200:
-            movie_dict_data = response.json()
-
+    if not existing_movie:
+        # Movie doesn't exist under this title, fetch data from OMDB API
+        movie_dict_data = omdb_client.fetch_movie(movie_title)
+        if movie_dict_data['Response'] == 'False':
+            return jsonify({"message": "Movie not found!"}), 404
+        # It may already be stored under its canonical title or imdbID
+        existing_movie = find_movie(movie_dict_data)
+        if not existing_movie:
             # Create a new Movie entry
-            new_movie = Movies(
-                title=movie_dict_data['Title'],
-                year=movie_dict_data['Year'],
-                rating=movie_dict_data['imdbRating'],
-                genre=movie_dict_data['Genre'],
-                director=movie_dict_data['Director'],
-                writer=movie_dict_data['Writer'],
-                actors=movie_dict_data['Actors'],
-                plot=movie_dict_data['Plot'],
-                language=movie_dict_data['Language'],
-                country=movie_dict_data['Country'],
-                poster=movie_dict_data['Poster'],
-                _type=movie_dict_data['Type']
-            )
-
-            db.session.add(new_movie)
+            existing_movie = Movies(**movie_fields(movie_dict_data))
+            db.session.add(existing_movie)
             db.session.commit()
 
-            # Retrieve the movie_id after it's been added to the database
-            movie_id = new_movie.movie_id  # Assuming 'id' is the primary key of the Movies table
+    if UserMovies.query.filter_by(user_id=user_id,
+                                  movie_id=existing_movie.movie_id).first():
+        return jsonify({"message": "Movie already in the collection."})
 
-            # Add a new UserMovies row
-            new_user_movie = UserMovies(
-                user_id=user_id, movie_id=movie_id, note="")
-            db.session.add(new_user_movie)
-            db.session.commit()
+    # Add a new UserMovies row
+    new_user_movie = UserMovies(
+        user_id=user_id, movie_id=existing_movie.movie_id, note="")
+    db.session.add(new_user_movie)
+    db.session.commit()
+    response_cache.invalidate(user_tag(user_id))
 
     return jsonify({"message": "Movie added successfully."})
+
+
+@api.route('/users/<user_id>/movies/bulk', methods=['POST'])
+def bulk_add_movies_to_user(user_id):
+    """
+    Add many movies to a user's collection at once.
+    Accepts a JSON body {"titles": [...], "max_workers": 8} or a
+    multipart upload with a CSV/JSON/text file in the "file" field (and
+    an optional "max_workers" field); max_workers is capped at
+    MAX_BULK_WORKERS.
+    Returns a per-title report and a summary of the statuses.
+    """
+    if User.query.filter_by(id=user_id).first() is None:
+        return jsonify({"message": "User not found."}), 404
+
+    if 'file' in request.files:
+        upload = request.files['file']
+        try:
+            titles = parse_titles(upload.read().decode('utf-8'),
+                                  upload.filename or '')
+        except (UnicodeDecodeError, ValueError) as error:
+            return jsonify({"message": f"Invalid import file: {error}"}), 400
+        max_workers = request.form.get('max_workers', DEFAULT_BULK_WORKERS)
+    else:
+        payload = request.get_json(silent=True)
+        titles = payload.get('titles') if isinstance(payload, dict) else None
+        if not isinstance(titles, list) or \
+                not all(isinstance(title, str) for title in titles):
+            return jsonify({"message": "Expected a list of titles."}), 400
+        max_workers = payload.get('max_workers', DEFAULT_BULK_WORKERS)
+    try:
+        max_workers = bulk_workers(max_workers)
+    except ValueError:
+        return jsonify({"message": "max_workers must be a positive "
+                                   "integer."}), 400
+
+    if len(titles) > MAX_BULK_TITLES:
+        return jsonify({"message": f"At most {MAX_BULK_TITLES} titles "
+                                   f"per request."}), 413
+
+    results = bulk_add_movies(int(user_id), titles, max_workers)
+    response_cache.invalidate(user_tag(user_id))
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return jsonify({"results": results, "summary": summary})
+
+
+@api.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    # Hit ratio and counters of the response cache in this process
+    return jsonify(response_cache.stats())
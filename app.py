@@ -19,47 +19,84 @@ Imported Data Managers:
     managing JSON data.
     CSVDataManager: A class from 'data_management.CSVDataManager' for 
     managing CSV data.
+    BinaryDataManager: A class from 'data_management.BinaryDataManager' for
+    managing the compact binary (.mwb) data file.
 """
 import json
 import os
 import requests
 import sys
 from flask import Flask, redirect, render_template, request, url_for
-from flask_bcrypt import Bcrypt
 from data_management.JSONDataManager import JSONDataManager
 from data_management.CSVDataManager import CSVDataManager
+from data_management.BinaryDataManager import BinaryDataManager
 from data_management.SQLDataManager import SQLiteDataManager
+from data_management.CollectionQuery import CollectionQuery
 from data_management.SQL_Data_Models import db, User, UserMovies, Movies
-from api import api  # Importing the API blueprint
+from api import api, page_args, search_args  # Importing the API blueprint
+from instrumentation import instrumentation, timed
+from password_hashing import HasherBusy, password_hasher
+from response_cache import CacheInvalidatingDataManager, USERS_TAG, \
+    response_cache, user_tag
 
 app = Flask(__name__)
-bcrypt = Bcrypt(app)
 
 # Registering the blueprint
 app.register_blueprint(api, url_prefix='/api')
 
-# Use the appropriate path to your JSON, CSV or SQL file
+# Use the appropriate path to your JSON, CSV or SQL file, or set
+# MOVIWEB_DATA_FILE; the data manager is picked by the file extension
 
 # DATA_FILE_PATH = "user_data/users.json"
-# data_manager = JSONDataManager(DATA_FILE_PATH)
-
 # DATA_FILE_PATH = "user_data/users.csv"
-# data_manager = CSVDataManager(DATA_FILE_PATH)
+# DATA_FILE_PATH = "user_data/users.mwb"
+
+DATA_FILE_PATH = os.environ.get('MOVIWEB_DATA_FILE',
+                                os.path.abspath('user_data/user_movies.sqlite'))
+if DATA_FILE_PATH.lower().endswith('.json'):
+    data_manager = JSONDataManager(DATA_FILE_PATH, cached=True)
+elif DATA_FILE_PATH.lower().endswith('.csv'):
+    data_manager = CSVDataManager(DATA_FILE_PATH, indexed=True)
+elif DATA_FILE_PATH.lower().endswith('.mwb'):
+    data_manager = BinaryDataManager(DATA_FILE_PATH)
+else:
+    data_manager = SQLiteDataManager(app, DATA_FILE_PATH)
+
+# Opt-in metrics and profiling (MOVIWEB_METRICS=1); times every call
+data_manager = instrumentation.init_app(app, data_manager)
 
-DATA_FILE_PATH = os.path.abspath('user_data/user_movies.sqlite')
-data_manager = SQLiteDataManager(app, DATA_FILE_PATH)
+# Writes through the data manager invalidate the cached pages they affect
+data_manager = CacheInvalidatingDataManager(data_manager, response_cache)
 
 
+# bcrypt runs on the password_hasher process pool (MOVIWEB_HASH_WORKERS),
+# not on the request thread; both raise HasherBusy when its queue is full
+@timed('password_hash', 'bcrypt')
 def encrypt_password(password):
-    pw_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+    pw_hash = password_hasher.hash(password)
     return pw_hash
 
 
+@timed('password_check', 'bcrypt')
 def check_password(password, pw_hash):
-    password_is_match = bcrypt.check_password_hash(pw_hash, password)
+    password_is_match = password_hasher.check(password, pw_hash)
     return password_is_match
 
 
+@app.errorhandler(HasherBusy)
+def hasher_busy(e):
+    """
+    Error Handler: Password Hashing Queue Full
+    Sheds load during login spikes instead of queueing without bound.
+    Returns:
+        Rendered error template with a 503 status and a Retry-After header.
+    """
+    return render_template(
+        'error.html',
+        error_message="Too many sign-ins in progress, please try again in "
+                      "a moment."), 503, {'Retry-After': '1'}
+
+
 def is_item_in_dict(item, dictionary):
     """
     Check if an item is present in a dictionary.
@@ -87,66 +124,117 @@ def home():
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password')
-        users = data_manager.get_all_users()
-        if type(users) is dict:  # For JSON and CSV Data Model
-            for user_id, user_data in users.items():
-                if user_data["email"] == email:
-                    if check_password(password, user_data["password"]):
-                        return redirect(url_for('my_movies', user_id=user_id))
-        # For SQL Data Model
-        user = User.query.filter_by(email=email).first()
-        if check_password(password, user.password):
-            return redirect(url_for('my_movies', user_id=user.id))
+        user = data_manager.get_user_by_email(email)
+        if user and check_password(password, user["password"]):
+            # Move the stored hash to the configured cost factor
+            if password_hasher.needs_rehash(user["password"]):
+                try:
+                    data_manager.update_password(user["id"],
+                                                 encrypt_password(password))
+                except HasherBusy:
+                    pass  # Rehashed on a later login
+            return redirect(url_for('my_movies', user_id=user["id"]))
     return render_template('index.html')
 
 
 @app.route('/users')
+@response_cache.cached(lambda: [USERS_TAG])
 def list_users():
     """
     Route: List Users
-    Retrieves a list of users and renders the users template.
+    Retrieves one page of users (?after=<id>&limit=<n>) and renders the
+    users template with a link to the next page.
     Returns:
         Rendered HTML template with user data.
     """
-    users = data_manager.get_all_users()
-    return render_template('users.html', users=users)
+    try:
+        after, limit = page_args(request.args)
+    except ValueError:
+        after, limit = page_args({})
+    users, next_cursor = data_manager.get_users_page(after, limit)
+    return render_template('users.html', users=users,
+                           next_cursor=next_cursor, limit=limit)
+
+
+@app.route('/search')
+def search():
+    """
+    Route: Search
+    Ranked full-text search (?q=<text>&scope=movies|users&offset=<n>).
+    Movie searches can be limited to one collection with ?user_id=<id>.
+    Returns:
+        Rendered HTML template with one page of results.
+    """
+    try:
+        query, limit, offset = search_args(request.args)
+    except ValueError:
+        query, limit, offset = search_args({'q': request.args.get('q', '')})
+    scope = request.args.get('scope', 'movies')
+    user_id = request.args.get('user_id') or None
+    if scope == 'users':
+        results, next_offset = data_manager.search_users(query, limit, offset)
+    else:
+        scope = 'movies'
+        results, next_offset = data_manager.search_movies(
+            query, user_id, limit, offset)
+    return render_template('search.html', query=query, scope=scope,
+                           user_id=user_id, results=results,
+                           next_offset=next_offset, limit=limit)
 
 
 @app.route('/users/<user_id>')
+@response_cache.cached(lambda user_id: [user_tag(user_id)])
 def my_movies(user_id):
     """
     Route: User Movies
-    Retrieves movies for a specific user and renders the movies template.
+    Retrieves one page of a user's movies and renders the movies template.
+    Sorting, filters and the page cursor come from the query string
+    (sort, order, genre, year_from, year_to, min_rating, after, limit).
     Args:
         user_id (str): User ID.
     Returns:
         Rendered HTML template with user's movies.
     """
     try:
-        users = data_manager.get_all_users()
-        if type(users) is dict:
+        try:
+            query = CollectionQuery.from_args(request.args)
+        except ValueError:
+            query = CollectionQuery()
+        if DATA_FILE_PATH.lower().endswith(('.json', '.csv', '.mwb')):
+            users = data_manager.get_all_users()
             if is_item_in_dict(user_id, users):
                 user_name = users[user_id]["name"]
-                user_movies = data_manager.get_user_movies(user_id)
+                try:
+                    user_movies, next_cursor = \
+                        data_manager.get_collection_page(user_id, query)
+                except ValueError as error:
+                    # A filter this data manager cannot apply
+                    return render_template('error.html',
+                                           error_message=str(error)), 400
                 return render_template('movies.html', movies=user_movies,
                                        user_name=user_name,
-                                       user_id=user_id)
-            else:
-                return render_template('304.html')
-        movies, user = data_manager.get_user_movies(user_id)
+                                       user_id=user_id, query=query,
+                                       next_cursor=next_cursor)
+            # Not found, and errors below, are not cached (status != 200)
+            return render_template('304.html'), 404
+        user = User.query.filter_by(id=user_id).first()
+        if user is None:
+            return render_template('304.html'), 404
+        movies, next_cursor = data_manager.get_collection_page(user_id, query)
         return render_template('movies.html', movies=movies,
                                user_name=user.name,
-                               id=user_id)
+                               id=user_id, user_id=user_id, query=query,
+                               next_cursor=next_cursor)
     except Exception as error:
         # Handle the exception appropriately, e.g., logging, error message, etc.
-        return render_template('error.html', error_message=str(error))
+        return render_template('error.html', error_message=str(error)), 500
 
 
-if DATA_FILE_PATH.lower().endswith('.json'):
+if DATA_FILE_PATH.lower().endswith(('.json', '.mwb')):
     @app.route('/register', methods=['GET', 'POST'])
     def register():
         """
-        Route: Register (JSON)
+        Route: Register (JSON, binary)
         Handles user registration and rendering of registration form.
         Returns:
             "Registration successful!" upon successful POST request.
@@ -204,7 +292,7 @@ def add_movies(user_id):
     return render_template('add-movie.html', user_id=user_id)
 
 
-if DATA_FILE_PATH.lower().endswith('.json') or DATA_FILE_PATH.lower().endswith('.csv'):
+if DATA_FILE_PATH.lower().endswith(('.json', '.csv', '.mwb')):
     @app.route('/users/<user_id>/update_movie/<movie_id>', methods=['GET', 'POST'])
     def update_movies(user_id, movie_id):
         """
@@ -298,7 +386,7 @@ def delete_movie(user_id, movie_id):
             return "Movie not found", 405  # HTTP status code for Method
     except Exception as error:
         # Handle the exception appropriately, e.g., logging, error message, etc.
-        return render_template('error.html', error_message=str(error))
+        return render_template('error.html', error_message=str(error)), 500
 
 
 if DATA_FILE_PATH.lower().endswith('.sqlite'):
@@ -312,21 +400,25 @@ if DATA_FILE_PATH.lower().endswith('.sqlite'):
             return "Review submitted successfully"
 
         else:
-            movies, user = data_manager.get_user_movies(user_id)
-            for user_movie, movie in movies:
-                if user_movie.movie_id == int(movie_id):
-                    movie_title = movie.title
-                    movie_poster = movie.poster
-                    movie_plot = movie.plot
-                    # Replace with actual reviews retrieval
-                    previous_reviews = data_manager.get_reviews_for_movie(
-                        movie_id)
-
+            try:
+                after = int(request.args['after']) if request.args.get(
+                    'after') else None
+            except ValueError:
+                after = None
+            details = data_manager.get_movie_reviews(user_id, int(movie_id),
+                                                     after)
+            if details is None:
+                return render_template('404.html'), 404
+            movie = details['movie']
             return render_template('review.html', user_id=user_id,
-                                   movie_id=movie_id, movie_title=movie_title,
-                                   movie_poster=movie_poster,
-                                   movie_plot=movie_plot,
-                                   previous_reviews=previous_reviews)
+                                   movie_id=movie_id, movie_title=movie.title,
+                                   movie_poster=movie.poster,
+                                   movie_plot=movie.plot,
+                                   user_name=details['user_name'],
+                                   review_count=details['review_count'],
+                                   average_rating=details['average_rating'],
+                                   previous_reviews=details['reviews'],
+                                   next_cursor=details['next_cursor'])
 
 
 @app.errorhandler(404)
@@ -343,4 +435,5 @@ def page_not_found(e):
 
 
 if __name__ == '__main__':
+    password_hasher.start()
     app.run(host="0.0.0.0", port=5001, debug=True)
@@ -0,0 +1,133 @@
+"""
+ASGI serving mode.
+
+Serves the I/O-bound routes natively on an event loop and everything else
+through the Flask app:
+
+    POST /users/{user_id}/add_movie     add a movie (form field 'name')
+    POST /api/users/{user_id}/movies    add a movie (JSON 'movie_title')
+    GET  /api/users                     one page of users
+
+While a request waits for OMDb or the database it is only suspended, so a
+slow upstream no longer ties up a whole worker thread the way it does under
+a threaded WSGI server. SQLite is read and written through aiosqlite, the
+JSON and CSV data managers run on a thread pool, and OMDb is queried with
+httpx's async client; the response cache is shared with the Flask app.
+
+Requires (not needed for the WSGI app):
+    pip install starlette uvicorn httpx aiosqlite "sqlalchemy[asyncio]" a2wsgi \
+        python-multipart
+
+Usage:
+    uvicorn asgi:app --host 0.0.0.0 --port 5001 --workers 4
+"""
+import asyncio
+import contextlib
+import app as flask_app_module
+from api import page_args
+from data_management.AsyncDataManager import ThreadedAsyncDataManager
+from data_management.AsyncSQLDataManager import AsyncSQLiteDataManager
+from response_cache import response_cache, user_tag
+
+try:
+    from a2wsgi import WSGIMiddleware
+    from starlette.applications import Starlette
+    from starlette.responses import HTMLResponse, JSONResponse
+    from starlette.routing import Mount, Route
+except ImportError:
+    raise SystemExit("The ASGI serving mode needs: pip install starlette "
+                     "uvicorn httpx aiosqlite \"sqlalchemy[asyncio]\" a2wsgi "
+                     "python-multipart")
+
+DATA_FILE_PATH = flask_app_module.DATA_FILE_PATH
+IS_SQLITE = not DATA_FILE_PATH.lower().endswith(('.json', '.csv', '.mwb'))
+
+# The proxies of the Flask app's data manager (instrumentation, cache
+# invalidation) stay in place for the calls run on the thread pool
+if IS_SQLITE:
+    data_manager = AsyncSQLiteDataManager(
+        DATA_FILE_PATH, flask_app_module.data_manager, flask_app_module.app)
+else:
+    data_manager = ThreadedAsyncDataManager(flask_app_module.data_manager)
+
+
+async def invalidate(*tags):
+    # The cache backend may be Redis or a shared file; keep it off the loop
+    await asyncio.to_thread(response_cache.invalidate, *tags)
+
+
+async def add_movie(request):
+    """
+    Route: Add Movie (POST)
+    Same responses as the Flask add_movies route.
+    """
+    user_id = request.path_params['user_id']
+    form = await request.form()
+    result = await data_manager.add_movie(user_id, form.get('name'))
+    await invalidate(user_tag(user_id))
+    if result is False:
+        return HTMLResponse("Movie not found!")
+    return HTMLResponse("Movie has been added successfully!")
+
+
+# Messages of the API route for each AsyncSQLiteDataManager.add_movie result
+API_ADD_MOVIE_MESSAGES = {
+    "Movie not found!": ("Movie not found!", 404),
+    "Movie already exists in your collection.":
+        ("Movie already in the collection.", 200),
+}
+
+
+async def api_add_movie(request):
+    """
+    Route: POST /api/users/{user_id}/movies
+    Same responses as the Flask API's add_movie_to_user.
+    """
+    user_id = request.path_params['user_id']
+    movie_title = (await request.json()).get('movie_title')
+    result = await data_manager.add_movie(user_id, movie_title)
+    message, status = API_ADD_MOVIE_MESSAGES.get(
+        result, ("Movie added successfully.", 200))
+    if status == 200 and message != "Movie already in the collection.":
+        await invalidate(user_tag(user_id))
+    return JSONResponse({"message": message}, status_code=status)
+
+
+async def api_get_users(request):
+    """
+    Route: GET /api/users
+    One page of users, ordered by id, with the next page in the Link and
+    X-Next-Cursor headers.
+    """
+    try:
+        after, limit = page_args(request.query_params)
+    except ValueError:
+        return JSONResponse({"message": "after and limit must be integers."},
+                            status_code=400)
+    users, next_cursor = await data_manager.get_users_page(after, limit)
+    headers = {}
+    if next_cursor is not None:
+        next_url = f'/api/users?after={next_cursor}&limit={limit}'
+        headers['Link'] = f'<{next_url}>; rel="next"'
+        headers['X-Next-Cursor'] = str(next_cursor)
+    return JSONResponse([user.to_dict() for user in users], headers=headers)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await data_manager.close()
+
+
+routes = [Route('/users/{user_id}/add_movie', add_movie, methods=['POST'])]
+if IS_SQLITE:
+    # Like the Flask API blueprint, these need the SQLite backend
+    routes += [
+        Route('/api/users/{user_id}/movies', api_add_movie, methods=['POST']),
+        Route('/api/users', api_get_users, methods=['GET']),
+    ]
+# Everything else (templates, sessions, the rest of the API) is the Flask
+# app, run on a2wsgi's thread pool
+routes.append(Mount('/', app=WSGIMiddleware(flask_app_module.app)))
+
+app = Starlette(routes=routes, lifespan=lifespan)
@@ -0,0 +1,170 @@
+"""
+Benchmark: WSGI (gunicorn, threads) vs ASGI (uvicorn) under a slow OMDb.
+
+Starts a stub OMDb upstream that answers every lookup after --upstream-delay
+seconds, then serves the same SQLite dataset with
+`gunicorn --workers W --threads T app:app` and with
+`uvicorn asgi:app --workers W`. Concurrent clients add movies with unique
+titles (each one a cache miss, so an upstream round trip) mixed with
+GET /api/users reads. Reports throughput, p50/p99 latency and errors per
+operation for each server.
+
+Requires: pip install gunicorn starlette uvicorn httpx aiosqlite
+          "sqlalchemy[asyncio]" a2wsgi python-multipart
+
+Usage:
+    python benchmarks/bench_asgi.py --concurrency 200 --seconds 20 \\
+        --upstream-delay 0.5 --workers 2 --threads 8
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.datasets import Dataset  # noqa: E402
+from omdb_stub import OMDbStubServer  # noqa: E402
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+USERS = 1000
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1,
+                             int(len(ordered) * fraction))] * 1000, 1)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(base_url, process, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with {process.returncode}")
+        try:
+            httpx.get(base_url + 'api/users?limit=1', timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start")
+
+
+async def client_loop(client, deadline, titles, write_fraction, results):
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        if rng.random() < write_fraction:
+            operation = 'add_movie'
+            user_id = rng.randint(1, USERS)
+            request = client.post(f'/users/{user_id}/add_movie',
+                                  data={'name': next(titles)})
+        else:
+            operation = 'list_users'
+            request = client.get('/api/users?limit=20')
+        start = time.perf_counter()
+        try:
+            response = await request
+            failed = response.status_code >= 400
+        except httpx.HTTPError:
+            failed = True
+        latencies, errors = results[operation]
+        latencies.append(time.perf_counter() - start)
+        if failed:
+            errors.append(1)
+
+
+async def load(base_url, concurrency, seconds, write_fraction, label):
+    titles = (f'Bench {label} Movie {n}' for n in itertools.count())
+    results = {'add_movie': ([], []), 'list_users': ([], [])}
+    limits = httpx.Limits(max_connections=concurrency,
+                          max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits,
+                                 timeout=60.0) as client:
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(
+            client_loop(client, deadline, titles, write_fraction, results)
+            for _ in range(concurrency)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--concurrency', type=int, default=200,
+                        help='concurrent clients')
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--upstream-delay', type=float, default=0.5,
+                        help='seconds the stub OMDb takes per lookup')
+    parser.add_argument('--write-fraction', type=float, default=0.5,
+                        help='share of requests that add a movie')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='server processes')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='gunicorn threads per worker')
+    args = parser.parse_args()
+    if httpx is None:
+        raise SystemExit("This benchmark needs: pip install httpx")
+
+    servers = {
+        'gunicorn (WSGI)': ['gunicorn', '--workers', str(args.workers),
+                            '--threads', str(args.threads), '--bind',
+                            '127.0.0.1:{port}', 'app:app'],
+        'uvicorn (ASGI)': ['uvicorn', '--workers', str(args.workers),
+                           '--host', '127.0.0.1', '--port', '{port}',
+                           '--log-level', 'warning', 'asgi:app'],
+    }
+    upstream = OMDbStubServer(delay=args.upstream_delay, synthesize=True)
+    upstream.start()
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            print(f"{'':<18}{'operation':<12}{'req/s':>8}{'p50 ms':>9}"
+                  f"{'p99 ms':>9}{'errors':>8}")
+            for number, (label, command) in enumerate(servers.items()):
+                # A fresh copy of the dataset per server
+                db_file = os.path.join(work_dir, f'users{number}.sqlite')
+                Dataset(USERS, movies_per_user=5).write_sqlite(db_file)
+                port = free_port()
+                env = dict(os.environ, MOVIWEB_DATA_FILE=db_file,
+                           RESPONSE_CACHE='off', OMDB_API_URL=upstream.url,
+                           OMDB_CACHE_PATH='')
+                process = subprocess.Popen(
+                    [part.format(port=port) for part in command], cwd=ROOT,
+                    env=env)
+                base_url = f'http://127.0.0.1:{port}/'
+                try:
+                    wait_until_ready(base_url, process)
+                    results = asyncio.run(load(
+                        base_url, args.concurrency, args.seconds,
+                        args.write_fraction, label.split()[0]))
+                finally:
+                    process.terminate()
+                    process.wait()
+                for operation, (latencies, errors) in results.items():
+                    print(f"{label:<18}{operation:<12}"
+                          f"{len(latencies) / args.seconds:>8.1f}"
+                          f"{percentile(latencies, 0.5)!s:>9}"
+                          f"{percentile(latencies, 0.99)!s:>9}"
+                          f"{len(errors):>8}")
+    finally:
+        upstream.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: the binary data file against users.json and users.csv.
+
+Writes the same synthetic users as users.json (indent=4, cached and journal
+modes), users.csv (indexed mode) and users.mwb, then reports per format the
+file size, the time to the first answer from a fresh data manager (cold
+start: open plus get_user_movies), the `my_movies` route's read calls
+(get_all_users, looking the user up in it, get_user_movies) and
+update_movie.
+
+Usage:
+    python benchmarks/bench_binary.py --users 5000 --movies 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_json_cache import generate_users  # noqa: E402
+from data_management.BinaryDataManager import BinaryDataManager, MAGIC, \
+    encode_record  # noqa: E402
+from data_management.CSVDataManager import CSVDataManager, write_csv_file  # noqa: E402
+from data_management.JSONDataManager import JSONDataManager  # noqa: E402
+
+
+def write_files(users, tmp_dir):
+    # file name -> data manager factory
+    json_path = os.path.join(tmp_dir, 'users.json')
+    with open(json_path, 'w') as file:
+        json.dump(users, file, indent=4)
+    csv_path = os.path.join(tmp_dir, 'users.csv')
+    write_csv_file(csv_path, {user_id: {
+        **user, 'movies': {movie_id: {'note': '', **movie}
+                           for movie_id, movie in user['movies'].items()}}
+        for user_id, user in users.items()})
+    binary_path = os.path.join(tmp_dir, 'users.mwb')
+    with open(binary_path, 'wb') as file:
+        file.write(MAGIC)
+        for user_id, user in users.items():
+            file.write(encode_record(user_id, user))
+    return {
+        'json': (json_path, lambda: JSONDataManager(json_path, cached=True)),
+        'journal': (json_path, lambda: JSONDataManager(json_path,
+                                                       journal=True)),
+        'csv': (csv_path, lambda: CSVDataManager(csv_path, indexed=True)),
+        'binary': (binary_path, lambda: BinaryDataManager(binary_path)),
+    }
+
+
+def percentiles(latencies):
+    latencies.sort()
+    return {
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def time_reads(data_manager, user_ids, requests_count):
+    latencies = []
+    for _ in range(requests_count):
+        user_id = random.choice(user_ids)
+        start = time.perf_counter()
+        users = data_manager.get_all_users()
+        users[user_id]['name']
+        data_manager.get_user_movies(user_id)
+        latencies.append(time.perf_counter() - start)
+    return percentiles(latencies)
+
+
+def time_writes(data_manager, user_ids, writes_count):
+    # JSONDataManager.update_movie takes no note
+    note = () if isinstance(data_manager, JSONDataManager) else ('',)
+    latencies = []
+    for index in range(writes_count):
+        user_id = random.choice(user_ids)
+        start = time.perf_counter()
+        data_manager.update_movie(user_id, "1", f"Updated {index}",
+                                  "Director", 7.0, "2000", *note)
+        latencies.append(time.perf_counter() - start)
+    return percentiles(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--movies', type=int, default=20,
+                        help='movies per user')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--writes', type=int, default=100)
+    args = parser.parse_args()
+
+    users = generate_users(args.users, args.movies)
+    user_ids = list(users.keys())
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label, (path, factory) in write_files(users, tmp_dir).items():
+            start = time.perf_counter()
+            factory().get_user_movies(random.choice(user_ids))
+            cold_ms = (time.perf_counter() - start) * 1000
+
+            data_manager = factory()
+            data_manager.get_all_users()
+            size_mib = os.path.getsize(path) / 1024 / 1024
+            reads = time_reads(data_manager, user_ids, args.requests)
+            writes = time_writes(data_manager, user_ids, args.writes)
+            print(f"{label:>8}: {size_mib:.1f} MiB, cold start "
+                  f"{cold_ms:.1f} ms, reads mean {reads['mean_ms']:.3f} ms "
+                  f"p99 {reads['p99_ms']:.3f} ms, writes mean "
+                  f"{writes['mean_ms']:.3f} ms p99 {writes['p99_ms']:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
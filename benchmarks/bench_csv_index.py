@@ -0,0 +1,100 @@
+"""
+Benchmark: CSVDataManager full-rewrite path vs the indexed mode.
+
+Generates a synthetic users.csv (1M movie rows by default) and times
+get_user_movies, update_movie and add_user for a random user in both modes.
+The full path parses the whole file on every call and re-serializes it on
+every write; the indexed mode seeks to the user's rows through the
+<filename>.idx byte-offset index.
+
+Usage:
+    python benchmarks/bench_csv_index.py --rows 1000000 --movies 20
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_management.CSVDataManager import (CSVDataManager,  # noqa: E402
+                                            FIELD_NAMES, encode_csv_rows)
+
+
+def generate_csv(file_path, row_count, movies_per_user):
+    password = '$2b$12$' + 'x' * 53
+    user_count = row_count // movies_per_user
+    with open(file_path, 'wb') as file:
+        file.write(encode_csv_rows([], header=True))
+        for user_id in range(1, user_count + 1):
+            rows = [dict(zip(FIELD_NAMES, (
+                user_id, f'User {user_id}', f'user{user_id}@example.com',
+                password, movie_id, f'Movie {user_id}-{movie_id}',
+                f'Director {movie_id}', random.randint(1950, 2023),
+                round(random.uniform(1, 10), 1), '')))
+                for movie_id in range(1, movies_per_user + 1)]
+            file.write(encode_csv_rows(rows))
+    return user_count
+
+
+def time_call(function, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+    return sum(latencies) / len(latencies) * 1000
+
+
+def run(file_path, indexed, user_count, repeat):
+    data_manager = CSVDataManager(file_path, indexed=indexed)
+    if indexed:
+        start = time.perf_counter()
+        data_manager.get_user_movies('1')
+        print(f"  index build: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def read():
+        data_manager.get_user_movies(str(random.randint(1, user_count)))
+
+    def update():
+        user_id = str(random.randint(1, user_count))
+        data_manager.update_movie(user_id, '1', 'Updated', 'Director',
+                                  '7.0', '2000', 'note')
+
+    def add_user():
+        data_manager.add_user('New User', 'new@example.com', 'hash')
+
+    for label, function in (('get_user_movies', read),
+                            ('update_movie', update),
+                            ('add_user', add_user)):
+        print(f"  {label:>15}: {time_call(function, repeat):.2f} ms per call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--movies', type=int, default=20,
+                        help='movies per user')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='calls per operation and mode')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source_path = os.path.join(tmp_dir, 'source.csv')
+        user_count = generate_csv(source_path, args.rows, args.movies)
+        size_mb = os.path.getsize(source_path) / 1024 / 1024
+        print(f"users.csv: {args.rows} rows, {user_count} users, "
+              f"{size_mb:.1f} MB")
+
+        for label, indexed in (('full rewrite', False), ('indexed', True)):
+            file_path = os.path.join(tmp_dir, f'users-{label[0]}.csv')
+            shutil.copyfile(source_path, file_path)
+            print(f"{label}:")
+            run(file_path, indexed, user_count, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: JSONDataManager with and without the in-memory cache.
+
+Generates a synthetic users.json and times the read calls made by the
+`my_movies` route (get_all_users followed by get_user_movies) in the default
+mode, which parses the file on every call, and in cached mode, which only
+parses it again when the file changes.
+
+Usage:
+    python benchmarks/bench_json_cache.py --users 5000 --movies 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_management.JSONDataManager import JSONDataManager  # noqa: E402
+
+
+def generate_users(user_count, movies_per_user):
+    users = {}
+    for user_id in range(1, user_count + 1):
+        movies = {}
+        for movie_id in range(1, movies_per_user + 1):
+            movies[str(movie_id)] = {
+                'name': f'Movie {user_id}-{movie_id}',
+                'director': f'Director {movie_id}',
+                'rating': round(random.uniform(1, 10), 1),
+                'year': str(random.randint(1950, 2023))
+            }
+        users[str(user_id)] = {
+            'name': f'User {user_id}',
+            'email': f'user{user_id}@example.com',
+            'password': '$2b$12$' + 'x' * 53,
+            'movies': movies
+        }
+    return users
+
+
+def time_requests(data_manager, user_ids, requests_count):
+    latencies = []
+    for _ in range(requests_count):
+        user_id = random.choice(user_ids)
+        start = time.perf_counter()
+        data_manager.get_all_users()
+        data_manager.get_user_movies(user_id)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--movies', type=int, default=20,
+                        help='movies per user')
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    users = generate_users(args.users, args.movies)
+    user_ids = list(users.keys())
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, 'users.json')
+        with open(file_path, 'w') as file:
+            json.dump(users, file, indent=4)
+        size_mb = os.path.getsize(file_path) / 1024 / 1024
+        print(f"users.json: {args.users} users, {args.movies} movies each, "
+              f"{size_mb:.1f} MB")
+
+        for label, cached in (('uncached', False), ('cached', True)):
+            data_manager = JSONDataManager(file_path, cached=cached)
+            result = time_requests(data_manager, user_ids, args.requests)
+            print(f"{label:>9}: mean {result['mean_ms']:.3f} ms, "
+                  f"p50 {result['p50_ms']:.3f} ms, "
+                  f"p99 {result['p99_ms']:.3f} ms per request")
+
+
+if __name__ == '__main__':
+    main()
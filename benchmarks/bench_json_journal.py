@@ -0,0 +1,69 @@
+"""
+Benchmark: JSONDataManager write cost, full rewrite vs journal.
+
+Times update_movie on a synthetic users.json in cached mode, where every
+mutation rewrites the whole file, and in journal mode, where every mutation
+appends one record and the file is only rewritten on compaction.
+
+Usage:
+    python benchmarks/bench_json_journal.py --users 5000 --writes 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_json_cache import generate_users  # noqa: E402
+from data_management.JSONDataManager import JSONDataManager  # noqa: E402
+
+
+def time_writes(data_manager, user_ids, writes_count):
+    latencies = []
+    for index in range(writes_count):
+        user_id = random.choice(user_ids)
+        start = time.perf_counter()
+        data_manager.update_movie(user_id, "1", f"Updated {index}",
+                                  "Director", 7.0, "2000")
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--movies', type=int, default=20,
+                        help='movies per user')
+    parser.add_argument('--writes', type=int, default=200)
+    parser.add_argument('--compact-threshold', type=int, default=1000)
+    args = parser.parse_args()
+
+    users = generate_users(args.users, args.movies)
+    user_ids = list(users.keys())
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label, journal in (('rewrite', False), ('journal', True)):
+            file_path = os.path.join(tmp_dir, f'users-{label}.json')
+            with open(file_path, 'w') as file:
+                json.dump(users, file, indent=4)
+            data_manager = JSONDataManager(
+                file_path, cached=True, journal=journal,
+                compact_threshold=args.compact_threshold)
+            # Load the document before timing writes
+            data_manager.get_all_users()
+            result = time_writes(data_manager, user_ids, args.writes)
+            print(f"{label:>8}: mean {result['mean_ms']:.3f} ms, "
+                  f"p50 {result['p50_ms']:.3f} ms, "
+                  f"p99 {result['p99_ms']:.3f} ms per write")
+
+
+if __name__ == '__main__':
+    main()
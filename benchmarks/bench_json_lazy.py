@@ -0,0 +1,128 @@
+"""
+Benchmark: the memory-mapped users.json index against json.load.
+
+Streams a synthetic users.json of the requested size to disk (indent=4,
+the layout written by JSONDataManager), then in a fresh process each
+reports the time and peak memory to answer the first get_user_movies:
+json.load of the whole file (the default mode, and cached mode before this
+index) against a cached-mode JSONDataManager, which maps the file, indexes
+the users' byte spans and parses only the requested user. It also reports
+the latency of later lookups of users not parsed yet. Both are run on the
+indent=4 layout and on a compact file (json.dump without indent), which is
+indexed by a slower scan of every value.
+
+The index's peak RSS is not constant: it counts the pages of the mapped
+file that were read (file-backed, so the kernel can drop them) and the
+span index, which grows with the number of users. Only the scan's own
+buffers are bounded, by the largest user.
+
+Usage:
+    python benchmarks/bench_json_lazy.py --size-mb 500
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_json_cache import generate_users  # noqa: E402
+from data_management.JSONDataManager import JSONDataManager  # noqa: E402
+
+
+def write_users_file(path, size_bytes, movies_per_user, indent):
+    # Written a user at a time: the document never sits in memory whole
+    template = generate_users(1, movies_per_user)['1']
+    user_count = 0
+    with open(path, 'w') as file:
+        file.write('{')
+        while file.tell() < size_bytes:
+            user_count += 1
+            user = dict(template, name=f'User {user_count}',
+                        email=f'user{user_count}@example.com')
+            separator = ',' if user_count > 1 else ''
+            if indent:
+                text = json.dumps(user, indent=4).replace('\n', '\n    ')
+                file.write(f'{separator}\n    "{user_count}": {text}')
+            else:
+                file.write(f'{separator}"{user_count}": {json.dumps(user)}')
+        file.write('\n}' if indent else '}')
+    return user_count
+
+
+def peak_rss_mib():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_json_load(path, user_id, results):
+    start = time.perf_counter()
+    with open(path) as file:
+        users = json.load(file)
+    users[user_id]['movies']
+    results.put({'first_ms': (time.perf_counter() - start) * 1000,
+                 'rss_mib': peak_rss_mib()})
+
+
+def measure_index(path, user_id, lookup_ids, results):
+    data_manager = JSONDataManager(path, cached=True)
+    start = time.perf_counter()
+    data_manager.get_user_movies(user_id)
+    first_ms = (time.perf_counter() - start) * 1000
+    latencies = []
+    for lookup_id in lookup_ids:
+        start = time.perf_counter()
+        data_manager.get_user_movies(lookup_id)
+        latencies.append(time.perf_counter() - start)
+    data_manager.close()
+    results.put({'first_ms': first_ms, 'rss_mib': peak_rss_mib(),
+                 'lookup_ms': sum(latencies) / len(latencies) * 1000})
+
+
+def run(target, *args):
+    # A fresh interpreter each, so peak memory is the measured work's own
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=target, args=(*args, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size-mb', type=int, default=500)
+    parser.add_argument('--movies', type=int, default=20,
+                        help='movies per user')
+    parser.add_argument('--lookups', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for indent in (4, None):
+            path = os.path.join(tmp_dir, 'users.json')
+            user_count = write_users_file(path, args.size_mb * 1024 * 1024,
+                                          args.movies, indent)
+            user_id = str(random.randint(1, user_count))
+            lookup_ids = [str(random.randint(1, user_count))
+                          for _ in range(args.lookups)]
+            size_mib = os.path.getsize(path) / 1024 / 1024
+            layout = 'indent=4' if indent else 'compact'
+            print(f"{layout}: {size_mib:.0f} MiB, {user_count} users")
+            loaded = run(measure_json_load, path, user_id)
+            print(f"  json.load: first answer {loaded['first_ms']:.0f} ms,"
+                  f" peak RSS {loaded['rss_mib']:.0f} MiB")
+            indexed = run(measure_index, path, user_id, lookup_ids)
+            print(f"  index:     first answer {indexed['first_ms']:.0f} ms,"
+                  f" peak RSS {indexed['rss_mib']:.0f} MiB, lookups mean "
+                  f"{indexed['lookup_ms']:.3f} ms")
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark: login throughput and read latency during a login spike.
+
+Runs the app (SQLite backend) under concurrent POST / logins while other
+threads keep requesting the cheap GET /users page, once with bcrypt on the
+request threads (MOVIWEB_HASH_WORKERS=0, unbounded queue) and once on the
+password hashing process pool with its bounded queue. Reports login
+throughput, rejected (503) logins and the latency of both routes.
+
+Usage:
+    python benchmarks/bench_login.py --rounds 12 --logins 32 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datasets import PASSWORD, Dataset  # noqa: E402
+from password_hashing import hash_password  # noqa: E402
+
+USERS = 200
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1,
+                             int(len(ordered) * fraction))] * 1000, 1)
+
+
+def client_loop(client, request, deadline, backoff, latencies, statuses):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = request(client)
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status_code] = statuses.get(response.status_code,
+                                                      0) + 1
+        if response.status_code == 503:
+            # A shed client backs off, as Retry-After asks (scaled down)
+            time.sleep(backoff)
+
+
+def run_config(logins, readers, seconds, backoff, results):
+    # Runs in a fresh process: the hasher and data manager read the
+    # environment at import
+    import app as app_module
+    app_module.password_hasher.start()
+
+    def login(client):
+        user_id = threading.get_ident() % USERS + 1
+        return client.post('/', data={'email': f'user{user_id}@example.com',
+                                      'password': PASSWORD})
+
+    def read(client):
+        return client.get('/users?limit=20')
+
+    deadline = time.perf_counter() + seconds
+    login_latencies, read_latencies = [], []
+    login_statuses, read_statuses = {}, {}
+    threads = [threading.Thread(target=client_loop, args=(
+        app_module.app.test_client(), login, deadline, backoff,
+        login_latencies, login_statuses)) for _ in range(logins)]
+    threads += [threading.Thread(target=client_loop, args=(
+        app_module.app.test_client(), read, deadline, backoff,
+        read_latencies, read_statuses)) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    app_module.password_hasher.shutdown()
+
+    succeeded = login_statuses.get(302, 0)
+    results.put({
+        'logins_per_sec': round(succeeded / seconds, 1),
+        'rejected': login_statuses.get(503, 0),
+        'login_p50_ms': percentile(login_latencies, 0.5),
+        'login_p99_ms': percentile(login_latencies, 0.99),
+        'reads_per_sec': round(len(read_latencies) / seconds, 1),
+        'read_p50_ms': percentile(read_latencies, 0.5),
+        'read_p99_ms': percentile(read_latencies, 0.99),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rounds', type=int, default=12,
+                        help='bcrypt cost factor')
+    parser.add_argument('--logins', type=int, default=32,
+                        help='concurrent login threads')
+    parser.add_argument('--readers', type=int, default=4,
+                        help='concurrent GET /users threads')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--backoff', type=float, default=0.1,
+                        help='seconds a rejected login waits to retry')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='hashing processes for the pool run')
+    parser.add_argument('--queue', type=int, default=None,
+                        help='hashing queue size for the pool run')
+    args = parser.parse_args()
+
+    configs = {
+        'request threads': {'MOVIWEB_HASH_WORKERS': '0',
+                            'MOVIWEB_HASH_QUEUE': '100000'},
+        'process pool': {'MOVIWEB_HASH_WORKERS': str(args.workers),
+                         'MOVIWEB_HASH_QUEUE': str(args.queue)
+                         if args.queue is not None else ''},
+    }
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Stored hashes use the benchmarked cost, so logins never rehash
+        dataset = Dataset(USERS, movies_per_user=1)
+        dataset.password = hash_password(PASSWORD, args.rounds)[0]
+        db_file = os.path.join(work_dir, 'users.sqlite')
+        dataset.write_sqlite(db_file)
+
+        print(f"{'':<18}{'logins/s':>10}{'503s':>7}{'login p50':>11}"
+              f"{'login p99':>11}{'reads/s':>9}{'read p50':>10}"
+              f"{'read p99':>10}")
+        for name, env in configs.items():
+            os.environ.update(env, MOVIWEB_DATA_FILE=db_file,
+                              RESPONSE_CACHE='off',
+                              MOVIWEB_BCRYPT_ROUNDS=str(args.rounds))
+            queue = context.Queue()
+            process = context.Process(target=run_config, args=(
+                args.logins, args.readers, args.seconds, args.backoff,
+                queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            print(f"{name:<18}{result['logins_per_sec']:>10}"
+                  f"{result['rejected']:>7}{result['login_p50_ms']:>11}"
+                  f"{result['login_p99_ms']:>11}{result['reads_per_sec']:>9}"
+                  f"{result['read_p50_ms']:>10}{result['read_p99_ms']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: SQLiteDataManager write contention across processes.
+
+Starts several worker processes that share one SQLite file, each with its
+own Flask app and SQLiteDataManager, mixing add_review writes with
+get_reviews_for_movie reads. Runs once without connection tuning (SQLite
+defaults, rollback journal) and once with the default SQLiteProfile (WAL,
+synchronous=NORMAL, busy timeout), and reports throughput, lock errors and
+latency percentiles for each.
+
+Usage:
+    python benchmarks/bench_sqlite_contention.py --workers 8 --operations 300
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from data_management.SQLDataManager import (  # noqa: E402
+    SQLiteDataManager, movie_fields)
+from data_management.SQLiteTuning import is_locked_error  # noqa: E402
+from data_management.SQL_Data_Models import db, Movies  # noqa: E402
+from omdb_stub import make_movie  # noqa: E402
+
+MOVIES_COUNT = 50
+
+
+def make_data_manager(db_file, profile):
+    app = Flask(__name__)
+    data_manager = SQLiteDataManager(app, db_file, sqlite_profile=profile)
+    return app, data_manager
+
+
+def setup_database(db_file, profile):
+    app, data_manager = make_data_manager(db_file, profile)
+    with app.app_context():
+        data_manager.add_user("Bench", "bench@example.com", "hash")
+        db.session.add_all(
+            Movies(**movie_fields(make_movie(f"Movie {index}")))
+            for index in range(MOVIES_COUNT))
+        db.session.commit()
+
+
+def worker(db_file, profile, operations, read_ratio, seed, results):
+    random.seed(seed)
+    app, data_manager = make_data_manager(db_file, profile)
+    latencies = []
+    lock_errors = 0
+    with app.app_context():
+        for index in range(operations):
+            movie_id = random.randint(1, MOVIES_COUNT)
+            start = time.perf_counter()
+            try:
+                if random.random() < read_ratio:
+                    data_manager.get_reviews_for_movie(movie_id)
+                else:
+                    data_manager.add_review(1, movie_id, 7,
+                                            f"Review {seed}-{index}")
+            except OperationalError as error:
+                if not is_locked_error(error):
+                    raise
+                db.session.rollback()
+                lock_errors += 1
+            latencies.append(time.perf_counter() - start)
+        db.session.remove()
+    results.put((latencies, lock_errors))
+
+
+def run(label, profile, args, tmp_dir):
+    db_file = os.path.join(tmp_dir, f'{label}.sqlite')
+    setup_database(db_file, profile)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(
+        target=worker,
+        args=(db_file, profile, args.operations, args.read_ratio, seed,
+              results))
+        for seed in range(args.workers)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for worker_latencies, _ in collected
+                       for latency in worker_latencies)
+    lock_errors = sum(errors for _, errors in collected)
+    print(f"{label:>8}: {len(latencies) / elapsed:8.1f} ops/s, "
+          f"{lock_errors} lock errors, "
+          f"p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=8,
+                        help='concurrent processes')
+    parser.add_argument('--operations', type=int, default=300,
+                        help='operations per worker')
+    parser.add_argument('--read-ratio', type=float, default=0.5,
+                        help='share of operations that are reads')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run('default', False, args, tmp_dir)
+        run('tuned', None, args, tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+"""
+Benchmark suite: JSON vs CSV vs SQLite data managers at scale.
+
+Generates the same dataset in all three formats (see datasets.py), then
+benchmarks each backend in its own process, through the app exactly as it
+is configured in production (MOVIWEB_DATA_FILE picks the data manager):
+every DataManagerInterface operation is timed directly, and the main
+routes (user list, collection page, search, login) through the Flask
+test client. OMDb lookups go to a local stub and the response cache is
+off, so the numbers are the data managers' own.
+
+Reports throughput, p50/p99 latency and peak RSS per backend and writes
+them as JSON. --baseline compares against a stored run and exits with
+status 1 when an operation's p50 got slower than --threshold allows.
+
+Usage:
+    python benchmarks/bench_suite.py --rows 10000 --output results.json
+    python benchmarks/bench_suite.py --rows 100000 --baseline results.json
+    python benchmarks/bench_suite.py --rows 1000000 --backends sqlite
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datasets import PASSWORD, Dataset, user_movie_id  # noqa: E402
+from omdb_stub import OMDbStubServer  # noqa: E402
+
+BACKENDS = ('json', 'csv', 'sqlite')
+
+DEFAULT_THRESHOLD = 0.25
+# p50 differences below this are noise, whatever the ratio
+MIN_DELTA_MS = 0.05
+
+
+def summarize(latencies, elapsed):
+    ordered = sorted(latencies)
+    return {'count': len(ordered),
+            'ops_per_sec': round(len(ordered) / elapsed, 2) if elapsed else None,
+            'mean_ms': round(statistics.fmean(ordered) * 1000, 4),
+            'p50_ms': round(ordered[len(ordered) // 2] * 1000, 4),
+            'p99_ms': round(ordered[min(len(ordered) - 1,
+                                        int(len(ordered) * 0.99))] * 1000, 4)}
+
+
+def measure(operation, iterations, budget):
+    """
+    Call operation(i) up to iterations times, stopping early once the time
+    budget (seconds) is spent; always makes at least one call.
+    Returns:
+        dict: Latency summary, or the reason the operation could not run.
+    """
+    latencies = []
+    started = time.perf_counter()
+    for index in range(iterations):
+        start = time.perf_counter()
+        try:
+            operation(index)
+        except NotImplementedError:
+            return {'unsupported': True}
+        except Exception as error:
+            return {'error': f"{type(error).__name__}: {error}"}
+        latencies.append(time.perf_counter() - start)
+        if time.perf_counter() - started > budget:
+            break
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def data_manager_operations(backend, data_manager, meta):
+    """
+    The DataManagerInterface calls to benchmark, as name -> operation(i).
+    Adapts the calls whose signatures differ between the backends.
+    """
+    from data_management.CollectionQuery import CollectionQuery
+
+    rng = random.Random(2)
+    users = meta['users']
+    catalog = meta['catalog_size']
+    sql = backend == 'sqlite'
+
+    def user_id():
+        user = rng.randint(1, users)
+        return user if sql else str(user)
+
+    def movie_id(user, index):
+        # The index-th movie of the user (0-based), in the backend's ids
+        if sql:
+            return user_movie_id(int(user), index, catalog)
+        return str(index + 1)
+
+    def add_user(index):
+        name, email = f'Bench {index}', f'bench{index}@example.com'
+        if backend == 'json':
+            data_manager.add_user({'name': name, 'email': email,
+                                   'password': meta['password'], 'movies': {}})
+        else:
+            data_manager.add_user(name, email, meta['password'])
+
+    def update_movie(index):
+        user = user_id()
+        args = (user, movie_id(user, 0), f'Movie {index}', 'Director',
+                '7.5', '2001')
+        if backend == 'json':
+            data_manager.update_movie(*args)
+        else:
+            data_manager.update_movie(*args, 'note')
+
+    def delete_movie(index):
+        # A different user each time, so every call deletes a movie
+        user = (index % users) + 1
+        data_manager.delete_movie(user if sql else str(user),
+                                  movie_id(user, 1))
+
+    return {
+        'get_all_users': lambda index: data_manager.get_all_users(),
+        'get_users_page': lambda index: data_manager.get_users_page(
+            rng.randint(0, users), 50),
+        'get_user_by_email': lambda index: data_manager.get_user_by_email(
+            f'user{rng.randint(1, users)}@example.com'),
+        'get_user_movies': lambda index: data_manager.get_user_movies(
+            user_id()),
+        'get_collection_page': lambda index: data_manager.get_collection_page(
+            user_id(), CollectionQuery(sort='rating', descending=True)),
+        'search_movies': lambda index: data_manager.search_movies(
+            f'Director {rng.randint(0, 996)}'),
+        'search_users': lambda index: data_manager.search_users(
+            f'User {rng.randint(1, users)}'),
+        'get_reviews_for_movie': lambda index: (
+            data_manager.get_reviews_for_movie(rng.randint(1, catalog))),
+        'add_user': add_user,
+        'add_movie': lambda index: data_manager.add_movie(
+            user_id(), f'Bench Movie {index}'),
+        'update_movie': update_movie,
+        'delete_movie': delete_movie,
+        'add_review': lambda index: data_manager.add_review(
+            user_id(), rng.randint(1, catalog), 8.0, f'Review {index}'),
+    }
+
+
+def route_operations(client, meta):
+    rng = random.Random(3)
+    users = meta['users']
+
+    def login(index):
+        response = client.post('/', data={
+            'email': f'user{rng.randint(1, users)}@example.com',
+            'password': PASSWORD})
+        assert response.status_code == 302, response.status_code
+
+    return {
+        'GET /users': lambda index: client.get('/users'),
+        'GET /users/<id>': lambda index: client.get(
+            f'/users/{rng.randint(1, users)}'),
+        'GET /search': lambda index: client.get(
+            f'/search?q=Director+{rng.randint(0, 996)}'),
+        'POST / (login)': login,
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_backend(backend, meta, iterations, budget, results):
+    # Runs in a fresh process: app.py picks its data manager at import
+    start = time.perf_counter()
+    import app as app_module
+    startup = time.perf_counter() - start
+    flask_app, data_manager = app_module.app, app_module.data_manager
+    report = {'startup_s': round(startup, 3),
+              'rss_after_startup_mb': peak_rss_mb(), 'operations': {}}
+
+    with flask_app.app_context():
+        # First read after startup: file parsing / connection warm-up
+        start = time.perf_counter()
+        data_manager.get_all_users()
+        report['first_read_s'] = round(time.perf_counter() - start, 3)
+
+        operations = data_manager_operations(backend, data_manager, meta)
+        for name, operation in operations.items():
+            report['operations'][name] = measure(operation, iterations, budget)
+
+    client = flask_app.test_client()
+    for name, operation in route_operations(client, meta).items():
+        report['operations'][name] = measure(operation, iterations, budget)
+
+    report['peak_rss_mb'] = peak_rss_mb()
+    # The login route started the hashing pool
+    app_module.password_hasher.shutdown()
+    results.put(report)
+
+
+def run_suite(paths, meta, iterations, budget):
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    omdb = OMDbStubServer(synthesize=True).start()
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            for backend, path in paths.items():
+                # Writes change the data; every run starts from a fresh copy
+                data_file = os.path.join(work_dir, os.path.basename(path))
+                shutil.copyfile(path, data_file)
+                # Read at import time by the child, before anything else
+                os.environ.update({'MOVIWEB_DATA_FILE': data_file,
+                                   'RESPONSE_CACHE': 'off',
+                                   'MOVIWEB_METRICS': '0',
+                                   'OMDB_API_URL': omdb.url,
+                                   'OMDB_CACHE_PATH': ''})
+                queue = context.Queue()
+                process = context.Process(
+                    target=run_backend,
+                    args=(backend, meta, iterations, budget, queue))
+                process.start()
+                results[backend] = queue.get()
+                process.join()
+                print_report(backend, results[backend])
+    finally:
+        omdb.stop()
+    return results
+
+
+def print_report(backend, report):
+    print(f"\n== {backend}: startup {report['startup_s']}s, first read "
+          f"{report['first_read_s']}s, peak RSS {report['peak_rss_mb']} MB")
+    print(f"{'operation':<24}{'calls':>7}{'ops/s':>11}{'p50 ms':>11}"
+          f"{'p99 ms':>11}")
+    for name, stats in report['operations'].items():
+        if 'unsupported' in stats:
+            print(f"{name:<24}{'unsupported':>18}")
+        elif 'error' in stats:
+            print(f"{name:<24}  error: {stats['error']}")
+        else:
+            print(f"{name:<24}{stats['count']:>7}{stats['ops_per_sec']:>11}"
+                  f"{stats['p50_ms']:>11}{stats['p99_ms']:>11}")
+
+
+def find_regressions(results, baseline, threshold):
+    """
+    Compare p50 latencies against a baseline run.
+    Returns:
+        list: (backend, operation, baseline p50, current p50) of every
+        operation that got slower by more than the threshold ratio.
+    """
+    regressions = []
+    for backend, report in results.items():
+        previous = baseline['results'].get(backend, {}).get('operations', {})
+        for name, stats in report['operations'].items():
+            before = previous.get(name, {}).get('p50_ms')
+            now = stats.get('p50_ms')
+            if before is None or now is None:
+                continue
+            if now > before * (1 + threshold) and now - before > MIN_DELTA_MS:
+                regressions.append((backend, name, before, now))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='movie rows, e.g. 10000, 100000 or 1000000')
+    parser.add_argument('--movies', type=int, default=20,
+                        help='movies per user')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS,
+                        default=list(BACKENDS))
+    parser.add_argument('--iterations', type=int, default=200,
+                        help='calls per operation')
+    parser.add_argument('--budget', type=float, default=10.0,
+                        help='seconds per operation before stopping early')
+    parser.add_argument('--data', help='reuse datasets written to this '
+                                       'directory by datasets.py')
+    parser.add_argument('--output', help='write the results JSON here')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed p50 slowdown ratio (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    dataset = Dataset(args.rows, args.movies)
+    with tempfile.TemporaryDirectory() as data_dir:
+        if args.data:
+            paths = {backend: os.path.join(args.data, f'users.{extension}')
+                     for backend, extension in (('json', 'json'),
+                                                ('csv', 'csv'),
+                                                ('sqlite', 'sqlite'))}
+        else:
+            print(f"Generating {dataset.rows} rows "
+                  f"({dataset.user_count} users)...")
+            paths = dataset.write(data_dir)
+        paths = {backend: paths[backend] for backend in args.backends}
+        meta = {'rows': dataset.rows, 'users': dataset.user_count,
+                'movies_per_user': dataset.movies_per_user,
+                'catalog_size': dataset.catalog_size,
+                'password': dataset.password}
+        results = run_suite(paths, meta, args.iterations, args.budget)
+
+    output = {'meta': {'rows': dataset.rows, 'users': dataset.user_count,
+                       'movies_per_user': dataset.movies_per_user,
+                       'iterations': args.iterations,
+                       'python': platform.python_version(),
+                       'sqlite': sqlite3.sqlite_version,
+                       'platform': platform.platform(),
+                       'date': datetime.datetime.now().isoformat(
+                           timespec='seconds')},
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=4)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline['meta'].get('rows') != dataset.rows:
+            print(f"Warning: baseline was run with {baseline['meta'].get('rows')}"
+                  f" rows, this run with {dataset.rows}")
+        regressions = find_regressions(results, baseline, args.threshold)
+        for backend, name, before, now in regressions:
+            print(f"REGRESSION {backend} {name}: p50 {before} ms -> {now} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Synthetic datasets for the data manager benchmarks.
+
+Writes the same users and movie collections as users.json, users.csv and
+users.sqlite, so the three data managers can be compared on equal data.
+Generation is seeded and deterministic: user u's j-th movie (0-based) is
+catalog movie ((u * 7 + j) % catalog_size) + 1, which has id j + 1 in the
+JSON/CSV files.
+
+Usage:
+    python benchmarks/datasets.py --rows 100000 --movies 20 --out /tmp/bench
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_management import migrations  # noqa: E402
+from data_management.CSVDataManager import FIELD_NAMES, encode_csv_rows  # noqa: E402
+from data_management.MovieFacets import backfill  # noqa: E402
+from omdb_stub import make_movie  # noqa: E402
+
+# Password of every generated user; hashed with a low bcrypt cost so the
+# login benchmark measures the route rather than the hash
+PASSWORD = 'password'
+BCRYPT_ROUNDS = 4
+
+GENRES = ('Action', 'Comedy', 'Drama', 'Horror', 'Romance', 'Sci-Fi',
+          'Thriller', 'Animation', 'Documentary', 'Crime')
+
+DEFAULT_CATALOG_SIZE = 50000
+
+
+def password_hash():
+    import bcrypt
+    return bcrypt.hashpw(PASSWORD.encode('utf-8'),
+                         bcrypt.gensalt(BCRYPT_ROUNDS)).decode('utf-8')
+
+
+def catalog_movie(movie_id, rng):
+    return make_movie(
+        f'Movie {movie_id}',
+        Year=str(rng.randint(1950, 2023)),
+        imdbRating=f'{rng.uniform(1, 10):.1f}',
+        Genre=', '.join(rng.sample(GENRES, 2)),
+        Director=f'Director {movie_id % 997}',
+        Actors=f'Actor {movie_id % 1009}, Actor {movie_id % 1013}',
+        Plot=f'Plot of movie {movie_id}. ' * 8,
+        imdbID=f'tt{movie_id:08d}')
+
+
+def user_movie_id(user_id, index, catalog_size):
+    return (user_id * 7 + index) % catalog_size + 1
+
+
+class Dataset:
+    def __init__(self, rows, movies_per_user=20, catalog_size=None, seed=1):
+        self.movies_per_user = movies_per_user
+        self.user_count = max(1, rows // movies_per_user)
+        self.catalog_size = max(movies_per_user,
+                                min(catalog_size or DEFAULT_CATALOG_SIZE, rows))
+        rng = random.Random(seed)
+        self.catalog = [catalog_movie(movie_id, rng)
+                        for movie_id in range(1, self.catalog_size + 1)]
+        self.password = password_hash()
+
+    @property
+    def rows(self):
+        return self.user_count * self.movies_per_user
+
+    def user_movies(self, user_id):
+        # (JSON/CSV movie id, catalog movie) pairs of one user
+        for index in range(self.movies_per_user):
+            movie_id = user_movie_id(user_id, index, self.catalog_size)
+            yield str(index + 1), self.catalog[movie_id - 1]
+
+    def user(self, user_id):
+        return {'name': f'User {user_id}',
+                'email': f'user{user_id}@example.com',
+                'password': self.password}
+
+    def write_json(self, path):
+        users = {}
+        for user_id in range(1, self.user_count + 1):
+            users[str(user_id)] = dict(self.user(user_id), movies={
+                movie_id: {'name': movie['Title'],
+                           'director': movie['Director'],
+                           'rating': float(movie['imdbRating']),
+                           'year': movie['Year']}
+                for movie_id, movie in self.user_movies(user_id)})
+        with open(path, 'w') as file:
+            json.dump(users, file, indent=4)
+
+    def write_csv(self, path):
+        with open(path, 'wb') as file:
+            file.write(encode_csv_rows([], header=True))
+            for user_id in range(1, self.user_count + 1):
+                user = self.user(user_id)
+                rows = [dict(zip(FIELD_NAMES, (
+                    str(user_id), user['name'], user['email'],
+                    user['password'], movie_id, movie['Title'],
+                    movie['Director'], movie['Year'], movie['imdbRating'],
+                    ''))) for movie_id, movie in self.user_movies(user_id)]
+                file.write(encode_csv_rows(rows))
+
+    def write_sqlite(self, path):
+        connection = migrations.connect(path)
+        migrations.upgrade(connection, log=lambda message: None)
+        connection.executemany(
+            "INSERT INTO users (id, name, email, password) "
+            "VALUES (?, ?, ?, ?)",
+            ((user_id, *self.user(user_id).values())
+             for user_id in range(1, self.user_count + 1)))
+        connection.executemany(
+            "INSERT INTO movies (movie_id, title, year, rating, genre, "
+            "director, writer, actors, plot, language, country, poster, "
+            "_type, imdb_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((movie_id, movie['Title'], int(movie['Year']),
+              float(movie['imdbRating']), movie['Genre'], movie['Director'],
+              movie['Writer'], movie['Actors'], movie['Plot'],
+              movie['Language'], movie['Country'], movie['Poster'],
+              movie['Type'], movie['imdbID'])
+             for movie_id, movie in enumerate(self.catalog, start=1)))
+        # Typed columns and facet tables, as the app fills them at ingest
+        backfill(connection)
+        connection.executemany(
+            "INSERT INTO favorite_movies (user_id, movie_id, note) "
+            "VALUES (?, ?, '')",
+            ((user_id, user_movie_id(user_id, index, self.catalog_size))
+             for user_id in range(1, self.user_count + 1)
+             for index in range(self.movies_per_user)))
+        connection.commit()
+        connection.close()
+
+    def write(self, directory):
+        """
+        Write all three formats into directory.
+        Returns:
+            dict: backend name -> data file path.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = {'json': os.path.join(directory, 'users.json'),
+                 'csv': os.path.join(directory, 'users.csv'),
+                 'sqlite': os.path.join(directory, 'users.sqlite')}
+        for path in paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+        self.write_json(paths['json'])
+        self.write_csv(paths['csv'])
+        self.write_sqlite(paths['sqlite'])
+        return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100000,
+                        help='movie rows (users x movies per user)')
+    parser.add_argument('--movies', type=int, default=20,
+                        help='movies per user')
+    parser.add_argument('--catalog', type=int, default=DEFAULT_CATALOG_SIZE,
+                        help='distinct movies in the SQLite catalog')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', required=True, help='output directory')
+    args = parser.parse_args()
+
+    dataset = Dataset(args.rows, args.movies, args.catalog, args.seed)
+    for backend, path in dataset.write(args.out).items():
+        print(f"{backend:>7}: {path} ({os.path.getsize(path)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
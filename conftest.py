@@ -0,0 +1,44 @@
+import pytest
+from flask import Flask
+import data_management.BinaryDataManager as binary_data_manager_module
+import data_management.CSVDataManager as csv_data_manager_module
+import data_management.JSONDataManager as json_data_manager_module
+import data_management.SQLDataManager as sql_data_manager_module
+from api import api
+from data_management.OMDbClient import OMDbClient
+from data_management.SQLDataManager import SQLiteDataManager
+from data_management.SQL_Data_Models import db
+from omdb_stub import OMDbStubServer
+from response_cache import response_cache
+
+# Data manager modules that look movies up through the shared OMDb client
+OMDB_CLIENT_MODULES = [binary_data_manager_module, csv_data_manager_module,
+                       json_data_manager_module, sql_data_manager_module]
+
+
+# Fixture to serve OMDb lookups from a local stub server
+@pytest.fixture
+def omdb_stub(monkeypatch):
+    server = OMDbStubServer().start()
+    client = OMDbClient(base_url=server.url)
+    for module in OMDB_CLIENT_MODULES:
+        monkeypatch.setattr(module, "omdb_client", client)
+
+    yield server
+
+    server.stop()
+
+
+# Fixture to create an application with a SQLite database holding one user
+@pytest.fixture
+def sql_app(tmpdir, omdb_stub):
+    # Responses cached by an earlier test belong to another database
+    response_cache.clear()
+    app = Flask(__name__)
+    data_manager = SQLiteDataManager(app, str(tmpdir.join("test.sqlite")))
+    app.register_blueprint(api, url_prefix='/api')
+    with app.app_context():
+        data_manager.add_user("John", "john@example.com", "hash")
+        app.data_manager = data_manager
+        yield app
+        db.session.remove()
@@ -0,0 +1,72 @@
+"""
+Convert users and their movie collections between the JSON, CSV, binary
+(.mwb) and SQLite data files (the format is picked by extension, as in
+app.py).
+
+Usage:
+    python convert.py user_data/users.json user_data/user_movies.sqlite
+    python convert.py user_data/user_movies.sqlite /tmp/users.csv --batch-size 20000
+    python convert.py users.csv users.json --restart
+    python convert.py user_data/users.json user_data/users.mwb
+    python convert.py users.json users.csv --verify-only
+
+Users are streamed one at a time and written in batches of --batch-size
+users plus movie rows. Progress is checkpointed to <target>.checkpoint
+after every batch: run the same command again to resume an interrupted
+conversion, or pass --restart to start over. Afterwards both files are
+read back and their user and movie counts and content checksums compared.
+"""
+import argparse
+import sys
+from data_management.Converter import DEFAULT_BATCH_SIZE, convert, summarize
+
+
+def verify(source, target):
+    expected, actual = summarize(source), summarize(target)
+    for name in ('users', 'movies', 'checksum'):
+        status = 'ok' if expected[name] == actual[name] else 'MISMATCH'
+        # Checksums are compared in full, shown abbreviated
+        print(f"  {name:<9}{str(expected[name])[:16]:>20}  "
+              f"{str(actual[name])[:16]:>20}  {status}")
+    return expected == actual
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('source', help='JSON, CSV, binary or SQLite file to read')
+    parser.add_argument('target', help='new JSON, CSV, binary or SQLite file')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='users plus movie rows per committed batch '
+                             f'(default: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--restart', action='store_true',
+                        help='discard an interrupted conversion')
+    parser.add_argument('--no-verify', action='store_true',
+                        help='skip comparing the files afterwards')
+    parser.add_argument('--verify-only', action='store_true',
+                        help='only compare two existing files')
+    parser.add_argument('--quiet', action='store_true',
+                        help='no progress output')
+    args = parser.parse_args()
+
+    try:
+        if not args.verify_only:
+            totals = convert(args.source, args.target, args.batch_size,
+                             args.restart,
+                             log=(lambda message: None) if args.quiet
+                             else print)
+            print(f"Converted {totals['users']} users and {totals['movies']} "
+                  f"movies to {args.target}")
+        if args.no_verify:
+            return 0
+        print(f"  {'':<9}{'source':>20}  {'target':>20}")
+        if not verify(args.source, args.target):
+            print("Verification failed")
+            return 1
+    except ValueError as error:
+        print(f"Conversion failed: {error}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
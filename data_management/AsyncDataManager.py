@@ -0,0 +1,156 @@
+import asyncio
+import functools
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads serving the blocking calls of one async data manager
+DEFAULT_MAX_WORKERS = 16
+
+
+class AsyncDataManagerInterface(ABC):
+    """
+    Async variants of the DataManagerInterface methods, for the ASGI
+    serving mode (asgi.py). Arguments and results are the same as those of
+    the synchronous data manager each implementation stands in for.
+    """
+
+    @abstractmethod
+    async def get_all_users(self):
+        pass
+
+    @abstractmethod
+    async def get_users_page(self, after=None, limit=50):
+        pass
+
+    @abstractmethod
+    async def get_user_by_email(self, email):
+        pass
+
+    @abstractmethod
+    async def search_movies(self, query, user_id=None, limit=20, offset=0):
+        pass
+
+    @abstractmethod
+    async def search_users(self, query, limit=20, offset=0):
+        pass
+
+    @abstractmethod
+    async def get_user_movies(self, user_id):
+        pass
+
+    @abstractmethod
+    async def get_collection_page(self, user_id, query=None):
+        pass
+
+    @abstractmethod
+    async def add_user(self, *user_details):
+        pass
+
+    @abstractmethod
+    async def update_password(self, user_id, password_hash):
+        pass
+
+    @abstractmethod
+    async def add_movie(self, user_id, movie_title):
+        pass
+
+    @abstractmethod
+    async def update_movie(self, user_id, movie_id, *movie_details):
+        pass
+
+    @abstractmethod
+    async def delete_movie(self, user_id, movie_id):
+        pass
+
+    @abstractmethod
+    async def add_review(self, user_id, movie_id, rating, review):
+        pass
+
+    @abstractmethod
+    async def get_reviews_for_movie(self, movie_id):
+        pass
+
+    @abstractmethod
+    async def get_movie_reviews(self, user_id, movie_id, after=None, limit=20):
+        pass
+
+
+class ThreadedAsyncDataManager(AsyncDataManagerInterface):
+    """
+    Async adapter for a synchronous data manager: every call runs on a
+    bounded thread pool, so whole-file JSON/CSV reads and writes (and their
+    OMDb lookups) never block the event loop. With a Flask app, calls run
+    inside its app context, which SQLiteDataManager needs for its session.
+    """
+
+    def __init__(self, data_manager, app=None,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        self.data_manager = data_manager
+        self.app = app
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='data-manager')
+
+    def _run(self, name, args, kwargs):
+        method = getattr(self.data_manager, name)
+        if self.app is None:
+            return method(*args, **kwargs)
+        # The app context's teardown releases the thread's SQL session
+        with self.app.app_context():
+            return method(*args, **kwargs)
+
+    async def _call(self, name, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(self._run, name, args, kwargs))
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+    async def get_all_users(self):
+        return await self._call('get_all_users')
+
+    async def get_users_page(self, after=None, limit=50):
+        return await self._call('get_users_page', after, limit)
+
+    async def get_user_by_email(self, email):
+        return await self._call('get_user_by_email', email)
+
+    async def search_movies(self, query, user_id=None, limit=20, offset=0):
+        return await self._call('search_movies', query, user_id, limit, offset)
+
+    async def search_users(self, query, limit=20, offset=0):
+        return await self._call('search_users', query, limit, offset)
+
+    async def get_user_movies(self, user_id):
+        return await self._call('get_user_movies', user_id)
+
+    async def get_collection_page(self, user_id, query=None):
+        return await self._call('get_collection_page', user_id, query)
+
+    async def add_user(self, *user_details):
+        # A details dict for JSON; name, email and password for CSV/SQLite
+        return await self._call('add_user', *user_details)
+
+    async def update_password(self, user_id, password_hash):
+        return await self._call('update_password', user_id, password_hash)
+
+    async def add_movie(self, user_id, movie_title):
+        return await self._call('add_movie', user_id, movie_title)
+
+    async def update_movie(self, user_id, movie_id, *movie_details):
+        return await self._call('update_movie', user_id, movie_id,
+                                *movie_details)
+
+    async def delete_movie(self, user_id, movie_id):
+        return await self._call('delete_movie', user_id, movie_id)
+
+    async def add_review(self, user_id, movie_id, rating, review):
+        return await self._call('add_review', user_id, movie_id, rating,
+                                review)
+
+    async def get_reviews_for_movie(self, movie_id):
+        return await self._call('get_reviews_for_movie', movie_id)
+
+    async def get_movie_reviews(self, user_id, movie_id, after=None, limit=20):
+        return await self._call('get_movie_reviews', user_id, movie_id, after,
+                                limit)
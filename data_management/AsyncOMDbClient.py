@@ -0,0 +1,86 @@
+import asyncio
+from .OMDbCache import normalize_title
+from .OMDbClient import API_KEY, API_URL, DEFAULT_TIMEOUT, omdb_client
+
+try:
+    import httpx
+except ImportError:  # Optional: only the ASGI serving mode needs it
+    httpx = None
+
+
+class AsyncOMDbClient:
+    """
+    OMDb client for the event loop, on httpx's async connection pool.
+
+    Behaves like OMDbClient: lookups go through the shared response cache
+    first, and concurrent lookups of the same title are coalesced into one
+    upstream request. A slow upstream only suspends the waiting requests,
+    it does not hold a worker thread.
+    """
+
+    def __init__(self, base_url=API_URL, api_key=API_KEY,
+                 timeout=DEFAULT_TIMEOUT, pool_size=100, cache=None):
+        if httpx is None:
+            raise RuntimeError("The httpx package is required for async "
+                               "OMDb lookups")
+        connect_timeout, read_timeout = timeout
+        self.base_url = base_url
+        self.api_key = api_key
+        self.cache = cache
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size,
+                                max_keepalive_connections=pool_size))
+        self._inflight = {}
+
+    async def fetch_movie(self, title):
+        """
+        Look up a movie by title.
+        Returns:
+            dict: The OMDb response; 'Response' is 'False' when the movie
+            was not found.
+        Raises:
+            httpx.HTTPError: On network or HTTP errors.
+        """
+        if self.cache is not None:
+            # The cache is a local SQLite file; keep its I/O off the loop
+            cached_movie = await asyncio.to_thread(self.cache.get, title)
+            if cached_movie is not None:
+                return cached_movie
+
+        key = normalize_title(title)
+        future = self._inflight.get(key)
+        if future is not None:
+            return dict(await asyncio.shield(future))
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            movie_dict_data = await self._request(title)
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.put, title, movie_dict_data)
+            future.set_result(movie_dict_data)
+        except BaseException as error:
+            future.set_exception(error)
+            # Retrieved here so a lookup nobody else waited for does not
+            # log "exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+        return dict(movie_dict_data)
+
+    async def _request(self, title):
+        response = await self.client.get(self.base_url,
+                                         params={'apikey': self.api_key,
+                                                 't': title})
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def make_async_omdb_client():
+    # Shares the response cache of the synchronous client
+    return AsyncOMDbClient(cache=omdb_client.cache)
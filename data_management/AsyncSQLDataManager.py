@@ -0,0 +1,173 @@
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from .AsyncDataManager import DEFAULT_MAX_WORKERS, ThreadedAsyncDataManager
+from .AsyncOMDbClient import make_async_omdb_client
+from .SQLDataManager import movie_fields
+from .SQL_Data_Models import User, UserMovies, Movies, Reviews
+
+try:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+except ImportError:  # Needs greenlet: pip install "sqlalchemy[asyncio]"
+    async_sessionmaker = create_async_engine = None
+
+
+class AsyncSQLiteDataManager(ThreadedAsyncDataManager):
+    """
+    Async SQLite data manager on the aiosqlite driver.
+
+    Lookups, user and collection reads and movie/review writes run natively
+    on the event loop, and add_movie awaits OMDb through AsyncOMDbClient
+    without holding a database transaction open. The other methods
+    (search, collection and review pages, update_movie) run the
+    synchronous SQLiteDataManager on the thread pool.
+    Args:
+        db_file_name (str): The database file; its schema is created and
+            migrated by data_manager.
+        data_manager (SQLiteDataManager): The synchronous manager for the
+            same file, initialized on app.
+    """
+
+    def __init__(self, db_file_name, data_manager, app, omdb=None,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        if create_async_engine is None:
+            raise RuntimeError("The async SQLite data manager needs "
+                               "SQLAlchemy's asyncio extra and aiosqlite")
+        super().__init__(data_manager, app, max_workers)
+        self.engine = create_async_engine(f'sqlite+aiosqlite:///{db_file_name}')
+        if data_manager.sqlite_profile is not None:
+            data_manager.sqlite_profile.install(self.engine.sync_engine)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.omdb = omdb
+
+    async def close(self):
+        await super().close()
+        await self.engine.dispose()
+        if self.omdb is not None:
+            await self.omdb.aclose()
+
+    async def get_all_users(self):
+        async with self.session() as session:
+            return (await session.scalars(select(User))).all()
+
+    async def get_users_page(self, after=None, limit=50):
+        statement = select(User).order_by(User.id)
+        if after is not None:
+            statement = statement.where(User.id > after)
+        async with self.session() as session:
+            # Fetch one extra row to know whether another page follows
+            users = (await session.scalars(statement.limit(limit + 1))).all()
+        if len(users) > limit:
+            users = users[:limit]
+            return users, users[-1].id
+        return users, None
+
+    async def get_user_by_email(self, email):
+        async with self.session() as session:
+            user = (await session.scalars(
+                select(User).where(User.email == email))).first()
+        if user is None:
+            return None
+        return {**user.to_dict(), 'password': user.password}
+
+    async def get_user_movies(self, user_id):
+        async with self.session() as session:
+            user_favorite_movies = (await session.execute(
+                select(UserMovies, Movies).
+                join(Movies, UserMovies.movie_id == Movies.movie_id).
+                where(UserMovies.user_id == user_id))).all()
+            user = await session.get(User, user_id)
+        return user_favorite_movies, user
+
+    async def add_user(self, name, email, password):
+        async with self.session() as session:
+            session.add(User(name=name, email=email, password=password))
+            await session.commit()
+
+    async def update_password(self, user_id, password_hash):
+        async with self.session() as session:
+            user = await session.get(User, user_id)
+            if user is None:
+                print("Invalid user_id")
+                return
+            user.password = password_hash
+            await session.commit()
+
+    async def _find_movie_id(self, session, movie_dict_data):
+        # Find the stored movie for an OMDb response, by imdbID or title
+        imdb_id = movie_dict_data.get('imdbID')
+        if imdb_id:
+            movie_id = (await session.scalars(select(Movies.movie_id).where(
+                Movies.imdb_id == imdb_id))).first()
+            if movie_id is not None:
+                return movie_id
+        return (await session.scalars(select(Movies.movie_id).where(
+            Movies.title == movie_dict_data['Title']))).first()
+
+    async def _link_movie(self, session, user_id, movie_id):
+        has_movie = (await session.scalars(select(UserMovies.id).where(
+            UserMovies.user_id == user_id,
+            UserMovies.movie_id == movie_id))).first() is not None
+        if not has_movie:
+            session.add(UserMovies(user_id=user_id, movie_id=movie_id,
+                                   note=""))
+            await session.commit()
+        return not has_movie
+
+    async def add_movie(self, user_id, movie_title):
+        # Same results as SQLiteDataManager.add_movie
+        async with self.session() as session:
+            movie_id = (await session.scalars(select(Movies.movie_id).where(
+                Movies.title == movie_title))).first()
+            if movie_id is not None:
+                if not await self._link_movie(session, user_id, movie_id):
+                    return "Movie already exists in your collection."
+                return "Movie already exists in the database."
+
+        # No session is open while waiting for OMDb
+        if self.omdb is None:
+            self.omdb = make_async_omdb_client()
+        movie_dict_data = await self.omdb.fetch_movie(movie_title)
+        if movie_dict_data['Response'] == 'False':
+            return "Movie not found!"
+
+        async with self.session() as session:
+            # The typed title may differ from OMDb's canonical one
+            movie_id = await self._find_movie_id(session, movie_dict_data)
+            if movie_id is None:
+                new_movie = Movies(**movie_fields(movie_dict_data))
+                session.add(new_movie)
+                try:
+                    await session.flush()
+                    movie_id = new_movie.movie_id
+                except IntegrityError:
+                    # A concurrent add_movie of the same title stored it
+                    # while this one was waiting for OMDb
+                    await session.rollback()
+                    movie_id = await self._find_movie_id(session,
+                                                         movie_dict_data)
+            if not await self._link_movie(session, user_id, movie_id):
+                return "Movie already exists in your collection."
+        return "Movie added to the database and UserMovies."
+
+    async def delete_movie(self, user_id, movie_id):
+        async with self.session() as session:
+            movie_to_delete = (await session.scalars(select(UserMovies).where(
+                UserMovies.movie_id == movie_id,
+                UserMovies.user_id == user_id))).first()
+            if movie_to_delete is None:
+                print("Invalid user_id or movie_id")
+                return None
+            await session.delete(movie_to_delete)
+            await session.commit()
+            return True
+
+    async def add_review(self, user_id, movie_id, rating, review):
+        async with self.session() as session:
+            session.add(Reviews(user_id=user_id, movie_id=movie_id,
+                                rating=rating, review_text=review))
+            await session.commit()
+
+    async def get_reviews_for_movie(self, movie_id):
+        async with self.session() as session:
+            return (await session.scalars(select(Reviews).where(
+                Reviews.movie_id == movie_id))).all()
@@ -0,0 +1,473 @@
+"""
+Compact binary storage for users and their movie collections (.mwb).
+
+The file is a 4-byte magic number followed by an append-only log of user
+records. Each record holds one complete user:
+
+    header   length of the payload, CRC-32 of the payload, user id
+             (three little-endian unsigned 32-bit ints)
+    payload  name, email and password, then the number of movies and per
+             movie its id, name, director, year, rating and note
+
+Values are tagged (absent, None, string, float or int), so ratings keep
+their type and a missing key stays missing. A mutation appends a new
+version of the one user it touches; the offset index (user id -> latest
+record) is rebuilt by scanning the headers, and compact() rewrites the file
+without the old versions once they outweigh the live ones.
+
+Reads map the file into memory and decode only the records they need: a
+user's name and email without their movies, their movies only when asked
+for.
+"""
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections.abc import Mapping
+import requests
+from .DataManager import DataManagerInterface
+from .CollectionQuery import CollectionQuery, movies_page
+from .FileLock import atomic_write, file_lock, read_locked, write_locked
+from .JSONDataManager import build_email_index, file_signature, users_page
+from .MovieFacets import parse_rating
+from .OMDbClient import omdb_client
+from .SearchIndex import movies_index, users_index
+
+MAGIC = b'MWB1'
+
+# Payload length, CRC-32 of the payload, user id
+RECORD_HEADER = struct.Struct('<III')
+
+USER_FIELDS = ('name', 'email', 'password')
+MOVIE_FIELDS = ('name', 'director', 'year', 'rating', 'note')
+
+# Value tags
+ABSENT, NONE, STRING, FLOAT, INTEGER = range(5)
+
+# Decoded in place of an absent value
+MISSING = object()
+
+LENGTH = struct.Struct('<I')
+DOUBLE = struct.Struct('<d')
+INT64 = struct.Struct('<q')
+
+# Old record versions are only compacted away once the file is this big
+COMPACT_MIN_BYTES = 64 * 1024
+
+
+def encode_value(buffer, value):
+    if value is None:
+        buffer.append(NONE)
+    elif isinstance(value, float):
+        buffer.append(FLOAT)
+        buffer += DOUBLE.pack(value)
+    elif isinstance(value, int):
+        buffer.append(INTEGER)
+        buffer += INT64.pack(value)
+    else:
+        data = str(value).encode('utf-8')
+        buffer.append(STRING)
+        buffer += LENGTH.pack(len(data))
+        buffer += data
+
+
+def decode_value(buffer, position):
+    """
+    Returns:
+        tuple: (value, position after it); the value is MISSING for a
+        missing key.
+    """
+    tag = buffer[position]
+    position += 1
+    if tag == STRING:
+        (length,) = LENGTH.unpack_from(buffer, position)
+        position += LENGTH.size
+        return (buffer[position:position + length].decode('utf-8'),
+                position + length)
+    if tag == FLOAT:
+        return DOUBLE.unpack_from(buffer, position)[0], position + DOUBLE.size
+    if tag == INTEGER:
+        return INT64.unpack_from(buffer, position)[0], position + INT64.size
+    if tag == NONE:
+        return None, position
+    if tag == ABSENT:
+        return MISSING, position
+    raise ValueError(f"Unknown value tag: {tag}")
+
+
+def encode_fields(buffer, data, fields):
+    for field in fields:
+        if field in data:
+            encode_value(buffer, data[field])
+        else:
+            buffer.append(ABSENT)
+
+
+def decode_fields(buffer, position, fields):
+    data = {}
+    for field in fields:
+        value, position = decode_value(buffer, position)
+        if value is not MISSING:
+            data[field] = value
+    return data, position
+
+
+def encode_record(user_id, user):
+    """
+    Encode one user, with their movies, as a record.
+    Returns:
+        bytes: Record header and payload.
+    """
+    payload = bytearray()
+    encode_fields(payload, user, USER_FIELDS)
+    movies = user.get('movies') or {}
+    payload += LENGTH.pack(len(movies))
+    for movie_id, movie in movies.items():
+        encode_value(payload, str(movie_id))
+        encode_fields(payload, movie, MOVIE_FIELDS)
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload),
+                              int(user_id)) + payload
+
+
+def decode_movies(buffer, position):
+    # The movies of a record, starting right after the user's fields
+    (count,) = LENGTH.unpack_from(buffer, position)
+    position += LENGTH.size
+    movies = {}
+    for _ in range(count):
+        movie_id, position = decode_value(buffer, position)
+        movies[movie_id], position = decode_fields(buffer, position,
+                                                   MOVIE_FIELDS)
+    return movies
+
+
+class BinaryUser(Mapping):
+    """
+    One user read from a record: name, email and password are decoded up
+    front, the movies on first access.
+    """
+
+    def __init__(self, buffer, position):
+        self._buffer = buffer
+        self._details, self._movies_position = decode_fields(
+            buffer, position, USER_FIELDS)
+        self._movies = None
+
+    def __getitem__(self, key):
+        if key == 'movies':
+            if self._movies is None:
+                self._movies = decode_movies(self._buffer,
+                                             self._movies_position)
+            return self._movies
+        return self._details[key]
+
+    def __iter__(self):
+        yield from self._details
+        yield 'movies'
+
+    def __len__(self):
+        return len(self._details) + 1
+
+
+class BinaryUsers(Mapping):
+    """
+    Read-only view of all users (user id -> BinaryUser) as of the moment
+    it was taken; each user is decoded when looked up.
+    """
+
+    def __init__(self, buffer, records):
+        self._buffer = buffer
+        self._records = records
+
+    def __getitem__(self, user_id):
+        offset, _ = self._records[user_id]
+        return BinaryUser(self._buffer, offset + RECORD_HEADER.size)
+
+    def __contains__(self, user_id):
+        return user_id in self._records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+
+class BinaryUserIndex:
+    """
+    Offset index of a .mwb file: user id -> (offset, size) of the user's
+    latest record. Kept up to date by scanning record headers; appends only
+    scan the new tail.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.records = {}
+        self.signature = None
+        # Bytes of valid records; a torn record after them is cut off by
+        # the next append
+        self.end = 0
+        self.live_bytes = 0
+        self.buffer = b''
+
+    def refresh(self):
+        # Make sure the index describes the current version of the file
+        signature = file_signature(self.filename)
+        if signature == self.signature:
+            return
+        if signature is None:
+            self.records, self.signature, self.buffer = {}, None, b''
+            self.end = self.live_bytes = 0
+            return
+        appended = (self.signature is not None
+                    and signature[2] == self.signature[2]
+                    and signature[1] > self.signature[1])
+        with open(self.filename, 'rb') as file:
+            # A new mapping for every version: views handed out earlier
+            # keep the one they were made from
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a binary users file: {self.filename}")
+        if appended:
+            self._scan(self.end)
+        else:
+            # Rewritten by compaction or another process: start over, and
+            # copy so older views keep their records
+            self.records = {}
+            self.live_bytes = 0
+            self._scan(len(MAGIC))
+        self.signature = signature
+
+    def _scan(self, position):
+        records = dict(self.records)
+        buffer = self.buffer
+        while position + RECORD_HEADER.size <= len(buffer):
+            length, crc, user_id = RECORD_HEADER.unpack_from(buffer, position)
+            start = position + RECORD_HEADER.size
+            if start + length > len(buffer) or \
+                    zlib.crc32(buffer[start:start + length]) != crc:
+                # Torn write at the end of the file
+                break
+            user_id = str(user_id)
+            previous = records.get(user_id)
+            if previous:
+                self.live_bytes -= previous[1]
+            records[user_id] = (position, RECORD_HEADER.size + length)
+            self.live_bytes += RECORD_HEADER.size + length
+            position = start + length
+        self.records = records
+        self.end = position
+
+    def users(self):
+        return BinaryUsers(self.buffer, self.records)
+
+    def read_user(self, user_id):
+        # Decode one user, or None
+        if user_id not in self.records:
+            return None
+        return self.users()[user_id]
+
+    def append(self, records):
+        """
+        Append encoded records and make them durable.
+        Args:
+            records (list): (user_id, record bytes) pairs.
+        """
+        if self.signature is None:
+            with atomic_write(self.filename, 'wb') as file:
+                file.write(MAGIC)
+            self.refresh()
+        elif self.signature[1] > self.end:
+            os.truncate(self.filename, self.end)
+        with open(self.filename, 'ab') as file:
+            file.write(b''.join(record for _, record in records))
+            file.flush()
+            os.fsync(file.fileno())
+        self.refresh()
+
+    def dead_bytes(self):
+        return self.end - len(MAGIC) - self.live_bytes
+
+
+class BinaryDataManager(DataManagerInterface):
+    def __init__(self, filename, compact_min_bytes=COMPACT_MIN_BYTES):
+        self.filename = filename
+        # Old record versions are compacted away once they take more space
+        # than the live records and the file exceeds compact_min_bytes
+        self.compact_min_bytes = compact_min_bytes
+        self._index = BinaryUserIndex(filename)
+        # Indexes derived from the users (email lookup, search),
+        # name -> (file signature, index); rebuilt when the file changes
+        self._derived = {}
+        # Public methods hold the file's shared (read) or exclusive (write)
+        # lock, across threads and processes; readers of this instance
+        # refresh the offset index one at a time
+        self._lock = file_lock(filename)
+        self._refresh_lock = threading.Lock()
+
+    def _refresh(self):
+        with self._refresh_lock:
+            self._index.refresh()
+            return self._index
+
+    def _save_user(self, user_id, user):
+        # Append a new version of one user
+        index = self._refresh()
+        index.append([(user_id, encode_record(user_id, user))])
+        if index.dead_bytes() > max(index.live_bytes,
+                                    self.compact_min_bytes):
+            self.compact()
+
+    def _user_data(self, user_id):
+        # A mutable copy of one user, or None
+        user = self._refresh().read_user(user_id)
+        if user is None:
+            return None
+        return {**user, 'movies': dict(user['movies'])}
+
+    @write_locked
+    def compact(self):
+        """
+        Rewrite the file with only the latest version of every user.
+        """
+        index = self._refresh()
+        if index.signature is None:
+            return False
+        buffer = index.buffer
+        with atomic_write(self.filename, 'wb') as file:
+            file.write(MAGIC)
+            for offset, size in sorted(index.records.values()):
+                file.write(buffer[offset:offset + size])
+        self._refresh()
+        return True
+
+    @read_locked
+    def get_all_users(self):
+        # Return a mapping of all users; each is decoded on access
+        return self._refresh().users()
+
+    @read_locked
+    def get_users_page(self, after=None, limit=50):
+        return users_page(self._refresh().users(), after, limit)
+
+    def _derived_index(self, name, build):
+        index = self._refresh()
+        cached = self._derived.get(name)
+        if cached is None or cached[0] != index.signature:
+            cached = (index.signature, build(index.users()))
+            self._derived[name] = cached
+        return cached[1]
+
+    @read_locked
+    def get_user_by_email(self, email):
+        # The email index only decodes names, emails and passwords
+        user = self._derived_index('email', build_email_index).get(email)
+        return dict(user) if user else None
+
+    @read_locked
+    def search_movies(self, query, user_id=None, limit=20, offset=0):
+        """
+        Search movie names, directors and notes.
+        Returns:
+            tuple: (list of movie dicts with user_id and movie_id,
+                    next offset or None).
+        """
+        users, index = self._derived_index(
+            'movies', lambda users: (users, movies_index(users)))
+        where = (lambda doc_id: doc_id[0] == user_id) if user_id else None
+        doc_ids, next_offset = index.search(query, limit, offset, where)
+        results = [{'user_id': doc_user_id, 'movie_id': movie_id,
+                    **users[doc_user_id]['movies'][movie_id]}
+                   for doc_user_id, movie_id in doc_ids]
+        return results, next_offset
+
+    @read_locked
+    def search_users(self, query, limit=20, offset=0):
+        users, index = self._derived_index(
+            'users', lambda users: (users, users_index(users)))
+        user_ids, next_offset = index.search(query, limit, offset)
+        return {user_id: users[user_id] for user_id in user_ids}, next_offset
+
+    @read_locked
+    def get_collection_page(self, user_id, query=None):
+        return movies_page(self.get_user_movies(user_id),
+                           query or CollectionQuery())
+
+    @read_locked
+    def get_user_movies(self, user_id):
+        # Decode only this user's record
+        user = self._refresh().read_user(user_id)
+        return user['movies'] if user else None
+
+    @write_locked
+    def add_user(self, user_details):
+        index = self._refresh()
+        user_id = str(max(map(int, index.records), default=0) + 1)
+        self._save_user(user_id, user_details)
+        return user_id
+
+    @write_locked
+    def update_password(self, user_id, password_hash):
+        user = self._user_data(user_id)
+        if user is None:
+            print("Invalid user_id")
+            return
+        user['password'] = password_hash
+        self._save_user(user_id, user)
+
+    def add_movie(self, user_id, movie_title):
+        # The OMDb lookup runs before taking the write lock
+        try:
+            movie_dict_data = omdb_client.fetch_movie(movie_title)
+            if movie_dict_data['Response'] == 'False':
+                return False
+            # Ratings are stored as floats, "N/A" as is
+            rating = parse_rating(movie_dict_data['imdbRating'])
+            movie = {'name': movie_dict_data['Title'],
+                     'director': movie_dict_data['Director'],
+                     'year': movie_dict_data['Year'],
+                     'rating': movie_dict_data['imdbRating']
+                     if rating is None else rating,
+                     'note': ''}
+        except requests.exceptions.RequestException as e:
+            print(f"Error making API request: {e}")
+            return None
+        except KeyError as e:
+            print(f"Error processing movie data: {e}")
+            return None
+        self._insert_movie(user_id, movie)
+
+    @write_locked
+    def _insert_movie(self, user_id, movie):
+        user = self._user_data(user_id)
+        if user is None:
+            print("Invalid user_id")
+            return
+        movie_id = str(max(map(int, user['movies']), default=0) + 1)
+        user['movies'][movie_id] = movie
+        self._save_user(user_id, user)
+
+    @write_locked
+    def update_movie(self, user_id, movie_id, movie_title, movie_director,
+                     movie_rating, movie_year, movie_note=''):
+        user = self._user_data(user_id)
+        if user is None or movie_id not in user['movies']:
+            print("Invalid user_id or movie_id")
+            return
+        user['movies'][movie_id] = {'name': movie_title,
+                                    'director': movie_director,
+                                    'year': movie_year,
+                                    'rating': movie_rating,
+                                    'note': movie_note}
+        self._save_user(user_id, user)
+
+    @write_locked
+    def delete_movie(self, user_id, movie_id):
+        user = self._user_data(user_id)
+        if user is None or movie_id not in user['movies']:
+            print("Invalid user_id or movie_id")
+            return
+        del user['movies'][movie_id]
+        self._save_user(user_id, user)
+        return True
@@ -0,0 +1,102 @@
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from .OMDbCache import normalize_title
+
+# Columns/keys that may hold the movie title in an import file
+TITLE_FIELDS = ('title', 'Title', 'movie_title', 'Movie Name', 'name')
+
+# Upper bound for concurrent OMDb lookups of one import
+MAX_WORKERS = 16
+
+
+def parse_titles(text, filename=''):
+    """
+    Extract movie titles from an import file.
+    Supported formats:
+        JSON: a list of titles, a list of objects with a title field,
+              or an object with a "titles" list.
+        CSV:  a column named like one of TITLE_FIELDS, else the first column.
+        Text: one title per line.
+    Args:
+        text (str): File contents.
+        filename (str): Used to pick the format by extension.
+    Returns:
+        list: Titles in file order.
+    Raises:
+        ValueError: If a JSON file is malformed or holds no list of titles.
+    """
+    name = filename.lower()
+    stripped = text.lstrip()
+    if name.endswith('.json') or (not name.endswith('.csv')
+                                  and stripped[:1] in ('[', '{')):
+        return titles_from_json(json.loads(text))
+    if name.endswith('.csv'):
+        return titles_from_csv(text)
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def titles_from_json(data):
+    # Raises ValueError unless data is a list of titles or title objects
+    if isinstance(data, dict):
+        data = data.get('titles', [])
+    if not isinstance(data, list) or \
+            not all(isinstance(item, (str, dict)) for item in data):
+        raise ValueError("expected a list of titles")
+    titles = []
+    for item in data:
+        if isinstance(item, dict):
+            item = next((item[field] for field in TITLE_FIELDS
+                         if item.get(field)), '')
+        if isinstance(item, str) and item.strip():
+            titles.append(item.strip())
+    return titles
+
+
+def titles_from_csv(text):
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return []
+    header = rows[0]
+    column = next((header.index(field) for field in TITLE_FIELDS
+                   if field in header), None)
+    if column is None:
+        # No recognised header: every row holds a title in the first column
+        column, rows = 0, [[]] + rows
+    return [row[column].strip() for row in rows[1:]
+            if len(row) > column and row[column].strip()]
+
+
+def unique_titles(titles):
+    # Drop titles that only differ in case or spacing, keeping file order
+    seen = set()
+    result = []
+    for title in titles:
+        key = normalize_title(title)
+        if key and key not in seen:
+            seen.add(key)
+            result.append(title)
+    return result
+
+
+def fetch_movies(titles, omdb_client, max_workers=8):
+    """
+    Fetch OMDb data for many titles with a bounded pool of worker threads.
+    Returns:
+        dict: title -> OMDb response dict, or the exception raised for it.
+    """
+    max_workers = max(1, min(max_workers, MAX_WORKERS))
+    results = {}
+    if not titles:
+        return results
+    with ThreadPoolExecutor(max_workers=max_workers,
+                            thread_name_prefix='bulk-import') as executor:
+        futures = {title: executor.submit(omdb_client.fetch_movie, title)
+                   for title in titles}
+        for title, future in futures.items():
+            try:
+                results[title] = future.result()
+            except Exception as error:
+                results[title] = error
+    return results
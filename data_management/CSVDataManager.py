@@ -1,11 +1,23 @@
 import csv
+import io
 import json
 import os
-import requests
+import threading
+from collections.abc import Mapping
 from .DataManager import DataManagerInterface
+from .CollectionQuery import CollectionQuery, movies_page
+from .FileLock import atomic_write, file_lock, read_locked, write_locked
+from .JSONDataManager import build_email_index, file_signature, users_page
+from .OMDbClient import omdb_client
+from .SearchIndex import movies_index, users_index
 
-# OMDB API to get movie data
-API: str = 'http://www.omdbapi.com/?apikey=6f0c3bf6&t='
+FIELD_NAMES = ['User ID', 'User Name', 'User Email', 'User Password', 'Movie ID',
+               'Movie Name', 'Director', 'Year', 'Rating', 'Note']
+
+EMPTY_MOVIE = {'name': '', 'director': '', 'year': '', 'rating': '', 'note': ''}
+
+# Size of the chunks copied when splicing a user's rows into the file
+COPY_CHUNK_SIZE = 1024 * 1024
 
 
 def read_csv_file(file_path):
@@ -14,89 +26,407 @@ def read_csv_file(file_path):
     with open(file_path, 'r') as file:
         csv_reader = csv.DictReader(file)
         for row in csv_reader:
-            user_id = row['User ID']
-            user_name = row['User Name']
-            user_email = row['User Email']
-            user_password = row['User Password']
-            movie_id = row['Movie ID']
-            movie_name = row['Movie Name']
-            director = row['Director']
-            year = row['Year']
-            rating = row['Rating']
-            note = row['Note']
-
-            # Check if the user exists in the dictionary, if not, create a new user
-            if user_email not in users:
-                users[user_id] = {
-                    'name': user_name,
-                    'email': user_email,
-                    'password': user_password,
-                    'movies': {}
-                }
-
-            # Add the movie to the user's dictionary of movies
-            users[user_id]['movies'][movie_id] = {
-                'name': movie_name,
-                'director': director,
-                'year': year,
-                'rating': rating,
-                'note': note
-            }
+            add_csv_row(users, row)
 
     return users
 
 
-def write_csv_file(file_path, users):
-    field_names = ['User ID', 'User Name', 'User Email', 'User Password', 'Movie ID',
-                   'Movie Name', 'Director', 'Year', 'Rating', 'Note']
+def add_csv_row(users, row):
+    user_id = row['User ID']
+    user_name = row['User Name']
+    user_email = row['User Email']
+    user_password = row['User Password']
+    movie_id = row['Movie ID']
+    movie_name = row['Movie Name']
+    director = row['Director']
+    year = row['Year']
+    rating = row['Rating']
+    note = row['Note']
+
+    # Check if the user exists in the dictionary, if not, create a new user
+    if user_id not in users:
+        users[user_id] = {
+            'name': user_name,
+            'email': user_email,
+            'password': user_password,
+            'movies': {}
+        }
+
+    # Add the movie to the user's dictionary of movies
+    users[user_id]['movies'][movie_id] = {
+        'name': movie_name,
+        'director': director,
+        'year': year,
+        'rating': rating,
+        'note': note
+    }
+
+
+def user_csv_rows(user_id, user_data):
+    # Yield one CSV row per movie of the user
+    user_name = user_data['name']
+    user_email = user_data['email']
+    user_password = user_data['password']
+    movies = user_data['movies']
+
+    for movie_id, movie_data in movies.items():
+        movie_name = movie_data['name']
+        director = movie_data['director']
+        year = movie_data['year']
+        rating = movie_data['rating']
+        note = movie_data['note']
+
+        yield {
+            'User ID': user_id,
+            'User Name': user_name,
+            'User Email': user_email,
+            'User Password': user_password,
+            'Movie ID': movie_id,
+            'Movie Name': movie_name,
+            'Director': director,
+            'Year': year,
+            'Rating': rating,
+            'Note': note
+        }
 
-    with open(file_path, 'w', newline='') as file:
-        csv_writer = csv.DictWriter(file, fieldnames=field_names)
+
+def write_csv_file(file_path, users):
+    # Replace the file atomically, so readers never see a half-written file
+    # and the byte-offset index notices the new version
+    with atomic_write(file_path, newline='') as file:
+        csv_writer = csv.DictWriter(file, fieldnames=FIELD_NAMES)
         csv_writer.writeheader()
 
         for user_id, user_data in users.items():
-            user_name = user_data['name']
-            user_email = user_data['email']
-            user_password = user_data['password']
-            movies = user_data['movies']
-
-            for movie_id, movie_data in movies.items():
-                movie_name = movie_data['name']
-                director = movie_data['director']
-                year = movie_data['year']
-                rating = movie_data['rating']
-                note = movie_data['note']
-
-                csv_writer.writerow({
-                    'User ID': user_id,
-                    'User Name': user_name,
-                    'User Email': user_email,
-                    'User Password': user_password,
-                    'Movie ID': movie_id,
-                    'Movie Name': movie_name,
-                    'Director': director,
-                    'Year': year,
-                    'Rating': rating,
-                    'Note': note
-                })
+            for row in user_csv_rows(user_id, user_data):
+                csv_writer.writerow(row)
 
 
-class CSVDataManager(DataManagerInterface):
+def encode_csv_rows(rows, header=False):
+    # Serialize rows exactly as csv.DictWriter does in write_csv_file
+    buffer = io.StringIO(newline='')
+    csv_writer = csv.DictWriter(buffer, fieldnames=FIELD_NAMES)
+    if header:
+        csv_writer.writeheader()
+    for row in rows:
+        csv_writer.writerow(row)
+    return buffer.getvalue().encode('utf-8')
+
+
+def scan_csv_records(file, offset, end_offset):
+    """
+    Yield (start, end, user_id) for every CSV record between two byte
+    offsets. Lines are joined while a quoted field is still open, so notes
+    that contain newlines are handled.
+    """
+    file.seek(offset)
+    start = offset
+    pending = b''
+    while start + len(pending) < end_offset:
+        line = file.readline(end_offset - start - len(pending))
+        if not line:
+            break
+        pending += line
+        if pending.count(b'"') % 2:
+            continue
+        end = start + len(pending)
+        if pending.strip():
+            text = pending.decode('utf-8')
+            user_id = next(csv.reader(io.StringIO(text, newline='')))[0]
+            yield start, end, user_id
+        start = end
+        pending = b''
+
+
+class CSVUserIndex:
+    """
+    Byte-offset index of users.csv: user id -> list of [start, end) spans
+    holding that user's rows. Persisted next to the CSV file as
+    <filename>.idx together with the signature of the file it describes.
+    """
+
     def __init__(self, filename):
         self.filename = filename
+        self.index_filename = filename + '.idx'
+        self.spans = {}
+        self.signature = None
+        # Threads reading through the same index refresh it one at a time
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self):
+        # Make sure the index describes the current version of the CSV file
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self):
+        signature = file_signature(self.filename)
+        if signature is None:
+            self.spans, self.signature = {}, None
+            return
+        if signature == self.signature:
+            return
+        if self.signature is None:
+            self._load()
+            if signature == self.signature:
+                return
+        if (self.signature is not None and signature[2] == self.signature[2]
+                and signature[1] > self.signature[1]):
+            # Rows were appended: only scan the new tail
+            self._scan(self.signature[1])
+        else:
+            self.spans = {}
+            self._scan(0)
+            self.save()
+
+    def _load(self):
+        try:
+            with open(self.index_filename, 'r') as file:
+                data = json.load(file)
+            self.spans = data['users']
+            self.signature = tuple(data['signature'])
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+            self.spans, self.signature = {}, None
+
+    def _scan(self, offset):
+        # Only scan up to the size seen now; later appends are picked up by
+        # the next refresh
+        signature = file_signature(self.filename)
+        with open(self.filename, 'rb') as file:
+            if offset == 0:
+                # Skip the header row
+                file.readline()
+                offset = file.tell()
+            for start, end, user_id in scan_csv_records(file, offset,
+                                                        signature[1]):
+                self.add_span(user_id, start, end)
+        self.signature = signature
+
+    def add_span(self, user_id, start, end):
+        spans = self.spans.setdefault(user_id, [])
+        if spans and spans[-1][1] == start:
+            spans[-1][1] = end
+        else:
+            spans.append([start, end])
+
+    def save(self):
+        data = {'signature': self.signature, 'users': self.spans}
+        # Other processes may load the index at any time
+        with atomic_write(self.index_filename) as file:
+            json.dump(data, file)
+
+    def read_user(self, user_id):
+        # Parse only the rows of one user
+        spans = self.spans.get(user_id)
+        if not spans:
+            return None
+        users = {}
+        with open(self.filename, 'rb') as file:
+            for start, end in spans:
+                file.seek(start)
+                text = file.read(end - start).decode('utf-8')
+                for row in csv.DictReader(io.StringIO(text, newline=''),
+                                          fieldnames=FIELD_NAMES):
+                    add_csv_row(users, row)
+        return users.get(user_id)
+
+    def append_rows(self, user_id, data):
+        with open(self.filename, 'ab') as file:
+            start = file.tell()
+            if start == 0:
+                header = encode_csv_rows([], header=True)
+                file.write(header)
+                start = len(header)
+            file.write(data)
+        self.add_span(user_id, start, start + len(data))
+        self.signature = file_signature(self.filename)
+
+    def replace_user(self, user_id, data):
+        """
+        Replace all rows of one user with new rows. The new rows take the
+        place of the user's first span; every other byte of the file is
+        copied as is, without being parsed.
+        """
+        spans = self.spans.get(user_id, [])
+        if not spans:
+            if data:
+                self.append_rows(user_id, data)
+            return
+        size = self.signature[1]
+        with atomic_write(self.filename, 'wb') as tmp_file, \
+                open(self.filename, 'rb') as file:
+            position = 0
+            for index, (start, end) in enumerate(spans):
+                copy_range(file, tmp_file, position, start)
+                if index == 0:
+                    tmp_file.write(data)
+                position = end
+            copy_range(file, tmp_file, position, size)
+        self._shift(user_id, spans, data)
+        self.signature = file_signature(self.filename)
+        self.save()
+
+    def _shift(self, user_id, old_spans, data):
+        # Move the spans of the other users to their new offsets
+        changes = []
+        for index, (start, end) in enumerate(old_spans):
+            inserted = len(data) if index == 0 else 0
+            changes.append((start, end, inserted - (end - start)))
+        for other_id, spans in self.spans.items():
+            if other_id == user_id:
+                continue
+            for span in spans:
+                delta = sum(change for start, end, change in changes
+                            if end <= span[0])
+                span[0] += delta
+                span[1] += delta
+        first_start = old_spans[0][0]
+        if data:
+            self.spans[user_id] = [[first_start, first_start + len(data)]]
+        else:
+            del self.spans[user_id]
+
+
+class CSVUsers(Mapping):
+    """
+    Read-only view of the users of an indexed CSV file, as listed by the
+    index when it was taken; each user's rows are read when looked up.
+    """
+
+    def __init__(self, user_ids, read_user):
+        self._user_ids = user_ids
+        self._read_user = read_user
+
+    def __getitem__(self, user_id):
+        user = self._read_user(user_id) if user_id in self._user_ids else None
+        if user is None:
+            raise KeyError(user_id)
+        return user
+
+    def __contains__(self, user_id):
+        return user_id in self._user_ids
+
+    def __iter__(self):
+        return iter(self._user_ids)
+
+    def __len__(self):
+        return len(self._user_ids)
+
+
+def copy_range(source, destination, start, end):
+    source.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = source.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        destination.write(chunk)
+        remaining -= len(chunk)
+
+
+class CSVDataManager(DataManagerInterface):
+    def __init__(self, filename, indexed=False):
+        self.filename = filename
+        # Indexed mode keeps a byte-offset index of each user's rows so
+        # single-user reads and writes touch only that user's rows
+        self.indexed = indexed
+        self._index = CSVUserIndex(filename) if indexed else None
+        # Indexes derived from the users (email lookup, search),
+        # name -> (file signature, index); rebuilt when the file changes
+        self._derived = {}
+        # Public methods hold the file's shared (read) or exclusive (write)
+        # lock, across threads and processes
+        self._lock = file_lock(filename)
 
+    @read_locked
     def get_all_users(self):
         # Return a dictionary of all users
+        if self.indexed:
+            # Only the users looked up are read from the file
+            self._index.refresh()
+            return CSVUsers(dict.fromkeys(self._index.spans), self._read_user)
         users = read_csv_file(self.filename)
         return users
 
+    @read_locked
+    def _read_user(self, user_id):
+        self._index.refresh()
+        return self._index.read_user(user_id)
+
+    @read_locked
+    def get_users_page(self, after=None, limit=50):
+        if self.indexed:
+            # Only the rows of the users on the page are read
+            self._index.refresh()
+            spans_page, next_cursor = users_page(self._index.spans, after,
+                                                 limit)
+            page = {user_id: self._index.read_user(user_id)
+                    for user_id in spans_page}
+            return page, next_cursor
+        return users_page(read_csv_file(self.filename), after, limit)
+
+    def _derived_index(self, name, build):
+        signature = file_signature(self.filename)
+        cached = self._derived.get(name)
+        if cached is None or cached[0] != signature:
+            users = read_csv_file(self.filename) if signature else {}
+            cached = (signature, build(users))
+            self._derived[name] = cached
+        return cached[1]
+
+    @read_locked
+    def get_user_by_email(self, email):
+        # Look the user up in the email index instead of scanning all users
+        user = self._derived_index('email', build_email_index).get(email)
+        return dict(user) if user else None
+
+    @read_locked
+    def search_movies(self, query, user_id=None, limit=20, offset=0):
+        # The index keeps the users it was built from for the results
+        users, index = self._derived_index(
+            'movies', lambda users: (users, movies_index(users)))
+        where = (lambda doc_id: doc_id[0] == user_id) if user_id else None
+        doc_ids, next_offset = index.search(query, limit, offset, where)
+        results = [{'user_id': doc_user_id, 'movie_id': movie_id,
+                    **users[doc_user_id]['movies'][movie_id]}
+                   for doc_user_id, movie_id in doc_ids]
+        return results, next_offset
+
+    @read_locked
+    def search_users(self, query, limit=20, offset=0):
+        users, index = self._derived_index(
+            'users', lambda users: (users, users_index(users)))
+        user_ids, next_offset = index.search(query, limit, offset)
+        return {user_id: users[user_id] for user_id in user_ids}, next_offset
+
+    @read_locked
+    def get_collection_page(self, user_id, query=None):
+        return movies_page(self.get_user_movies(user_id),
+                           query or CollectionQuery())
+
+    @read_locked
     def get_user_movies(self, user_id):
         # Return a dictionary of all movies for a given user
+        if self.indexed:
+            self._index.refresh()
+            user = self._index.read_user(user_id)
+            return user["movies"] if user else None
         users = read_csv_file(self.filename)
         user = users.get(user_id, None)
         return user["movies"]
 
+    @write_locked
     def add_user(self, name, email, password):
+        if self.indexed:
+            self._index.refresh()
+            if self._index.spans:
+                user_id = str(max(int(user_id) for user_id in self._index.spans) + 1)
+            else:
+                user_id = '1'
+            user_data = {'name': name, 'email': email, 'password': password,
+                         'movies': {'': dict(EMPTY_MOVIE)}}
+            self._index.append_rows(
+                user_id, encode_csv_rows(user_csv_rows(user_id, user_data)))
+            return
         users = {}
         if os.path.exists(self.filename):
             users = read_csv_file(self.filename)
@@ -108,41 +438,98 @@ class CSVDataManager(DataManagerInterface):
                 '': {'name': '', 'director': '', 'year': '', 'rating': '', 'note': ''}}}
         write_csv_file(self.filename, users)
 
-    def add_movie(self, user_id, movie_title):
+    @write_locked
+    def update_password(self, user_id, password_hash):
+        if self.indexed:
+            self._index.refresh()
+            user = self._index.read_user(user_id)
+            if user is None:
+                print("Invalid user_id")
+                return
+            user["password"] = password_hash
+            self._index.replace_user(
+                user_id, encode_csv_rows(user_csv_rows(user_id, user)))
+            return
         users = read_csv_file(self.filename)
         if users is not None:
-            user_movies = users.get(user_id, {}).get("movies", {})
-            response = requests.get(API + movie_title)
-            response.raise_for_status()
-            movie_dict_data = json.loads(response.text)
-            if movie_dict_data['Response'] == 'False':
-                return False
-            else:
-                movies_id_list = list(users[user_id]['movies'].keys())
-
-                if len(movies_id_list) == 0 or movies_id_list[-1] == '':
-                    movie_id = 1
-                else:
-                    movie_id = int(movies_id_list[-1]) + 1
-
-                if users[user_id]['movies'] == {'': {'name': '', 'director': '', 'year': '', 'rating': '', 'note': ''}}:
-                    users[user_id]['movies'][movie_id] = users[user_id]['movies'].pop(
-                        '')
-                    users[user_id]['movies'][movie_id] = {'name': movie_dict_data['Title'],
-                                                          'director': movie_dict_data['Director'],
-                                                          'rating': movie_dict_data['imdbRating'],
-                                                          'year': movie_dict_data['Year'],
-                                                          'note': ''}
-                else:
-                    users[user_id]['movies'][movie_id] = {'name': movie_dict_data['Title'],
-                                                          'director': movie_dict_data['Director'],
-                                                          'rating': movie_dict_data['imdbRating'],
-                                                          'year': movie_dict_data['Year'],
-                                                          'note': ''}
+            try:
+                users[user_id]["password"] = password_hash
+            except KeyError:
+                print("Invalid user_id")
+                return
+            write_csv_file(self.filename, users)
+
+    def add_movie(self, user_id, movie_title):
+        # The OMDb lookup runs before taking the write lock
+        movie_dict_data = omdb_client.fetch_movie(movie_title)
+        if movie_dict_data['Response'] == 'False':
+            return False
+        movie = {'name': movie_dict_data['Title'],
+                 'director': movie_dict_data['Director'],
+                 'rating': movie_dict_data['imdbRating'],
+                 'year': movie_dict_data['Year'],
+                 'note': ''}
+        if self.indexed:
+            return self._add_movie_indexed(user_id, movie)
+        self._add_movie(user_id, movie)
+
+    @write_locked
+    def _add_movie(self, user_id, movie):
+        users = read_csv_file(self.filename)
+        movies_id_list = list(users[user_id]['movies'].keys())
+
+        if len(movies_id_list) == 0 or movies_id_list[-1] == '':
+            movie_id = 1
+        else:
+            movie_id = int(movies_id_list[-1]) + 1
+
+        if users[user_id]['movies'] == {'': {'name': '', 'director': '', 'year': '', 'rating': '', 'note': ''}}:
+            # Replace the placeholder row written by add_user
+            users[user_id]['movies'].pop('')
+        users[user_id]['movies'][movie_id] = movie
         write_csv_file(self.filename, users)
 
+    @write_locked
+    def _add_movie_indexed(self, user_id, movie):
+        self._index.refresh()
+        user = self._index.read_user(user_id)
+        if user is None:
+            print("Invalid user_id")
+            return
+
+        movies_id_list = list(user['movies'].keys())
+        if len(movies_id_list) == 0 or movies_id_list[-1] == '':
+            movie_id = '1'
+        else:
+            movie_id = str(int(movies_id_list[-1]) + 1)
+
+        if user['movies'] == {'': EMPTY_MOVIE}:
+            # Replace the placeholder row written by add_user
+            user['movies'] = {movie_id: movie}
+            self._index.replace_user(
+                user_id, encode_csv_rows(user_csv_rows(user_id, user)))
+        else:
+            user['movies'] = {movie_id: movie}
+            self._index.append_rows(
+                user_id, encode_csv_rows(user_csv_rows(user_id, user)))
+
+    @write_locked
     def update_movie(self, user_id, movie_id, movie_title, movie_director,
                      movie_rating, movie_year, movie_note):
+        if self.indexed:
+            self._index.refresh()
+            user = self._index.read_user(user_id)
+            if user is None:
+                print("Invalid user_id or movie_id")
+                return
+            user["movies"][movie_id] = {'name': movie_title,
+                                        'director': movie_director,
+                                        'year': movie_year,
+                                        'rating': movie_rating,
+                                        'note': movie_note}
+            self._index.replace_user(
+                user_id, encode_csv_rows(user_csv_rows(user_id, user)))
+            return
         users = read_csv_file(self.filename)
         if users is not None:
             try:
@@ -157,12 +544,26 @@ class CSVDataManager(DataManagerInterface):
                 print("Invalid movie rating or year")
         write_csv_file(self.filename, users)
 
+    @write_locked
     def delete_movie(self, user_id, movie_id):
+        if self.indexed:
+            self._index.refresh()
+            user = self._index.read_user(user_id)
+            try:
+                user["movies"].pop(movie_id)
+            except (KeyError, TypeError):
+                print("Invalid user_id or movie_id")
+                return
+            self._index.replace_user(
+                user_id, encode_csv_rows(user_csv_rows(user_id, user)))
+            return True
         users = read_csv_file(self.filename)
         if users is not None:
             movies = users.get(user_id, {}).get("movies", {})
             try:
                 movies.pop(movie_id)
-                write_csv_file(self.filename, users)
             except KeyError:
                 print("Invalid user_id or movie_id")
+                return
+            write_csv_file(self.filename, users)
+            return True
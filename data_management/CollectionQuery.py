@@ -0,0 +1,141 @@
+import base64
+import json
+
+# Orderings of a user's collection; "added" is the order movies were added
+SORT_FIELDS = ('added', 'title', 'year', 'rating')
+
+DEFAULT_LIMIT = 24
+MAX_LIMIT = 200
+
+
+def encode_cursor(value, key):
+    # Opaque keyset cursor: the sort value and the id of the last row
+    data = json.dumps([value, key], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Returns:
+        tuple: (sort value, id) of the row the previous page ended with.
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (TypeError, ValueError, UnicodeError) as error:
+        raise ValueError(f"Invalid cursor: {cursor}") from error
+    return value, key
+
+
+def optional_number(args, name, convert):
+    value = args.get(name)
+    return convert(value) if value not in (None, '') else None
+
+
+class CollectionQuery:
+    """
+    Sort, filters and page of a user's movie collection.
+    Filters: genre (one of the movie's genres), year_from/year_to
+    (inclusive) and min_rating. after is the cursor of the previous page.
+    """
+
+    def __init__(self, sort='added', descending=False, genre=None,
+                 year_from=None, year_to=None, min_rating=None, after=None,
+                 limit=DEFAULT_LIMIT):
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Unknown sort field: {sort}")
+        self.sort = sort
+        self.descending = descending
+        self.genre = genre or None
+        self.year_from = year_from
+        self.year_to = year_to
+        self.min_rating = min_rating
+        self.after = decode_cursor(after) if after else None
+        self.limit = max(1, min(limit, MAX_LIMIT))
+
+    @classmethod
+    def from_args(cls, args):
+        """
+        Build a query from request arguments: sort, order (asc/desc),
+        genre, year_from, year_to, min_rating, after and limit.
+        Raises:
+            ValueError: If an argument is malformed.
+        """
+        sort = args.get('sort') or 'added'
+        order = args.get('order') or ('desc' if sort == 'rating' else 'asc')
+        if order not in ('asc', 'desc'):
+            raise ValueError(f"Unknown order: {order}")
+        return cls(sort=sort, descending=order == 'desc',
+                   genre=args.get('genre'),
+                   year_from=optional_number(args, 'year_from', int),
+                   year_to=optional_number(args, 'year_to', int),
+                   min_rating=optional_number(args, 'min_rating', float),
+                   after=args.get('after'),
+                   limit=optional_number(args, 'limit', int) or DEFAULT_LIMIT)
+
+    def args(self):
+        # Request arguments reproducing this query, without the cursor
+        args = {'sort': self.sort,
+                'order': 'desc' if self.descending else 'asc',
+                'genre': self.genre, 'year_from': self.year_from,
+                'year_to': self.year_to, 'min_rating': self.min_rating,
+                'limit': self.limit}
+        return {name: value for name, value in args.items()
+                if value is not None}
+
+
+def number(value):
+    # JSON/CSV store years and ratings as text; unparsable values sort first
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def movies_page(movies, query):
+    """
+    Filter, sort and page a JSON/CSV movies dict (movie_id -> movie).
+    Returns:
+        tuple: (dict of movie_id -> movie for the page, next cursor or None).
+    Raises:
+        ValueError: If the query filters by genre: these files store no
+            genres.
+    """
+    if query.genre is not None:
+        raise ValueError("Filtering by genre is only supported by the "
+                         "SQLite data manager")
+
+    def sort_value(movie_id, movie):
+        if query.sort == 'added':
+            return int(movie_id)
+        if query.sort == 'title':
+            return (movie.get('name') or '').casefold()
+        value = number(movie.get(query.sort))
+        return value if value is not None else float('-inf')
+
+    rows = []
+    for movie_id, movie in (movies or {}).items():
+        if not movie.get('name'):
+            continue
+        year, rating = number(movie.get('year')), number(movie.get('rating'))
+        if query.year_from is not None and (year is None
+                                            or year < query.year_from):
+            continue
+        if query.year_to is not None and (year is None or year > query.year_to):
+            continue
+        if query.min_rating is not None and (rating is None
+                                             or rating < query.min_rating):
+            continue
+        rows.append(((sort_value(movie_id, movie), int(movie_id)), movie_id))
+    rows.sort(reverse=query.descending)
+    if query.after is not None:
+        after = tuple(query.after)
+        rows = [row for row in rows
+                if (row[0] < after if query.descending else row[0] > after)]
+    page = rows[:query.limit]
+    next_cursor = None
+    if len(rows) > query.limit:
+        next_cursor = encode_cursor(*page[-1][0])
+    return {movie_id: movies[movie_id] for _, movie_id in page}, next_cursor
@@ -0,0 +1,579 @@
+"""
+Streaming conversion of users and their movie collections between the
+JSON, CSV, SQLite and binary (.mwb) data files.
+
+Every reader yields users one at a time in a common shape,
+
+    {'id': '1', 'name': ..., 'email': ..., 'password': ...,
+     'movies': [{'id', 'name', 'director', 'year', 'rating', 'note'}, ...]}
+
+and every writer appends them in batches, so memory is bounded by a batch
+(plus, for CSV sources, the byte offsets of each user's rows) whatever the
+size of the files. After each batch the writer makes its output durable
+and the position in the source is saved to <target>.checkpoint; a
+conversion that was interrupted resumes from there.
+
+Only what all the formats store is converted: users, and per collected
+movie its title, director, year, rating and note. Reviews and the other
+OMDb fields stay behind in a SQLite source.
+"""
+import codecs
+import hashlib
+import json
+import os
+import sqlite3
+from . import migrations
+from .BinaryDataManager import MAGIC, BinaryUserIndex, encode_record
+from .CSVDataManager import EMPTY_MOVIE, CSVUserIndex, encode_csv_rows, \
+    user_csv_rows
+from .FileLock import fsync_directory
+from .JSONDataManager import file_signature
+from .MovieFacets import facet_statements, typed_fields
+
+# Users and movie rows per committed batch
+DEFAULT_BATCH_SIZE = 5000
+
+# Bytes read at a time by the streaming JSON reader
+CHUNK_SIZE = 1024 * 1024
+
+# Movie fields carried over, in checksum order
+MOVIE_FIELDS = ('name', 'director', 'year', 'rating', 'note')
+
+# Largest IN (...) list of one movie lookup
+LOOKUP_CHUNK_SIZE = 500
+
+
+def backend_for(path):
+    # The data manager for a file, picked by extension as in app.py
+    name = path.lower()
+    if name.endswith('.json'):
+        return 'json'
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith('.mwb'):
+        return 'binary'
+    return 'sqlite'
+
+
+def movie_record(movie_id, movie):
+    record = {field: movie.get(field, '') for field in MOVIE_FIELDS}
+    record['id'] = str(movie_id)
+    return record
+
+
+def user_record(user_id, user, movies):
+    return {'id': str(user_id), 'name': user.get('name', ''),
+            'email': user.get('email', ''),
+            'password': user.get('password', ''), 'movies': movies}
+
+
+class JSONUserReader:
+    """
+    Incremental reader of the {user_id: user, ...} object of a users JSON
+    file. Values are parsed one at a time from a window of the file that
+    grows only as far as the current user; offset is the position in the
+    file (bytes) of the first character not yet consumed.
+    """
+
+    def __init__(self, file, offset=0):
+        self.file = file
+        self.offset = offset
+        self.buffer = ''
+        self.eof = False
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        file.seek(offset)
+
+    def _fill(self):
+        # Read at least as much as is buffered, so a large value costs
+        # amortized linear time to parse
+        chunk = self.file.read(max(CHUNK_SIZE, len(self.buffer)))
+        self.eof = not chunk
+        self.buffer += self._text.decode(chunk, final=self.eof)
+
+    def _consume(self, length):
+        consumed, self.buffer = self.buffer[:length], self.buffer[length:]
+        self.offset += len(consumed.encode('utf-8'))
+
+    def _error(self, expected):
+        return ValueError(f"Malformed users JSON at byte {self.offset}: "
+                          f"expected {expected}")
+
+    def peek(self):
+        # The next character after whitespace, '' at the end of the file
+        while True:
+            stripped = self.buffer.lstrip()
+            self._consume(len(self.buffer) - len(stripped))
+            if self.buffer or self.eof:
+                return self.buffer[:1]
+            self._fill()
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise self._error(' or '.join(repr(c) for c in characters))
+        self._consume(1)
+        return character
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buffer)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise self._error('a JSON value') from None
+                self._fill()
+                continue
+            if end == len(self.buffer) and not self.eof:
+                # A number could continue in the next chunk
+                self._fill()
+                continue
+            self._consume(end)
+            return value
+
+
+def read_json_users(path, resume=None):
+    """
+    Yield (user, resume token) for each user of a users JSON file.
+    Raises:
+        ValueError: If the file is not a users JSON object, or has a
+            journal that was not compacted into it.
+    """
+    journal = file_signature(path + '.journal')
+    if journal is not None and journal[1] > 0:
+        raise ValueError(f"{path} has unapplied journal records; compact it "
+                         f"first (JSONDataManager(path, journal=True)"
+                         f".compact())")
+    with open(path, 'rb') as file:
+        reader = JSONUserReader(file, resume or 0)
+        if resume is None:
+            reader.expect('{')
+            more = reader.peek() != '}'
+        else:
+            # A token points just past a user: a comma or the end follows
+            more = reader.expect(',}') == ','
+        while more:
+            user_id = reader.value()
+            reader.expect(':')
+            user = reader.value()
+            movies = [movie_record(movie_id, movie) for movie_id, movie
+                      in (user.get('movies') or {}).items()]
+            yield user_record(user_id, user, movies), reader.offset
+            more = reader.expect(',}') == ','
+
+
+def read_csv_users(path, resume=None):
+    """
+    Yield (user, resume token) for each user of a users CSV file, in file
+    order. The CSV byte-offset index (<path>.idx) locates each user's
+    rows, so rows of one user need not be contiguous.
+    """
+    index = CSVUserIndex(path)
+    index.refresh()
+    user_ids = list(index.spans)
+    for position in range(resume or 0, len(user_ids)):
+        user = index.read_user(user_ids[position])
+        # The placeholder row of a user without movies has no movie id
+        movies = [movie_record(movie_id, movie) for movie_id, movie
+                  in user['movies'].items() if movie_id != '']
+        yield user_record(user_ids[position], user, movies), position + 1
+
+
+def read_binary_users(path, resume=None):
+    """
+    Yield (user, resume token) for each user of a binary users file, in
+    the order they were first written. Only each user's latest record is
+    read.
+    """
+    if not os.path.exists(path):
+        raise ValueError(f"File not found: {path}")
+    index = BinaryUserIndex(path)
+    index.refresh()
+    user_ids = list(index.records)
+    for position in range(resume or 0, len(user_ids)):
+        user = index.read_user(user_ids[position])
+        movies = [movie_record(movie_id, movie) for movie_id, movie
+                  in user['movies'].items()]
+        yield user_record(user_ids[position], user, movies), position + 1
+
+
+def read_sqlite_users(path, resume=None, batch_size=1000):
+    """
+    Yield (user, resume token) for each user of a SQLite database, in id
+    order, reading batch_size users and their collections per query.
+    """
+    if not os.path.exists(path):
+        raise ValueError(f"Database not found: {path}")
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        after = resume or 0
+        while True:
+            users = connection.execute(
+                "SELECT id, name, email, password FROM users WHERE id > ? "
+                "ORDER BY id LIMIT ?", (after, batch_size)).fetchall()
+            if not users:
+                return
+            movies = {}
+            for row in connection.execute(
+                    "SELECT favorite_movies.user_id, movies.movie_id, "
+                    "movies.title, movies.director, movies.year, "
+                    "movies.rating, favorite_movies.note "
+                    "FROM favorite_movies JOIN movies "
+                    "ON movies.movie_id = favorite_movies.movie_id "
+                    "WHERE favorite_movies.user_id BETWEEN ? AND ? "
+                    "ORDER BY favorite_movies.user_id, favorite_movies.id",
+                    (users[0][0], users[-1][0])):
+                movies.setdefault(row[0], []).append(movie_record(
+                    row[1], dict(zip(MOVIE_FIELDS, row[2:]))))
+            for user_id, name, email, password in users:
+                yield user_record(user_id, {
+                    'name': name, 'email': email, 'password': password},
+                    movies.get(user_id, [])), user_id
+            after = users[-1][0]
+    finally:
+        connection.close()
+
+
+class PartialFileWriter:
+    """
+    Writes a JSON, CSV or binary target to <path>.partial and renames it
+    over path when done. A checkpoint records the partial file's durable
+    size; on resume anything written after it is cut off.
+    """
+
+    def __init__(self, path, state=None):
+        self.path = path
+        self.partial_path = path + '.partial'
+        if state is None:
+            self.file = open(self.partial_path, 'wb')
+            self.users = 0
+            self.start()
+        else:
+            self.file = open(self.partial_path, 'r+b')
+            self.file.truncate(state['size'])
+            self.file.seek(state['size'])
+            self.users = state['users']
+
+    def start(self):
+        pass
+
+    def checkpoint(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {'size': self.file.tell(), 'users': self.users}
+
+    def finish(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.partial_path, self.path)
+        fsync_directory(os.path.dirname(os.path.abspath(self.path)))
+
+    def close(self):
+        self.file.close()
+
+    @staticmethod
+    def discard(path):
+        if os.path.exists(path + '.partial'):
+            os.unlink(path + '.partial')
+
+
+class JSONUserWriter(PartialFileWriter):
+    # Same layout as write_json_file (indent=4), one user at a time
+
+    def start(self):
+        self.file.write(b'{')
+
+    def write(self, users):
+        for user in users:
+            document = {'name': user['name'], 'email': user['email'],
+                        'password': user['password'],
+                        'movies': {movie['id']: {field: movie[field]
+                                                 for field in MOVIE_FIELDS}
+                                   for movie in user['movies']}}
+            entry = json.dumps({user['id']: document}, indent=4)[1:-1]
+            separator = ',' if self.users else ''
+            self.file.write((separator + entry.rstrip('\n')).encode('utf-8'))
+            self.users += 1
+
+    def finish(self):
+        self.file.write(b'\n}' if self.users else b'}')
+        super().finish()
+
+
+class CSVUserWriter(PartialFileWriter):
+    # Same rows as write_csv_file; a user without movies gets the
+    # placeholder row add_user writes
+
+    def start(self):
+        self.file.write(encode_csv_rows([], header=True))
+
+    def write(self, users):
+        rows = []
+        for user in users:
+            movies = {movie['id']: {field: movie[field]
+                                    for field in MOVIE_FIELDS}
+                      for movie in user['movies']} or {'': dict(EMPTY_MOVIE)}
+            rows.extend(user_csv_rows(user['id'], {
+                'name': user['name'], 'email': user['email'],
+                'password': user['password'], 'movies': movies}))
+            self.users += 1
+        self.file.write(encode_csv_rows(rows))
+
+
+class BinaryUserWriter(PartialFileWriter):
+    # One record per user, as BinaryDataManager appends them
+
+    def start(self):
+        self.file.write(MAGIC)
+
+    def write(self, users):
+        for user in users:
+            self.file.write(encode_record(user['id'], {
+                'name': user['name'], 'email': user['email'],
+                'password': user['password'],
+                'movies': {movie['id']: {field: movie[field]
+                                         for field in MOVIE_FIELDS}
+                           for movie in user['movies']}}))
+            self.users += 1
+
+
+class SQLiteUserWriter:
+    """
+    Writes into a SQLite database created with the migrations. Collected
+    movies become shared movies rows, reused when the title, director,
+    year and rating all match. Every statement is idempotent for the rows
+    of one batch, so a batch replayed after a crash adds nothing twice.
+    """
+
+    def __init__(self, path, state=None):
+        self.path = path
+        self.connection = migrations.connect(path)
+        migrations.upgrade(self.connection, log=lambda message: None)
+        self.users = state['users'] if state else 0
+
+    def _movie_ids(self, movies):
+        # movie key -> movie_id of the stored movies among movies
+        titles = list({movie['name'] for movie in movies})
+        movie_ids = {}
+        for start in range(0, len(titles), LOOKUP_CHUNK_SIZE):
+            chunk = titles[start:start + LOOKUP_CHUNK_SIZE]
+            for movie_id, *fields in self.connection.execute(
+                    f"SELECT movie_id, title, director, year, rating "
+                    f"FROM movies WHERE title IN "
+                    f"({', '.join('?' * len(chunk))}) ORDER BY movie_id",
+                    chunk):
+                movie_ids.setdefault(movie_key(fields), movie_id)
+        return movie_ids
+
+    def write(self, users):
+        for user in users:
+            try:
+                user_id = int(user['id'])
+            except ValueError:
+                raise ValueError(f"User id {user['id']!r} is not an integer; "
+                                 f"SQLite user ids are") from None
+            try:
+                self.connection.execute(
+                    "INSERT INTO users (id, name, email, password) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT (id) DO NOTHING",
+                    (user_id, user['name'], user['email'], user['password']))
+            except sqlite3.IntegrityError:
+                raise ValueError(f"User {user['id']}: email {user['email']!r} "
+                                 f"is already taken") from None
+            self.users += 1
+
+        movies = [movie for user in users for movie in user['movies']]
+        movie_ids = self._movie_ids(movies)
+        new_movies = {}
+        for movie in movies:
+            key = movie_key([movie[field] for field in MOVIE_FIELDS[:4]])
+            if key not in movie_ids:
+                new_movies.setdefault(key, movie)
+        for key, movie in new_movies.items():
+            fields = typed_fields(movie['year'], movie['rating'])
+            movie_ids[key] = self.connection.execute(
+                "INSERT INTO movies (title, year, rating, genre, director, "
+                "writer, actors, plot, language, country, poster, _type, "
+                "release_year, end_year, imdb_rating) "
+                "VALUES (?, ?, ?, '', ?, '', '', '', '', '', 'N/A', 'movie', "
+                "?, ?, ?)",
+                (movie['name'], empty(movie['year']), empty(movie['rating']),
+                 empty(movie['director']), fields['release_year'],
+                 fields['end_year'], fields['imdb_rating'])).lastrowid
+        for sql, parameters in facet_statements(
+                (movie_ids[key], {'genre': '', 'actors': '',
+                                  'director': movie['director']})
+                for key, movie in new_movies.items()):
+            self.connection.executemany(sql, parameters)
+
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO favorite_movies (user_id, movie_id, note) "
+            "VALUES (?, ?, ?)",
+            ((int(user['id']), movie_ids[movie_key(
+                [movie[field] for field in MOVIE_FIELDS[:4]])],
+              movie['note'] or '')
+             for user in users for movie in user['movies']))
+
+    def checkpoint(self):
+        self.connection.commit()
+        return {'users': self.users}
+
+    def finish(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def close(self):
+        self.connection.rollback()
+        self.connection.close()
+
+    @staticmethod
+    def discard(path):
+        # Only called for a database this conversion created
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+
+READERS = {'json': read_json_users, 'csv': read_csv_users,
+           'binary': read_binary_users, 'sqlite': read_sqlite_users}
+WRITERS = {'json': JSONUserWriter, 'csv': CSVUserWriter,
+           'binary': BinaryUserWriter, 'sqlite': SQLiteUserWriter}
+
+
+def empty(value):
+    # NOT NULL columns get '' for a missing value
+    return '' if value is None else value
+
+
+def normalize(value):
+    # One spelling per value across formats: 8, 8.0 and "8.0" -> "8"
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return str(value)
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    if number != number or number in (float('inf'), float('-inf')):
+        return str(value)
+    return str(int(number)) if number.is_integer() else repr(number)
+
+
+def movie_key(fields):
+    return tuple(normalize(field) for field in fields)
+
+
+def summarize(path):
+    """
+    Count and checksum the users and collected movies of a data file.
+    The checksum is order independent and ignores movie ids, which are
+    not kept across formats.
+    Returns:
+        dict: 'users', 'movies' and 'checksum' (hex).
+    """
+    users, movies, total = 0, 0, 0
+    for user, _ in READERS[backend_for(path)](path):
+        users += 1
+        lines = ['\x1f'.join(['user', user['id'], normalize(user['name']),
+                              normalize(user['email']),
+                              normalize(user['password'])])]
+        for movie in user['movies']:
+            movies += 1
+            lines.append('\x1f'.join(['movie', user['id']] + [
+                normalize(movie[field]) for field in MOVIE_FIELDS]))
+        for line in lines:
+            digest = hashlib.sha256(line.encode('utf-8')).digest()
+            total = (total + int.from_bytes(digest, 'big')) % (1 << 256)
+    return {'users': users, 'movies': movies, 'checksum': f'{total:064x}'}
+
+
+def read_checkpoint(path):
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path, state):
+    # Atomic, so a crash leaves the previous checkpoint in place
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(state, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def convert(source, target, batch_size=DEFAULT_BATCH_SIZE, restart=False,
+            log=print):
+    """
+    Copy the users and collections of source into a new target file,
+    resuming an interrupted conversion from <target>.checkpoint.
+    Args:
+        batch_size (int): Users plus movie rows written per batch.
+        restart (bool): Discard an earlier interrupted conversion.
+    Returns:
+        dict: 'users' and 'movies' converted.
+    Raises:
+        ValueError: If the files cannot be converted (target exists,
+            source changed since the checkpoint, malformed source, ...).
+    """
+    source, target = os.path.abspath(source), os.path.abspath(target)
+    if source == target:
+        raise ValueError("Source and target are the same file")
+    writer_class = WRITERS[backend_for(target)]
+    checkpoint_path = target + '.checkpoint'
+    state = read_checkpoint(checkpoint_path)
+    if state is not None and restart:
+        writer_class.discard(target)
+        os.unlink(checkpoint_path)
+        state = None
+    if state is None:
+        if os.path.exists(target):
+            raise ValueError(f"{target} already exists")
+        writer_class.discard(target)
+        # The source may not change while a conversion is unfinished
+        state = {'source': source, 'signature': file_signature(source),
+                 'resume': None, 'writer': None, 'users': 0, 'movies': 0}
+    elif state['source'] != source:
+        raise ValueError(f"{checkpoint_path} belongs to a conversion from "
+                         f"{state['source']}; pass restart to discard it")
+    elif list(state['signature'] or []) != list(file_signature(source) or []):
+        raise ValueError(f"{source} changed since the conversion was "
+                         f"interrupted; pass restart to start over")
+    else:
+        log(f"Resuming after {state['users']} users")
+
+    writer = writer_class(target, state['writer'])
+    try:
+        batch, rows = [], 0
+        for user, token in READERS[backend_for(source)](source,
+                                                        state['resume']):
+            batch.append(user)
+            rows += 1 + len(user['movies'])
+            if rows >= batch_size:
+                save_batch(writer, batch, token, state, checkpoint_path, log)
+                batch, rows = [], 0
+        if batch:
+            save_batch(writer, batch, token, state, checkpoint_path, log)
+        writer.finish()
+    except BaseException:
+        writer.close()
+        raise
+    if os.path.exists(checkpoint_path):
+        os.unlink(checkpoint_path)
+    return {'users': state['users'], 'movies': state['movies']}
+
+
+def save_batch(writer, batch, token, state, checkpoint_path, log):
+    writer.write(batch)
+    state['writer'] = writer.checkpoint()
+    state['resume'] = token
+    state['users'] += len(batch)
+    state['movies'] += sum(len(user['movies']) for user in batch)
+    write_checkpoint(checkpoint_path, state)
+    log(f"{state['users']} users, {state['movies']} movies")
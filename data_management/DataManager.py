@@ -7,14 +7,38 @@ class DataManagerInterface(ABC):
     def get_all_users(self):
         pass
 
+    @abstractmethod
+    def get_users_page(self, after=None, limit=50):
+        pass
+
+    @abstractmethod
+    def get_user_by_email(self, email):
+        pass
+
+    @abstractmethod
+    def search_movies(self, query, user_id=None, limit=20, offset=0):
+        pass
+
+    @abstractmethod
+    def search_users(self, query, limit=20, offset=0):
+        pass
+
     @abstractmethod
     def get_user_movies(self, user_id):
         pass
 
+    @abstractmethod
+    def get_collection_page(self, user_id, query=None):
+        pass
+
     @abstractmethod
     def add_user(self, user_details):
         pass
 
+    @abstractmethod
+    def update_password(self, user_id, password_hash):
+        pass
+
     @abstractmethod
     def add_movie(self, user_id, movie_title):
         pass
@@ -28,10 +52,17 @@ class DataManagerInterface(ABC):
     def delete_movie(self, user_id, movie_id):
         pass
 
-    @abstractmethod
+    # Reviews are only stored by the SQLite data manager; the file backends
+    # inherit these defaults
     def add_review(self, user_id, movie_id, rating, review):
-        pass
+        self._reviews_not_supported()
 
-    @abstractmethod
     def get_reviews_for_movie(self, movie_id):
-        pass
+        self._reviews_not_supported()
+
+    def get_movie_reviews(self, user_id, movie_id, after=None, limit=20):
+        self._reviews_not_supported()
+
+    def _reviews_not_supported(self):
+        raise NotImplementedError(f"Reviews are only supported by the SQLite "
+                                  f"data manager, not {type(self).__name__}")
@@ -0,0 +1,271 @@
+"""
+Locking for the file-backed data managers (JSON and CSV).
+
+Every mutation of users.json or users.csv is a read-modify-write of the
+file: without locking, two concurrent add_movie calls both read the old
+file and the second write silently drops the first movie. DataFileLock
+serializes them at two levels:
+
+- within a process, a reader-writer lock lets any number of threads read
+  while a writer waits for them to finish and then runs alone;
+- across processes (multi-worker servers), an fcntl advisory lock on
+  <data file>.lock, shared while the process has readers and exclusive
+  while it has a writer.
+
+The advisory lock is taken on a separate file because the data file is
+replaced by rename on every write (atomic_write), and a lock on the old
+inode would not exclude a process that already opened the new one.
+"""
+import contextlib
+import functools
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are locked out
+    fcntl = None
+
+
+def fsync_directory(directory):
+    # Persist a rename; not supported on every platform
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def atomic_write(file_path, mode='w', **kwargs):
+    """
+    Open a temporary file next to file_path for writing; when the block
+    ends it is flushed to disk and renamed over file_path. Readers see the
+    old or the new file, never a half-written one, and an exception leaves
+    the old file untouched.
+    Args:
+        file_path (str): The file to replace.
+        mode (str): 'w' or 'wb'; further arguments go to open().
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, **kwargs) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    fsync_directory(directory)
+
+
+class ReadWriteLock:
+    """
+    In-process reader-writer lock that prefers writers: once a writer
+    waits, new readers queue behind it, so a steady stream of page views
+    cannot starve a mutation.
+
+    Both locks are reentrant per thread, and a thread holding the write
+    lock may also take the read lock. Taking the write lock while holding
+    only the read lock raises RuntimeError: two threads doing that would
+    wait for each other forever.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writers_waiting = 0
+        # Per thread: read and write nesting depth
+        self._local = threading.local()
+
+    def _depths(self):
+        return (getattr(self._local, 'reads', 0),
+                getattr(self._local, 'writes', 0))
+
+    def acquire_read(self):
+        reads, writes = self._depths()
+        if not reads and not writes:
+            with self._condition:
+                while self._writer is not None or self._writers_waiting:
+                    self._condition.wait()
+                self._readers += 1
+        self._local.reads = reads + 1
+
+    def release_read(self):
+        reads, writes = self._depths()
+        if not reads:
+            raise RuntimeError("Read lock released without being held")
+        self._local.reads = reads - 1
+        if reads == 1 and not writes:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    def acquire_write(self):
+        reads, writes = self._depths()
+        if reads and not writes:
+            raise RuntimeError("Cannot upgrade a read lock to a write lock")
+        if not writes:
+            with self._condition:
+                self._writers_waiting += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._condition.wait()
+                finally:
+                    self._writers_waiting -= 1
+                self._writer = threading.get_ident()
+        self._local.writes = writes + 1
+
+    def release_write(self):
+        reads, writes = self._depths()
+        if not writes:
+            raise RuntimeError("Write lock released without being held")
+        self._local.writes = writes - 1
+        if writes == 1:
+            if reads:
+                # Still reading: keep counting as a reader
+                with self._condition:
+                    self._writer = None
+                    self._readers += 1
+                    self._condition.notify_all()
+            else:
+                with self._condition:
+                    self._writer = None
+                    self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextlib.contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class DataFileLock:
+    """
+    Reader-writer lock for one data file, held by threads of this process
+    (ReadWriteLock) and by other processes (flock on <filename>.lock).
+    Use file_lock() to get the instance shared by every data manager of
+    the file in this process.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock_filename = filename + '.lock'
+        self._rwlock = ReadWriteLock()
+        # Guards the advisory lock: it is taken by the first holder in the
+        # process and released by the last
+        self._file_mutex = threading.Lock()
+        self._holders = 0
+        self._fd = None
+        self._pid = None
+
+    def _lock_file(self, operation):
+        if self._pid != os.getpid():
+            # flock locks belong to the open file, which a forked worker
+            # shares with its parent: every process opens its own
+            if self._fd is not None:
+                os.close(self._fd)
+            self._fd = os.open(self.lock_filename, os.O_RDWR | os.O_CREAT,
+                               0o644)
+            self._pid = os.getpid()
+        fcntl.flock(self._fd, operation)
+
+    def _enter(self, exclusive):
+        with self._file_mutex:
+            if not self._holders and fcntl is not None:
+                self._lock_file(fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._holders += 1
+
+    def _exit(self):
+        with self._file_mutex:
+            self._holders -= 1
+            if not self._holders and fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @contextlib.contextmanager
+    def shared(self):
+        # Read lock: other readers may hold it at the same time
+        with self._rwlock.read():
+            self._enter(exclusive=False)
+            try:
+                yield
+            finally:
+                self._exit()
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        # Write lock: held alone, by one thread of one process
+        with self._rwlock.write():
+            self._enter(exclusive=True)
+            try:
+                yield
+            finally:
+                self._exit()
+
+
+# Absolute path -> DataFileLock of this process
+_file_locks = {}
+_file_locks_mutex = threading.Lock()
+
+
+def file_lock(filename):
+    """
+    Returns:
+        DataFileLock: The lock of a data file, one per file and process.
+    """
+    path = os.path.abspath(filename)
+    with _file_locks_mutex:
+        lock = _file_locks.get(path)
+        if lock is None:
+            lock = _file_locks[path] = DataFileLock(path)
+        return lock
+
+
+def _reset_after_fork():
+    # Locks held by threads of the parent do not exist in the child
+    global _file_locks_mutex
+    _file_locks_mutex = threading.Lock()
+    _file_locks.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def read_locked(method):
+    # Run a data manager method under the shared lock of its file
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock.shared():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def write_locked(method):
+    # Run a data manager method under the exclusive lock of its file
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock.exclusive():
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -1,9 +1,29 @@
+import copy
 import json
+import mmap
+import os
+import re
+import threading
+from collections.abc import Mapping
 import requests
 from .DataManager import DataManagerInterface
+from .CollectionQuery import CollectionQuery, movies_page
+from .FileLock import atomic_write, file_lock, read_locked, write_locked
+from .OMDbClient import omdb_client
+from .SearchIndex import movies_index, users_index
 
-# OMDB API to get movie data
-API: str = 'http://www.omdbapi.com/?apikey=6f0c3bf6&t='
+# Number of journal records after which the journal is folded into a new
+# snapshot of the JSON file
+DEFAULT_COMPACT_THRESHOLD = 1000
+
+# Bytes decoded at a time when indexing a file not written by
+# write_json_file
+SCAN_CHUNK_SIZE = 1024 * 1024
+
+# A top-level key in the indent=4 layout of write_json_file: nested keys
+# are indented further, and strings cannot hold a raw newline
+TOP_LEVEL_KEY = re.compile(rb'\n    "((?:[^"\\\n]|\\.)*)": ')
+WHITESPACE = re.compile(r'[ \t\n\r]*')
 
 
 def read_json_file(file_path):
@@ -19,96 +39,646 @@ def read_json_file(file_path):
 
 
 def write_json_file(file_path, data):
+    """
+    Atomically replace the JSON file (see FileLock.atomic_write), so a
+    crash or a concurrent reader never sees a half-written file.
+    """
     try:
-        with open(file_path, 'w') as file:
+        with atomic_write(file_path) as file:
             json.dump(data, file, indent=4)
+        return True
     except IOError:
         print(f"Error writing to file: {file_path}")
+    return False
 
 
-class JSONDataManager(DataManagerInterface):
+def file_signature(file_path):
+    """
+    Identify the current version of a file on disk.
+    Returns:
+        tuple: (mtime_ns, size, inode), or None if the file does not exist.
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def read_journal_file(file_path, offset=0):
+    """
+    Read journal records starting at a byte offset.
+    A torn record at the end of the file (crash during append) is ignored.
+    Returns:
+        tuple: (list of records, offset just past the last complete record)
+    """
+    records = []
+    try:
+        with open(file_path, 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"Error decoding journal record in: {file_path}")
+                    break
+                offset += len(line)
+    except FileNotFoundError:
+        pass
+    return records, offset
+
+
+def append_journal_record(file_path, record):
+    line = json.dumps(record, separators=(',', ':')) + '\n'
+    with open(file_path, 'a') as file:
+        file.write(line)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def apply_journal_record(users, record):
+    """
+    Apply one mutation record to the users document.
+    Records carry explicit ids so replaying a record twice is harmless.
+    """
+    operation = record['op']
+    user_id = record['user_id']
+    if operation == 'add_user':
+        users[user_id] = record['user']
+    elif operation == 'update_password':
+        users[user_id]['password'] = record['password']
+    elif operation == 'add_movie':
+        users.setdefault(user_id, {}).setdefault(
+            'movies', {})[record['movie_id']] = record['movie']
+    elif operation == 'update_movie':
+        users[user_id]['movies'][record['movie_id']] = record['movie']
+    elif operation == 'delete_movie':
+        users.get(user_id, {}).get('movies', {}).pop(record['movie_id'])
+    else:
+        raise ValueError(f"Unknown journal operation: {operation}")
+
+
+def scan_indented_users(buffer):
+    """
+    Yield (user_id, start, end) for the users of a document in the
+    indent=4 layout of write_json_file, by searching for the top-level
+    keys alone; the users themselves are not parsed.
+    """
+    previous = None
+    for match in TOP_LEVEL_KEY.finditer(buffer):
+        if previous is not None:
+            # The previous user ends at the comma before this key
+            yield previous[0], previous[1], match.start() - 1
+        previous = (json.loads(b'"' + match.group(1) + b'"'), match.end())
+    if previous is not None:
+        yield previous[0], previous[1], buffer.rfind(b'}')
+
+
+def scan_users(buffer):
+    """
+    Yield (user_id, start, end) for the users of any users JSON document.
+    The document is decoded a window at a time (as latin-1, so character
+    and byte offsets agree) and each user is parsed to find where it ends,
+    so the window stays bounded by the largest user.
+    Raises:
+        ValueError: If the document is not a JSON object.
+    """
+    decoder = json.JSONDecoder()
+    size = len(buffer)
+    window = {'base': 0, 'text': ''}
+
+    def load(position, length=SCAN_CHUNK_SIZE):
+        window['base'] = position
+        window['text'] = buffer[position:position + length].decode('latin-1')
+
+    def skip(position, characters):
+        # Skip whitespace, then one of characters; returns (character, end)
+        while True:
+            text, base = window['text'], window['base']
+            index = WHITESPACE.match(text, position - base).end()
+            if index < len(text):
+                if text[index] not in characters:
+                    raise ValueError(f"Malformed users JSON at byte "
+                                     f"{base + index}")
+                return text[index], base + index + 1
+            if base + len(text) >= size:
+                raise ValueError("Unexpected end of users JSON")
+            position = base + index
+            load(position)
+
+    def value(position):
+        # Find the next value; returns its (start, end)
+        while True:
+            text, base = window['text'], window['base']
+            index = WHITESPACE.match(text, position - base).end()
+            complete = base + len(text) >= size
+            try:
+                _, end = decoder.raw_decode(text, index)
+                if end < len(text) or complete:
+                    return base + index, base + end
+            except json.JSONDecodeError:
+                if complete:
+                    raise ValueError(f"Malformed users JSON at byte "
+                                     f"{base + index}") from None
+            # The value goes on past the window: move the window to the
+            # value, doubled only if the value alone outgrew it
+            load(base + index, max(SCAN_CHUNK_SIZE, 2 * (len(text) - index)))
+
+    load(0)
+    _, position = skip(0, '{')
+    character, position = skip(position, '}"')
+    if character == '}':
+        return
+    # Back to the quote opening the first key
+    position -= 1
+    while True:
+        key_start, key_end = value(position)
+        _, position = skip(key_end, ':')
+        start, position = value(position)
+        yield json.loads(buffer[key_start:key_end]), start, position
+        separator, position = skip(position, ',}')
+        if separator == '}':
+            return
+
+
+class JSONUsers(Mapping):
+    """
+    Read-only view of the users of one version of a mapped JSON file (user
+    id -> user dict). Each user is parsed from its own byte span the first
+    time it is looked up and kept for later lookups.
+    """
+
+    def __init__(self, index, buffer, spans):
+        self._index = index
+        self._buffer = buffer
+        self._spans = spans
+        self._decoded = {}
+
+    def __getitem__(self, user_id):
+        user = self._decoded.get(user_id)
+        if user is None:
+            start, end = self._spans[user_id]
+            try:
+                data = self._buffer[start:end]
+            except ValueError:
+                # The file changed and its old mapping was closed: read
+                # the user from the current version
+                return self._index.users()[user_id]
+            user = self._decoded[user_id] = json.loads(data)
+        return user
+
+    def __contains__(self, user_id):
+        return user_id in self._spans
+
+    def __iter__(self):
+        return iter(self._spans)
+
+    def __len__(self):
+        return len(self._spans)
+
+
+class CopiedUsers(Mapping):
+    """
+    Read-only view of a cached users document handed to callers: each user
+    is deep-copied when looked up, so callers cannot change the cache.
+    """
+
+    def __init__(self, users):
+        self._users = users
+
+    def __getitem__(self, user_id):
+        return copy.deepcopy(self._users[user_id])
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+    def __iter__(self):
+        return iter(self._users)
+
+    def __len__(self):
+        return len(self._users)
+
+
+class JSONUserIndex:
+    """
+    Byte-offset index of users.json: user id -> (start, end) of the user's
+    value in the file, built once per version of the file over a memory
+    map of it. Only the users that are looked up get parsed.
+    """
+
     def __init__(self, filename):
         self.filename = filename
+        self.signature = None
+        self._buffer = None
+        self._users = None
+        self._lock = threading.Lock()
 
+    def refresh(self):
+        """
+        Re-index the file if it changed since the last call; the mapping
+        of the previous version is closed.
+        Raises:
+            ValueError: If the file is not a JSON object.
+        """
+        with self._lock:
+            signature = file_signature(self.filename)
+            if signature == self.signature:
+                return
+            buffer, spans = None, {}
+            if signature is not None:
+                # An empty file cannot be mapped: ValueError, like any
+                # other file that is not a JSON object
+                with open(self.filename, 'rb') as file:
+                    buffer = mmap.mmap(file.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+                try:
+                    if buffer[:7] == b'{\n    "':
+                        found = scan_indented_users(buffer)
+                    else:
+                        found = scan_users(buffer)
+                    spans = {user_id: (start, end)
+                             for user_id, start, end in found}
+                except ValueError:
+                    buffer.close()
+                    raise
+            self._close()
+            self._buffer = buffer
+            self._users = JSONUsers(self, buffer, spans)
+            self.signature = signature
+
+    def users(self):
+        """
+        Returns:
+            JSONUsers: The users of the current version of the file, or
+            None if the file does not exist.
+        """
+        self.refresh()
+        return self._users if self.signature is not None else None
+
+    def _close(self):
+        if self._buffer is not None:
+            self._buffer.close()
+            self._buffer = None
+
+    def close(self):
+        # Release the memory map; the next lookup maps the file again
+        with self._lock:
+            self._close()
+            self._users = None
+            self.signature = None
+
+
+def build_email_index(users):
+    """
+    Map each user's email to their login details.
+    Returns:
+        dict: email -> {'id', 'name', 'email', 'password'}.
+    """
+    index = {}
+    for user_id, user_data in (users or {}).items():
+        email = user_data.get('email')
+        if email is not None and email not in index:
+            index[email] = {'id': user_id,
+                            'name': user_data.get('name'),
+                            'email': email,
+                            'password': user_data.get('password')}
+    return index
+
+
+def users_page(users, after=None, limit=50):
+    """
+    Return one page of users ordered by numeric id (keyset pagination).
+    Returns:
+        tuple: (dict of user_id -> user data, next cursor or None).
+    """
+    user_ids = sorted((user_id for user_id in (users or {})
+                       if after is None or int(user_id) > after), key=int)
+    page = {user_id: users[user_id] for user_id in user_ids[:limit]}
+    next_cursor = int(user_ids[limit - 1]) if len(user_ids) > limit else None
+    return page, next_cursor
+
+
+class JSONDataManager(DataManagerInterface):
+    def __init__(self, filename, cached=False, journal=False,
+                 compact_threshold=DEFAULT_COMPACT_THRESHOLD):
+        self.filename = filename
+        # In cached mode the parsed document is kept in memory and only
+        # re-read when the file's signature changes (e.g. another worker
+        # wrote it). Mutations always write through to disk.
+        # Until the first write, or after another worker wrote the file,
+        # cached reads go through a memory-mapped index of the file instead
+        # and parse only the users they look up.
+        # Journal mode appends each mutation to <filename>.journal instead
+        # of rewriting the whole file, and implies cached mode.
+        self.journal = journal
+        self.cached = cached or journal
+        self.journal_filename = filename + '.journal'
+        self.compact_threshold = compact_threshold
+        self._users = None
+        self._signature = None
+        self._index = JSONUserIndex(filename)
+        self._journal_signature = None
+        self._journal_offset = 0
+        self._journal_records = 0
+        # Indexes derived from the users document (email lookup, search),
+        # name -> (files signature, index); rebuilt when the files change
+        self._derived = {}
+        # Public methods hold the file's shared (read) or exclusive (write)
+        # lock, across threads and processes; readers of this instance
+        # refresh the cached document one at a time
+        self._lock = file_lock(filename)
+        self._cache_lock = threading.Lock()
+
+    def _read_users(self):
+        if not self.cached:
+            return read_json_file(self.filename)
+        with self._cache_lock:
+            return self._read_cached_users()
+
+    def _users_view(self):
+        # The users for a read: the cached document if it is current, else
+        # a lazy view of the file (journal mode replays over the document)
+        if not self.cached or self.journal:
+            return self._read_users()
+        with self._cache_lock:
+            if self._users is not None and \
+                    file_signature(self.filename) == self._signature:
+                return self._users
+            try:
+                users = self._index.users()
+            except ValueError:
+                print(f"Error decoding JSON file: {self.filename}")
+                return None
+            if users is None:
+                print(f"File not found at path: {self.filename}")
+            return users
+
+    def _public_users(self):
+        # The users for a caller: the cache is only handed out as a copy
+        users = self._users_view()
+        if self.cached and users is not None:
+            return CopiedUsers(users)
+        return users
+
+    def close(self):
+        # Release the memory map of the file, if any
+        self._index.close()
+
+    def _read_cached_users(self):
+        signature = file_signature(self.filename)
+        if self._users is None or signature != self._signature:
+            self._users = read_json_file(self.filename)
+            self._signature = signature if self._users is not None else None
+            self._journal_signature = None
+            self._journal_offset = 0
+            self._journal_records = 0
+        if self.journal and self._users is not None:
+            self._replay_journal()
+        return self._users
+
+    def _replay_journal(self):
+        journal_signature = file_signature(self.journal_filename)
+        if journal_signature == self._journal_signature:
+            return
+        if self._journal_offset and (
+                journal_signature is None
+                or journal_signature[2] != self._journal_signature[2]
+                or journal_signature[1] < self._journal_offset):
+            # The journal was truncated by a compaction in another process,
+            # which wrote a new snapshot first: start over from that snapshot
+            self._signature = file_signature(self.filename)
+            self._users = read_json_file(self.filename)
+            self._journal_offset = 0
+            self._journal_records = 0
+            if self._users is None:
+                self._signature = None
+                return
+        records, self._journal_offset = read_journal_file(
+            self.journal_filename, self._journal_offset)
+        for record in records:
+            try:
+                apply_journal_record(self._users, record)
+            except KeyError:
+                # Already applied (e.g. a delete replayed after compaction)
+                pass
+        self._journal_records += len(records)
+        self._journal_signature = journal_signature
+
+    def _commit(self, users, record):
+        # Apply a mutation to the users document and persist it
+        if not self.journal:
+            apply_journal_record(users, record)
+            return self._write_users(users)
+        # Catch up with records appended since the document was read
+        users = self._read_users()
+        apply_journal_record(users, record)
+        try:
+            # Drop a torn record left behind by a crash so the new record
+            # starts on its own line
+            journal_signature = file_signature(self.journal_filename)
+            if journal_signature and journal_signature[1] > self._journal_offset:
+                os.truncate(self.journal_filename, self._journal_offset)
+            append_journal_record(self.journal_filename, record)
+        except IOError:
+            print(f"Error writing to file: {self.journal_filename}")
+            self._users = None
+            self._signature = None
+            return False
+        # Advance past our own record; replaying it again is harmless
+        self._replay_journal()
+        if self._journal_records >= self.compact_threshold:
+            self.compact()
+        return True
+
+    def _write_users(self, users):
+        written = write_json_file(self.filename, users)
+        if self.cached:
+            if written:
+                self._users = users
+                self._signature = file_signature(self.filename)
+            else:
+                # The file may be partially written; force a re-read
+                self._users = None
+                self._signature = None
+        return written
+
+    @write_locked
+    def compact(self):
+        """
+        Fold the journal into a new snapshot of the JSON file.
+        The snapshot is written atomically before the journal is truncated;
+        if the process dies in between, replaying the old journal over the
+        new snapshot yields the same document.
+        """
+        users = self._read_users()
+        if users is None or not self.journal:
+            return False
+        if not self._write_users(users):
+            return False
+        with open(self.journal_filename, 'w') as file:
+            file.flush()
+            os.fsync(file.fileno())
+        self._journal_signature = file_signature(self.journal_filename)
+        self._journal_offset = 0
+        self._journal_records = 0
+        return True
+
+    @read_locked
     def get_all_users(self):
         # Return a dictionary of all users
-        users = read_json_file(self.filename)
+        users = self._public_users()
         return users
 
+    @read_locked
+    def get_users_page(self, after=None, limit=50):
+        return users_page(self._public_users(), after, limit)
+
+    def _derived_index(self, name, build):
+        signature = (file_signature(self.filename),
+                     file_signature(self.journal_filename)
+                     if self.journal else None)
+        cached = self._derived.get(name)
+        if cached is None or cached[0] != signature:
+            cached = (signature, build(self._users_view()))
+            self._derived[name] = cached
+        return cached[1]
+
+    @read_locked
+    def get_user_by_email(self, email):
+        # Look the user up in the email index instead of scanning all users
+        user = self._derived_index('email', build_email_index).get(email)
+        return copy.deepcopy(user) if user else None
+
+    @read_locked
+    def search_movies(self, query, user_id=None, limit=20, offset=0):
+        """
+        Search movie names, directors and notes.
+        Returns:
+            tuple: (list of movie dicts with user_id and movie_id,
+                    next offset or None).
+        """
+        # The index keeps the users it was built from for the results
+        users, index = self._derived_index(
+            'movies', lambda users: (users or {}, movies_index(users)))
+        where = (lambda doc_id: doc_id[0] == user_id) if user_id else None
+        doc_ids, next_offset = index.search(query, limit, offset, where)
+        results = [{'user_id': doc_user_id, 'movie_id': movie_id,
+                    **users[doc_user_id]['movies'][movie_id]}
+                   for doc_user_id, movie_id in doc_ids]
+        return results, next_offset
+
+    @read_locked
+    def search_users(self, query, limit=20, offset=0):
+        users, index = self._derived_index(
+            'users', lambda users: (users or {}, users_index(users)))
+        user_ids, next_offset = index.search(query, limit, offset)
+        return ({user_id: copy.deepcopy(users[user_id]) for user_id in user_ids},
+                next_offset)
+
+    @read_locked
+    def get_collection_page(self, user_id, query=None):
+        return movies_page(self.get_user_movies(user_id),
+                           query or CollectionQuery())
+
+    @read_locked
     def get_user_movies(self, user_id):
         # Return a dictionary of all movies for a given user
-        users = read_json_file(self.filename)
+        users = self._public_users()
         if users is not None:
             user = users.get(user_id, None)
             if user:
                 return user.get("movies", None)
         return None
 
+    @write_locked
     def add_user(self, user_details):
-        users = read_json_file(self.filename)
+        users = self._read_users()
         users_id_list = list(users.keys())
         if len(users_id_list) == 0:
             user_id = "1"
         else:
             new_user_id_generation = int(users_id_list[-1]) + 1
             user_id = str(new_user_id_generation)
-        users[user_id] = user_details
-        write_json_file(self.filename, users)
+        self._commit(users, {'op': 'add_user', 'user_id': user_id,
+                             'user': user_details})
+
+    @write_locked
+    def update_password(self, user_id, password_hash):
+        users = self._read_users()
+        if users is not None:
+            try:
+                self._commit(users, {'op': 'update_password',
+                                     'user_id': user_id,
+                                     'password': password_hash})
+            except KeyError:
+                print("Invalid user_id")
 
     def add_movie(self, user_id, movie_title):
-        users = read_json_file(self.filename)
+        # The OMDb lookup runs before taking the write lock
+        try:
+            movie_dict_data = omdb_client.fetch_movie(movie_title)
+            if movie_dict_data['Response'] == 'False':
+                return False
+            movie = {
+                'name': movie_dict_data['Title'],
+                'director': movie_dict_data['Director'],
+                'rating': float(movie_dict_data['imdbRating']),
+                'year': movie_dict_data['Year']
+            }
+        except requests.exceptions.RequestException as e:
+            print(f"Error making API request: {e}")
+            return None
+        except (KeyError, ValueError) as e:
+            print(f"Error processing movie data: {e}")
+            return None
+        self._insert_movie(user_id, movie)
+
+    @write_locked
+    def _insert_movie(self, user_id, movie):
+        # The new movie id is picked and written under the same lock
+        users = self._read_users()
         if users is not None:
             user_movies = users.get(user_id, {}).get("movies", {})
-            try:
-                response = requests.get(API + movie_title)
-                response.raise_for_status()
-                movie_dict_data = json.loads(response.text)
-                if movie_dict_data['Response'] == 'False':
-                    return False
-                else:
-                    movies_id_list = list(user_movies.keys())
-
-                    if len(movies_id_list) == 0:
-                        movie_id = '1'
-                    else:
-                        new_movie_id_generation = int(movies_id_list[-1]) + 1
-                        movie_id = str(new_movie_id_generation)
-
-                    user_movies[movie_id] = {
-                        'name': movie_dict_data['Title'],
-                        'director': movie_dict_data['Director'],
-                        'rating': float(movie_dict_data['imdbRating']),
-                        'year': movie_dict_data['Year']
-                    }
-
-                    users.setdefault(user_id, {})["movies"] = user_movies
-                    write_json_file(self.filename, users)
-            except requests.exceptions.RequestException as e:
-                print(f"Error making API request: {e}")
-            except (KeyError, ValueError) as e:
-                print(f"Error processing movie data: {e}")
+            movies_id_list = list(user_movies.keys())
+
+            if len(movies_id_list) == 0:
+                movie_id = '1'
+            else:
+                new_movie_id_generation = int(movies_id_list[-1]) + 1
+                movie_id = str(new_movie_id_generation)
 
+            self._commit(users, {'op': 'add_movie',
+                                 'user_id': user_id,
+                                 'movie_id': movie_id,
+                                 'movie': movie})
+
+    @write_locked
     def update_movie(self, user_id, movie_id, movie_title, movie_director,
                      movie_rating, movie_year):
-        users = read_json_file(self.filename)
+        users = self._read_users()
         if users is not None:
             try:
-                users[user_id]["movies"][movie_id] = {'name': movie_title,
-                                                      'director': movie_director,
-                                                      'rating': movie_rating,
-                                                      'year': movie_year}
-                write_json_file(self.filename, users)
+                self._commit(users, {'op': 'update_movie',
+                                     'user_id': user_id,
+                                     'movie_id': movie_id,
+                                     'movie': {'name': movie_title,
+                                               'director': movie_director,
+                                               'rating': movie_rating,
+                                               'year': movie_year}})
             except KeyError:
                 print("Invalid user_id or movie_id")
             except ValueError:
                 print("Invalid movie rating or year")
 
+    @write_locked
     def delete_movie(self, user_id, movie_id):
-        users = read_json_file(self.filename)
+        users = self._read_users()
         if users is not None:
-            movies = users.get(user_id, {}).get("movies", {})
             try:
-                movies.pop(movie_id)
-                write_json_file(self.filename, users)
+                self._commit(users, {'op': 'delete_movie',
+                                     'user_id': user_id,
+                                     'movie_id': movie_id})
             except KeyError:
-                print("Invalid user_id or movie_id")
+                print("Invalid user_id or movie_id")
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Typed and normalized copies of OMDb's free-text movie fields.
+
+OMDb returns years like "2010–2013", ratings like "N/A" and genres, actors
+and directors as comma-joined strings. The parsers here turn them into the
+typed movies columns (release_year, end_year, imdb_rating) and into rows
+of the facet tables (genres, actors, directors and their movie_*
+junction tables), so "genre = Drama" or "movies with actor X" is an index
+lookup instead of a LIKE scan over every movie.
+
+New movies are parsed at ingest (movie_fields and the Movies insert
+hook); backfill() fills the columns and tables for existing rows.
+"""
+import re
+import time
+
+YEAR_PATTERN = re.compile(r'\d{4}')
+
+# facet -> (facet table, junction table, junction key, movies column)
+FACETS = {
+    'genre': ('genres', 'movie_genres', 'genre_id', 'genre'),
+    'actor': ('actors', 'movie_actors', 'actor_id', 'actors'),
+    'director': ('directors', 'movie_directors', 'director_id', 'director'),
+}
+
+
+def parse_year(value):
+    """
+    Returns:
+        tuple: (release year, end year) as ints. The end year is only set
+        for ranges like "2010–2013"; both are None without a year.
+    """
+    years = YEAR_PATTERN.findall(str(value or ''))
+    if not years:
+        return None, None
+    return int(years[0]), int(years[1]) if len(years) > 1 else None
+
+
+def parse_rating(value):
+    # An IMDb rating as a float in 0..10, None for "N/A" and the like
+    try:
+        rating = float(value)
+    except (TypeError, ValueError):
+        return None
+    return rating if 0 <= rating <= 10 else None
+
+
+def split_names(value):
+    # "Drama, Romance" -> ['Drama', 'Romance'], without blanks, "N/A"
+    # and repeats
+    names, seen = [], set()
+    for name in str(value or '').split(','):
+        name = name.strip()
+        if name and name != 'N/A' and name.casefold() not in seen:
+            seen.add(name.casefold())
+            names.append(name)
+    return names
+
+
+def typed_fields(year, rating):
+    # The typed movies columns for raw year and rating values
+    release_year, end_year = parse_year(year)
+    return {'release_year': release_year, 'end_year': end_year,
+            'imdb_rating': parse_rating(rating)}
+
+
+def facet_statements(movies):
+    """
+    SQL linking movies to their facet rows, replacing existing links.
+    Args:
+        movies (iterable): (movie_id, mapping with the genre, actors and
+            director columns) pairs.
+    Returns:
+        list: (sql, list of parameter dicts) pairs to run with
+        executemany, in order. The SQL uses :named parameters, so it runs
+        on sqlite3 and on SQLAlchemy text() alike.
+    """
+    movies = list(movies)
+    if not movies:
+        return []
+    statements = []
+    for table, junction, key, column in FACETS.values():
+        statements.append((f"DELETE FROM {junction} WHERE movie_id = :movie_id",
+                           [{'movie_id': movie_id} for movie_id, _ in movies]))
+        links = [{'movie_id': movie_id, 'name': name}
+                 for movie_id, movie in movies
+                 for name in split_names(movie[column])]
+        if links:
+            # Names are unique case-insensitively (COLLATE NOCASE)
+            statements.append((f"INSERT OR IGNORE INTO {table} (name) "
+                               f"VALUES (:name)", links))
+            statements.append((f"INSERT OR IGNORE INTO {junction} "
+                               f"(movie_id, {key}) SELECT :movie_id, id "
+                               f"FROM {table} WHERE name = :name", links))
+    return statements
+
+
+def backfill(connection, batch_size=1000, pause=0.0):
+    """
+    Fill the typed columns and facet tables for every stored movie.
+    Movies are processed in movie_id order, batch_size per transaction,
+    so the application can keep writing in between; running it again is
+    harmless.
+    Args:
+        connection (sqlite3.Connection): The database.
+        pause (float): Seconds to sleep between batches.
+    Returns:
+        int: Number of movies processed.
+    """
+    last_movie_id, processed = 0, 0
+    while True:
+        rows = connection.execute(
+            "SELECT movie_id, year, rating, genre, actors, director "
+            "FROM movies WHERE movie_id > ? ORDER BY movie_id LIMIT ?",
+            (last_movie_id, batch_size)).fetchall()
+        if not rows:
+            return processed
+        connection.executemany(
+            "UPDATE movies SET release_year = :release_year, "
+            "end_year = :end_year, imdb_rating = :imdb_rating "
+            "WHERE movie_id = :movie_id",
+            [{'movie_id': row[0], **typed_fields(row[1], row[2])}
+             for row in rows])
+        for sql, parameters in facet_statements(
+                (row[0], {'genre': row[3], 'actors': row[4],
+                          'director': row[5]}) for row in rows):
+            connection.executemany(sql, parameters)
+        connection.commit()
+        last_movie_id = rows[-1][0]
+        processed += len(rows)
+        if pause:
+            # Let application writers in between batches
+            time.sleep(pause)
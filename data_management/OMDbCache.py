@@ -0,0 +1,170 @@
+import json
+import sqlite3
+import threading
+import time
+
+# Responses older than this are fetched again
+DEFAULT_TTL = 7 * 24 * 3600
+# "Movie not found!" answers are cached for a shorter time
+DEFAULT_NEGATIVE_TTL = 24 * 3600
+# Least recently used entries are evicted beyond this many entries
+DEFAULT_MAX_ENTRIES = 10000
+
+NOT_FOUND_ERROR = 'Movie not found!'
+
+
+def normalize_title(title):
+    """
+    Normalize a movie title for lookups: OMDb matches titles
+    case-insensitively and ignores surrounding/repeated whitespace.
+    """
+    return ' '.join(title.split()).casefold()
+
+
+class OMDbCache:
+    """
+    Persistent cache of OMDb responses stored in a SQLite file.
+
+    Entries are keyed by normalized title; found movies are also stored
+    under their canonical title and can be looked up by imdbID. Entries
+    expire after a TTL and the least recently used ones are evicted once
+    the cache holds more than max_entries.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Opened lazily so importing the module never touches the disk
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False,
+                                         timeout=10)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS omdb_cache (
+                    title_key TEXT PRIMARY KEY,
+                    imdb_id TEXT,
+                    payload TEXT NOT NULL,
+                    found INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_omdb_cache_imdb_id "
+                               "ON omdb_cache (imdb_id)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_omdb_cache_accessed_at "
+                               "ON omdb_cache (accessed_at)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def get(self, title):
+        """
+        Look up a cached OMDb response by title.
+        Returns:
+            dict: The cached response (a 'Response': 'False' payload for
+            negative entries), or None on a miss.
+        """
+        return self._get('title_key = ?', normalize_title(title))
+
+    def get_by_imdb_id(self, imdb_id):
+        return self._get('imdb_id = ? AND found = 1', imdb_id)
+
+    def _get(self, condition, value):
+        # A broken cache must never break a lookup: treat errors as misses
+        try:
+            return self._get_entry(condition, value)
+        except sqlite3.Error as error:
+            print(f"Error reading OMDb cache {self.path}: {error}")
+            return None
+
+    def _get_entry(self, condition, value):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                f"SELECT title_key, payload, found, fetched_at FROM omdb_cache "
+                f"WHERE {condition} LIMIT 1", (value,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            title_key, payload, found, fetched_at = row
+            ttl = self.ttl if found else self.negative_ttl
+            if now - fetched_at > ttl:
+                connection.execute("DELETE FROM omdb_cache WHERE title_key = ?",
+                                   (title_key,))
+                connection.commit()
+                self.expired += 1
+                self.misses += 1
+                return None
+            connection.execute("UPDATE omdb_cache SET accessed_at = ? "
+                               "WHERE title_key = ?", (now, title_key))
+            connection.commit()
+            if found:
+                self.hits += 1
+            else:
+                self.negative_hits += 1
+        return json.loads(payload)
+
+    def put(self, title, movie_dict_data):
+        """
+        Store an OMDb response. Only found movies and "Movie not found!"
+        answers are cached; other errors (e.g. rate limits) are not.
+        """
+        found = movie_dict_data.get('Response') == 'True'
+        if not found and movie_dict_data.get('Error') != NOT_FOUND_ERROR:
+            return
+        keys = {normalize_title(title)}
+        if found and movie_dict_data.get('Title'):
+            keys.add(normalize_title(movie_dict_data['Title']))
+        imdb_id = movie_dict_data.get('imdbID') if found else None
+        payload = json.dumps(movie_dict_data)
+        now = time.time()
+        with self._lock:
+            try:
+                connection = self._connect()
+                connection.executemany(
+                    "INSERT OR REPLACE INTO omdb_cache (title_key, imdb_id, "
+                    "payload, found, fetched_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(key, imdb_id, payload, int(found), now, now)
+                     for key in keys])
+                self._evict(connection)
+                connection.commit()
+            except sqlite3.Error as error:
+                print(f"Error writing OMDb cache {self.path}: {error}")
+
+    def _evict(self, connection):
+        count = connection.execute("SELECT COUNT(*) FROM omdb_cache").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM omdb_cache WHERE title_key IN (SELECT title_key "
+                "FROM omdb_cache ORDER BY accessed_at LIMIT ?)", (excess,))
+            self.evictions += excess
+
+    def clear(self):
+        with self._lock:
+            connection = self._connect()
+            connection.execute("DELETE FROM omdb_cache")
+            connection.commit()
+
+    def stats(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'hit_ratio': (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+        }
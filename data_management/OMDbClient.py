@@ -0,0 +1,114 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from .OMDbCache import DEFAULT_TTL, OMDbCache, normalize_title
+
+# OMDB API to get movie data
+API_URL: str = os.environ.get('OMDB_API_URL', 'http://www.omdbapi.com/')
+API_KEY: str = os.environ.get('OMDB_API_KEY', '6f0c3bf6')
+
+# Persistent response cache shared by all data managers; set
+# OMDB_CACHE_PATH to an empty string to disable it
+CACHE_PATH: str = os.environ.get(
+    'OMDB_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'user_data', 'omdb_cache.sqlite'))
+CACHE_TTL: int = int(os.environ.get('OMDB_CACHE_TTL', DEFAULT_TTL))
+
+# (connect, read) timeouts in seconds for a single OMDb request
+DEFAULT_TIMEOUT = (3.05, 10)
+
+
+class OMDbClient:
+    """
+    Shared client for the OMDb API.
+
+    Requests go through one pooled keep-alive session with timeouts.
+    Concurrent lookups of the same title are coalesced: the first caller
+    makes the upstream request and the others wait for its result. With a
+    cache, stored responses are returned without going upstream.
+    """
+
+    def __init__(self, base_url=API_URL, api_key=API_KEY,
+                 timeout=DEFAULT_TIMEOUT, pool_size=10, max_workers=8,
+                 cache=None):
+        self.base_url = base_url
+        self.cache = cache
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def fetch_movie(self, title):
+        """
+        Look up a movie by title.
+        Args:
+            title (str): Movie title as typed by the user.
+        Returns:
+            dict: The OMDb response; 'Response' is 'False' when the movie
+            was not found.
+        Raises:
+            requests.exceptions.RequestException: On network or HTTP errors.
+        """
+        if self.cache is not None:
+            cached_movie = self.cache.get(title)
+            if cached_movie is not None:
+                return cached_movie
+
+        key = normalize_title(title)
+        with self._lock:
+            future = self._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not is_leader:
+            return dict(future.result())
+
+        try:
+            movie_dict_data = self._request(title)
+            if self.cache is not None:
+                self.cache.put(title, movie_dict_data)
+            future.set_result(movie_dict_data)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return dict(movie_dict_data)
+
+    def submit(self, title):
+        """
+        Look up a movie in a background thread.
+        Returns:
+            concurrent.futures.Future: Resolves to the fetch_movie result.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='omdb')
+        return self._executor.submit(self.fetch_movie, title)
+
+    def _request(self, title):
+        response = self.session.get(self.base_url,
+                                    params={'apikey': self.api_key, 't': title},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+# Client shared by all data managers and the API blueprint
+omdb_client = OMDbClient(
+    cache=OMDbCache(CACHE_PATH, ttl=CACHE_TTL) if CACHE_PATH else None)
@@ -1,21 +1,557 @@
-import requests
-import json
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import joinedload
-from data_management.SQL_Data_Models import db, User, UserMovies, Movies, Reviews
+from sqlalchemy import and_, func, insert, or_, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload, load_only
+from data_management.SQL_Data_Models import db, User, UserMovies, Movies, \
+    Reviews, MovieRatingStats, RatingHistogram, FavoriteCounts, Genre, \
+    Actor, Director, MovieGenre, MovieActor, MovieDirector
+from .BulkImport import fetch_movies, unique_titles
+from .CollectionQuery import CollectionQuery, encode_cursor
 from .DataManager import DataManagerInterface
+from .MovieFacets import facet_statements, typed_fields
+from .OMDbClient import omdb_client
+from .SearchIndex import tokenize
+from .SQLiteTuning import SQLiteProfile, is_locked_error, retry_on_locked
+from . import migrations
 
-# OMDB API to get movie data
-API: str = 'http://www.omdbapi.com/?apikey=6f0c3bf6&t='
+
+def movie_fields(movie_dict_data):
+    # Map an OMDb response to the columns of the Movies table. year keeps
+    # OMDb's text ("2008–2013"); the typed columns hold the parsed values.
+    # The NOT NULL rating column gets 0 for "N/A", imdb_rating None.
+    fields = typed_fields(movie_dict_data['Year'],
+                          movie_dict_data['imdbRating'])
+    return {'title': movie_dict_data['Title'],
+            'year': movie_dict_data['Year'],
+            'rating': fields['imdb_rating'] or 0.0,
+            'genre': movie_dict_data['Genre'],
+            'director': movie_dict_data['Director'],
+            'writer': movie_dict_data['Writer'],
+            'actors': movie_dict_data['Actors'],
+            'plot': movie_dict_data['Plot'],
+            'language': movie_dict_data['Language'],
+            'country': movie_dict_data['Country'],
+            'poster': movie_dict_data['Poster'],
+            '_type': movie_dict_data['Type'],
+            'imdb_id': movie_dict_data.get('imdbID'),
+            **fields}
+
+
+def find_movie(movie_dict_data):
+    # Find the stored movie for an OMDb response, by imdbID or title
+    imdb_id = movie_dict_data.get('imdbID')
+    if imdb_id:
+        movie = Movies.query.filter_by(imdb_id=imdb_id).first()
+        if movie:
+            return movie
+    return Movies.query.filter_by(title=movie_dict_data['Title']).first()
+
+
+def users_page(after=None, limit=50):
+    """
+    Fetch one page of users ordered by id (keyset pagination).
+    Args:
+        after (int): Return users with an id greater than this cursor.
+        limit (int): Page size.
+    Returns:
+        tuple: (list of User, cursor for the next page or None).
+    """
+    query = User.query.order_by(User.id)
+    if after is not None:
+        query = query.filter(User.id > after)
+    # Fetch one extra row to know whether another page follows
+    users = query.limit(limit + 1).all()
+    if len(users) > limit:
+        users = users[:limit]
+        return users, users[-1].id
+    return users, None
+
+
+def iter_users(batch_size=1000):
+    """
+    Yield every user as a dict, reading the table in keyset batches so the
+    whole list is never held in memory.
+    """
+    after = 0
+    while True:
+        rows = db.session.execute(
+            select(User.id, User.name, User.email)
+            .where(User.id > after)
+            .order_by(User.id)
+            .limit(batch_size)).all()
+        for row in rows:
+            yield {'id': row.id, 'name': row.name, 'email': row.email}
+        if len(rows) < batch_size:
+            return
+        after = rows[-1].id
+
+
+# Columns loaded for collection lists: what movies.html renders
+LIST_COLUMNS = ('movie_id', 'title', 'year', 'rating', 'director', 'poster')
+
+# Year and rating sort on the typed columns (MovieFacets): "N/A" is NULL
+# and "2010–2013" its first year. Movies without a value come last
+SORT_COLUMNS = {'added': UserMovies.id, 'title': Movies.title,
+                'year': Movies.release_year, 'rating': Movies.imdb_rating}
+
+
+def after_cursor(sort_column, id_column, after, descending):
+    # Keyset condition for the rows following (sort value, id) in the
+    # order (sort_column NULLS LAST, id_column), ascending or descending
+    value, key = after
+    next_key = id_column < key if descending else id_column > key
+    if value is None:
+        return and_(sort_column.is_(None), next_key)
+    return or_(sort_column < value if descending else sort_column > value,
+               and_(sort_column == value, next_key),
+               sort_column.is_(None))
+
+
+def collection_page(user_id, query=None, columns=LIST_COLUMNS):
+    """
+    One page of a user's collection, sorted and filtered in SQL.
+    Pages are keyset-paginated on (sort column, favorite_movies.id), and
+    only the given Movies columns are loaded (None loads every column).
+    Args:
+        query (CollectionQuery): Sort, filters, cursor and page size.
+    Returns:
+        tuple: (list of (UserMovies, Movies), next cursor or None).
+    """
+    query = query or CollectionQuery()
+    sort_column = SORT_COLUMNS[query.sort]
+    statement = db.session.query(UserMovies, Movies). \
+        join(Movies, UserMovies.movie_id == Movies.movie_id). \
+        filter(UserMovies.user_id == user_id). \
+        options(load_only(UserMovies.id, UserMovies.user_id,
+                          UserMovies.movie_id))
+    if columns is not None:
+        # The sort column too: the next cursor holds its value
+        loaded = [getattr(Movies, column) for column in columns]
+        if query.sort != 'added':
+            loaded.append(sort_column)
+        statement = statement.options(load_only(*loaded))
+    # Filters use the normalized facets and typed columns (MovieFacets)
+    statement = statement.filter(*movie_filters(
+        genre=query.genre, year_from=query.year_from, year_to=query.year_to,
+        min_rating=query.min_rating))
+    if query.after is not None:
+        statement = statement.filter(after_cursor(
+            sort_column, UserMovies.id, query.after, query.descending))
+    if query.descending:
+        statement = statement.order_by(sort_column.desc().nulls_last(),
+                                       UserMovies.id.desc())
+    else:
+        statement = statement.order_by(sort_column.nulls_last(),
+                                       UserMovies.id)
+    rows = statement.limit(query.limit + 1).all()
+    if len(rows) > query.limit:
+        rows = rows[:query.limit]
+        user_movie, movie = rows[-1]
+        sort_value = user_movie.id if query.sort == 'added' \
+            else getattr(movie, sort_column.key)
+        return rows, encode_cursor(sort_value, user_movie.id)
+    return rows, None
+
+
+def fts_query(query):
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix.
+    Words are quoted so FTS5 operators in the input are taken literally.
+    """
+    return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+
+def ranked_ids(sql, parameters, limit, offset):
+    # Run a ranked id query for one page; returns (ids, next offset or None)
+    rows = db.session.execute(text(sql), {**parameters, 'limit': limit + 1,
+                                          'offset': offset}).all()
+    ids = [row[0] for row in rows[:limit]]
+    return ids, offset + limit if len(rows) > limit else None
+
+
+def load_in_order(model, key, ids):
+    objects = {getattr(obj, key.key): obj
+               for obj in model.query.filter(key.in_(ids))} if ids else {}
+    return [objects[id_] for id_ in ids if id_ in objects]
+
+
+def search_movies(query, user_id=None, limit=20, offset=0):
+    """
+    Full-text search over movies and their reviews, best matches first.
+    Title matches weigh most, then director, actors/genre, plot; a match
+    in a review counts half as much as one in the movie itself.
+    Args:
+        user_id (int): Only search this user's collection.
+    Returns:
+        tuple: (list of Movies, next offset or None).
+    """
+    match = fts_query(query)
+    if not match:
+        return [], None
+    collection = ''
+    if user_id is not None:
+        collection = ('JOIN favorite_movies ON favorite_movies.movie_id = '
+                      'matches.movie_id AND favorite_movies.user_id = :user_id')
+    movie_ids, next_offset = ranked_ids(f"""
+        SELECT matches.movie_id, MIN(matches.score) AS score FROM (
+            SELECT rowid AS movie_id,
+                   bm25(movies_fts, 10.0, 3.0, 2.0, 2.0, 1.0) AS score
+            FROM movies_fts WHERE movies_fts MATCH :match
+            UNION ALL
+            SELECT reviews.movie_id, bm25(reviews_fts) * 0.5 AS score
+            FROM reviews_fts
+            JOIN reviews ON reviews.review_id = reviews_fts.rowid
+            WHERE reviews_fts MATCH :match
+        ) AS matches {collection}
+        GROUP BY matches.movie_id
+        ORDER BY score, matches.movie_id
+        LIMIT :limit OFFSET :offset""",
+        {'match': match, 'user_id': user_id}, limit, offset)
+    return load_in_order(Movies, Movies.movie_id, movie_ids), next_offset
+
+
+def search_users(query, limit=20, offset=0):
+    """
+    Full-text search over user names and emails, best matches first.
+    Returns:
+        tuple: (list of User, next offset or None).
+    """
+    match = fts_query(query)
+    if not match:
+        return [], None
+    user_ids, next_offset = ranked_ids("""
+        SELECT rowid FROM users_fts WHERE users_fts MATCH :match
+        ORDER BY bm25(users_fts, 2.0, 1.0), rowid
+        LIMIT :limit OFFSET :offset""", {'match': match}, limit, offset)
+    return load_in_order(User, User.id, user_ids), next_offset
+
+
+REVIEWS_PAGE_SIZE = 20
+
+
+def movie_details(user_id, movie_id):
+    """
+    Fetch one movie of a user's collection in a single query: the movie,
+    the user's note and name, and the movie's rating count and average
+    from the materialized movie_rating_stats row.
+    Returns:
+        dict: 'movie', 'note', 'user_name', 'review_count' and
+        'average_rating' (None without ratings), or None if the user does
+        not have the movie.
+    """
+    row = db.session.query(UserMovies.note, Movies, User.name,
+                           MovieRatingStats.rating_count,
+                           MovieRatingStats.average_rating). \
+        join(Movies, UserMovies.movie_id == Movies.movie_id). \
+        join(User, UserMovies.user_id == User.id). \
+        outerjoin(MovieRatingStats,
+                  MovieRatingStats.movie_id == Movies.movie_id). \
+        filter(UserMovies.user_id == user_id,
+               UserMovies.movie_id == movie_id).first()
+    if row is None:
+        return None
+    note, movie, user_name, count, average = row
+    return {'movie': movie, 'note': note, 'user_name': user_name,
+            'review_count': count or 0,
+            'average_rating': round(average, 1) if count else None}
+
+
+def reviews_page(movie_id, after=None, limit=REVIEWS_PAGE_SIZE):
+    """
+    Fetch one page of a movie's reviews, newest first (keyset pagination
+    on ix_reviews_movie_id), with their authors loaded in the same query.
+    Args:
+        movie_id (int): Movie ID.
+        after (int): Return reviews with an id lower than this cursor.
+        limit (int): Page size.
+    Returns:
+        tuple: (list of Reviews, cursor for the next page or None).
+    """
+    query = Reviews.query.options(joinedload(Reviews.user)). \
+        filter(Reviews.movie_id == movie_id). \
+        order_by(Reviews.review_id.desc())
+    if after is not None:
+        query = query.filter(Reviews.review_id < after)
+    # Fetch one extra row to know whether another page follows
+    reviews = query.limit(limit + 1).all()
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        return reviews, reviews[-1].review_id
+    return reviews, None
+
+
+LEADERBOARD_SIZE = 10
+
+# Columns loaded for leaderboard entries
+LEADERBOARD_COLUMNS = ('movie_id', 'title', 'year', 'director', 'poster')
+
+
+def top_rated_movies(limit=LEADERBOARD_SIZE, min_ratings=1):
+    """
+    The movies with the highest average user rating, read from the
+    materialized movie_rating_stats rows (walks its average index).
+    Args:
+        min_ratings (int): Leave out movies with fewer ratings.
+    Returns:
+        list: (Movies, MovieRatingStats) tuples, best first.
+    """
+    return db.session.query(Movies, MovieRatingStats). \
+        join(MovieRatingStats, MovieRatingStats.movie_id == Movies.movie_id). \
+        options(load_only(*(getattr(Movies, column)
+                            for column in LEADERBOARD_COLUMNS))). \
+        filter(MovieRatingStats.rating_count >= min_ratings). \
+        order_by(MovieRatingStats.average_rating.desc(),
+                 MovieRatingStats.rating_count.desc()). \
+        limit(limit).all()
+
+
+def most_favorited_movies(limit=LEADERBOARD_SIZE):
+    """
+    The movies in the most collections, read from the materialized
+    movie_favorite_counts rows.
+    Returns:
+        list: (Movies, favorite count) tuples, most favorited first.
+    """
+    return db.session.query(Movies, FavoriteCounts.favorite_count). \
+        join(FavoriteCounts, FavoriteCounts.movie_id == Movies.movie_id). \
+        options(load_only(*(getattr(Movies, column)
+                            for column in LEADERBOARD_COLUMNS))). \
+        order_by(FavoriteCounts.favorite_count.desc(), Movies.movie_id). \
+        limit(limit).all()
+
+
+def rating_stats(movie_id):
+    """
+    A movie's materialized rating aggregates.
+    Returns:
+        dict: 'rating_count', 'rating_sum', 'average_rating' and
+        'histogram' (rating bucket 0..10 -> count), or None without ratings.
+    """
+    stats = db.session.get(MovieRatingStats, movie_id)
+    if stats is None:
+        return None
+    histogram = dict(db.session.query(RatingHistogram.bucket,
+                                      RatingHistogram.count).
+                     filter(RatingHistogram.movie_id == movie_id))
+    return {'rating_count': stats.rating_count,
+            'rating_sum': stats.rating_sum,
+            'average_rating': stats.average_rating,
+            'histogram': {bucket: histogram.get(bucket, 0)
+                          for bucket in range(11)}}
+
+
+# facet -> (facet model, junction model, junction key)
+FACET_MODELS = {
+    'genre': (Genre, MovieGenre, MovieGenre.genre_id),
+    'actor': (Actor, MovieActor, MovieActor.actor_id),
+    'director': (Director, MovieDirector, MovieDirector.director_id),
+}
+
+# Orderings of filter_movies; movies without a year or rating come last
+MOVIE_SORTS = {
+    'rating': (Movies.imdb_rating.desc().nulls_last(), Movies.movie_id),
+    'year': (Movies.release_year.desc().nulls_last(), Movies.movie_id),
+    'title': (Movies.title, Movies.movie_id),
+}
+
+
+def facet_model(facet):
+    try:
+        return FACET_MODELS[facet]
+    except KeyError:
+        raise ValueError(f"Unknown facet: {facet}") from None
+
+
+def movie_filters(genre=None, actor=None, director=None, year_from=None,
+                  year_to=None, min_rating=None, user_id=None):
+    """
+    Conditions on Movies for the given facets and ranges. Facet names
+    match case-insensitively through the facet name and junction indexes;
+    the ranges use the typed release_year and imdb_rating columns.
+    Returns:
+        list: SQLAlchemy conditions, empty without filters.
+    """
+    conditions = []
+    for facet, name in (('genre', genre), ('actor', actor),
+                        ('director', director)):
+        if name:
+            model, junction, key = facet_model(facet)
+            conditions.append(Movies.movie_id.in_(
+                select(junction.movie_id).join(model, model.id == key).
+                where(model.name == name)))
+    if year_from is not None:
+        conditions.append(Movies.release_year >= year_from)
+    if year_to is not None:
+        conditions.append(Movies.release_year <= year_to)
+    if min_rating is not None:
+        conditions.append(Movies.imdb_rating >= min_rating)
+    if user_id is not None:
+        conditions.append(Movies.movie_id.in_(
+            select(UserMovies.movie_id).where(UserMovies.user_id == user_id)))
+    return conditions
+
+
+def filter_movies(sort='rating', limit=20, offset=0, **filters):
+    """
+    Movies matching every given filter, e.g. genre='Drama',
+    actor='Tom Hanks' and year_from=1990 (see movie_filters).
+    Args:
+        sort (str): 'rating', 'year' (newest first) or 'title'.
+    Returns:
+        tuple: (list of Movies, next offset or None).
+    Raises:
+        ValueError: For an unknown sort or facet.
+    """
+    if sort not in MOVIE_SORTS:
+        raise ValueError(f"Unknown sort: {sort}")
+    movies = Movies.query.filter(*movie_filters(**filters)). \
+        order_by(*MOVIE_SORTS[sort]).offset(offset).limit(limit + 1).all()
+    if len(movies) > limit:
+        return movies[:limit], offset + limit
+    return movies, None
+
+
+def facet_counts(facet, limit=20, **filters):
+    """
+    Number of matching movies per value of a facet, most common first,
+    e.g. facet_counts('genre', director='Christopher Nolan') or the
+    genres of one collection with user_id.
+    Returns:
+        list: (name, movie count) tuples.
+    Raises:
+        ValueError: For an unknown facet.
+    """
+    model, junction, key = facet_model(facet)
+    movie_count = func.count(junction.movie_id)
+    query = db.session.query(model.name, movie_count). \
+        join(junction, key == model.id)
+    conditions = movie_filters(**filters)
+    if conditions:
+        query = query.filter(junction.movie_id.in_(
+            select(Movies.movie_id).where(*conditions)))
+    return query.group_by(model.id). \
+        order_by(movie_count.desc(), model.name).limit(limit).all()
+
+
+def movie_facets(movie_id):
+    """
+    Returns:
+        dict: facet ('genre', 'actor', 'director') -> names of the movie.
+    """
+    return {facet: [name for (name,) in db.session.query(model.name).
+                    join(junction, key == model.id).
+                    filter(junction.movie_id == movie_id).
+                    order_by(model.name)]
+            for facet, (model, junction, key) in FACET_MODELS.items()}
+
+
+@retry_on_locked()
+def bulk_add_movies(user_id, titles, max_workers=8):
+    """
+    Add many movies to a user's collection in one transaction.
+
+    Titles already in the Movies table are used as is; the others are
+    fetched from OMDb concurrently with a bounded worker pool. New Movies
+    and UserMovies rows are written with batched (executemany) inserts and
+    committed once.
+    Args:
+        user_id (int): User ID.
+        titles (list): Movie titles.
+        max_workers (int): Maximum concurrent OMDb lookups.
+    Returns:
+        list: One dict per unique title with 'title', 'status'
+        ('added', 'already_in_collection', 'not_found' or 'error'),
+        'movie_id' and, for errors, 'error'.
+    """
+    titles = unique_titles(titles)
+    results = {title: {'title': title, 'status': None, 'movie_id': None}
+               for title in titles}
+
+    # Titles typed exactly as stored need no OMDb lookup
+    movie_ids = {}
+    for movie_id, title in db.session.query(Movies.movie_id, Movies.title). \
+            filter(Movies.title.in_(titles)):
+        movie_ids.setdefault(title, movie_id)
+    for title in titles:
+        if title in movie_ids:
+            results[title]['movie_id'] = movie_ids[title]
+
+    to_fetch = [title for title in titles if title not in movie_ids]
+    fetched = fetch_movies(to_fetch, omdb_client, max_workers)
+    canonical_titles = {}
+    for title, movie_dict_data in fetched.items():
+        if isinstance(movie_dict_data, Exception):
+            results[title].update(status='error', error=str(movie_dict_data))
+        elif movie_dict_data.get('Response') == 'False':
+            results[title]['status'] = 'not_found'
+        else:
+            canonical_titles[title] = movie_dict_data
+
+    try:
+        # Reuse Movies rows stored under the same imdbID or canonical title
+        wanted = {data['Title'] for data in canonical_titles.values()}
+        imdb_ids = {data.get('imdbID'): data['Title']
+                    for data in canonical_titles.values() if data.get('imdbID')}
+        for movie_id, imdb_id in db.session.query(Movies.movie_id, Movies.imdb_id). \
+                filter(Movies.imdb_id.in_(list(imdb_ids))):
+            movie_ids.setdefault(imdb_ids[imdb_id], movie_id)
+        for movie_id, title in db.session.query(Movies.movie_id, Movies.title). \
+                filter(Movies.title.in_(wanted)):
+            movie_ids.setdefault(title, movie_id)
+        new_movies = {}
+        for movie_dict_data in canonical_titles.values():
+            if movie_dict_data['Title'] not in movie_ids:
+                new_movies.setdefault(movie_dict_data['Title'],
+                                      movie_fields(movie_dict_data))
+        if new_movies:
+            db.session.execute(insert(Movies), list(new_movies.values()))
+            for movie_id, title in db.session.query(Movies.movie_id, Movies.title). \
+                    filter(Movies.title.in_(list(new_movies))):
+                movie_ids.setdefault(title, movie_id)
+            # Bulk inserts skip the Movies insert hook; link facets here
+            for sql, parameters in facet_statements(
+                    (movie_ids[title], fields)
+                    for title, fields in new_movies.items()):
+                db.session.execute(text(sql), parameters)
+        for title, movie_dict_data in canonical_titles.items():
+            results[title]['movie_id'] = movie_ids[movie_dict_data['Title']]
+
+        # Skip movies the user already has, then link the rest
+        candidates = {result['movie_id'] for result in results.values()
+                      if result['movie_id'] is not None}
+        owned = {movie_id for (movie_id,) in db.session.query(UserMovies.movie_id).
+                 filter(UserMovies.user_id == user_id,
+                        UserMovies.movie_id.in_(candidates))}
+        new_links = []
+        for result in results.values():
+            if result['movie_id'] is None:
+                continue
+            if result['movie_id'] in owned:
+                result['status'] = 'already_in_collection'
+            else:
+                owned.add(result['movie_id'])
+                result['status'] = 'added'
+                new_links.append({'user_id': user_id,
+                                  'movie_id': result['movie_id'], 'note': ''})
+        if new_links:
+            db.session.execute(insert(UserMovies), new_links)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return list(results.values())
 
 
 class SQLiteDataManager(DataManagerInterface):
-    def __init__(self, app, db_file_name):
+    def __init__(self, app, db_file_name, auto_migrate=True,
+                 sqlite_profile=None):
         self.db = None  # Initialize the db attribute
 
-        self.init_db(app, db_file_name)  # Call the init_db method
+        # Call the init_db method
+        self.init_db(app, db_file_name, auto_migrate, sqlite_profile)
 
-    def init_db(self, app, db_file_name):
+    def init_db(self, app, db_file_name, auto_migrate=True,
+                sqlite_profile=None):
         # Configure the database URI
         app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_file_name}'
 
@@ -24,11 +560,67 @@ class SQLiteDataManager(DataManagerInterface):
 
         self.db = db
 
+        # Tune every pooled connection (WAL, synchronous, cache, mmap, busy
+        # timeout). Configure with the sqlite_profile argument or the
+        # SQLITE_PROFILE config dict; False disables tuning.
+        if sqlite_profile is None:
+            sqlite_profile = app.config.get('SQLITE_PROFILE')
+        self.sqlite_profile = SQLiteProfile.from_config(sqlite_profile)
+        if self.sqlite_profile is not None:
+            with app.app_context():
+                self.sqlite_profile.install(db.engine)
+
+        # Create the tables or bring an older schema up to date. Disable
+        # auto_migrate to run migrations only through migrate.py.
+        connection = migrations.connect(db_file_name)
+        if self.sqlite_profile is not None:
+            self.sqlite_profile.apply(connection)
+        try:
+            version = migrations.current_version(connection)
+            if version < migrations.latest_version():
+                if auto_migrate:
+                    migrations.upgrade(connection)
+                else:
+                    print(f"Database schema is at version {version}; "
+                          f"run 'python migrate.py upgrade'")
+        except ValueError as error:
+            print(f"Schema migration incomplete: {error}")
+        finally:
+            connection.close()
+
     def get_all_users(self):
         # Fetch the list of users from the database
         users = User.query.all()
         return users
 
+    def get_users_page(self, after=None, limit=50):
+        return users_page(after, limit)
+
+    def get_collection_page(self, user_id, query=None):
+        return collection_page(user_id, query)
+
+    def search_movies(self, query, user_id=None, limit=20, offset=0):
+        return search_movies(query, user_id, limit, offset)
+
+    def search_users(self, query, limit=20, offset=0):
+        return search_users(query, limit, offset)
+
+    def filter_movies(self, sort='rating', limit=20, offset=0, **filters):
+        return filter_movies(sort, limit, offset, **filters)
+
+    def facet_counts(self, facet, limit=20, **filters):
+        return facet_counts(facet, limit, **filters)
+
+    def movie_facets(self, movie_id):
+        return movie_facets(movie_id)
+
+    def get_user_by_email(self, email):
+        # Single lookup on the unique ix_users_email index
+        user = User.query.filter_by(email=email).first()
+        if user is None:
+            return None
+        return {**user.to_dict(), 'password': user.password}
+
     def get_user_movies(self, user_id):
         # Retrieve all movies associated with the user
         user_favorite_movies = db.session.query(UserMovies, Movies). \
@@ -39,6 +631,7 @@ class SQLiteDataManager(DataManagerInterface):
         user = User.query.filter_by(id=user_id).first()
         return user_favorite_movies, user
 
+    @retry_on_locked()
     def add_user(self, name, email, password):
         # Create a new User object with the form data
         new_user = User(name=name, email=email, password=password)
@@ -47,11 +640,23 @@ class SQLiteDataManager(DataManagerInterface):
         self.db.session.add(new_user)
         self.db.session.commit()
 
+    @retry_on_locked()
+    def update_password(self, user_id, password_hash):
+        user = db.session.get(User, user_id)
+        if user is None:
+            print("Invalid user_id")
+            return
+        user.password = password_hash
+        db.session.commit()
+
+    @retry_on_locked()
     def add_movie(self, user_id, movie_title):
         # Check if the movie already exists in the Movies table
         existing_movie = Movies.query.filter_by(title=movie_title).first()
 
         if existing_movie:
+            if self._has_movie(user_id, existing_movie.movie_id):
+                return "Movie already exists in your collection."
             # If the movie exists, add it to UserMovies and return
             new_user_movie = UserMovies(
                 user_id=user_id, movie_id=existing_movie.movie_id, note="")
@@ -60,25 +665,19 @@ class SQLiteDataManager(DataManagerInterface):
             return "Movie already exists in the database."
 
         # If the movie doesn't exist, fetch data from the API
-        response = requests.get(API + movie_title)
-        response.raise_for_status()
-        movie_dict_data = json.loads(response.text)
+        movie_dict_data = omdb_client.fetch_movie(movie_title)
         if movie_dict_data['Response'] == 'False':
             return "Movie not found!"
+
+        # The typed title may differ from OMDb's canonical one
+        existing_movie = find_movie(movie_dict_data)
+        if existing_movie:
+            movie_id = existing_movie.movie_id
+            if self._has_movie(user_id, movie_id):
+                return "Movie already exists in your collection."
         else:
             # Create a new movie object with the form data
-            new_movie = Movies(title=movie_dict_data['Title'],
-                               year=movie_dict_data['Year'],
-                               rating=movie_dict_data['imdbRating'],
-                               genre=movie_dict_data['Genre'],
-                               director=movie_dict_data['Director'],
-                               writer=movie_dict_data['Writer'],
-                               actors=movie_dict_data['Actors'],
-                               plot=movie_dict_data['Plot'],
-                               language=movie_dict_data['Language'],
-                               country=movie_dict_data['Country'],
-                               poster=movie_dict_data['Poster'],
-                               _type=movie_dict_data['Type'])
+            new_movie = Movies(**movie_fields(movie_dict_data))
             # Add the movie to the database
             db.session.add(new_movie)
             db.session.commit()
@@ -94,6 +693,11 @@ class SQLiteDataManager(DataManagerInterface):
 
         return "Movie added to the database and UserMovies."
 
+    def _has_movie(self, user_id, movie_id):
+        return UserMovies.query.filter_by(
+            user_id=user_id, movie_id=movie_id).first() is not None
+
+    @retry_on_locked()
     def update_movie(self, user_id, movie_id, movie_title,
                      movie_director, movie_rating, movie_year,
                      movie_note):
@@ -107,6 +711,7 @@ class SQLiteDataManager(DataManagerInterface):
         # Update database
         db.session.commit()
 
+    @retry_on_locked()
     def delete_movie(self, user_id, movie_id):
         try:
             movie_to_delete = UserMovies.query.filter_by(
@@ -115,10 +720,15 @@ class SQLiteDataManager(DataManagerInterface):
             db.session.delete(movie_to_delete)
             db.session.commit()  # Commit the changes to the database
             return True
+        except OperationalError as error:
+            if is_locked_error(error):
+                raise  # Retried by retry_on_locked
+            print(error)
         except Exception as error:
             # Handle the exception appropriately, e.g., logging, error message, etc.
             print(error)
 
+    @retry_on_locked()
     def add_review(self, user_id, movie_id, rating, review):
         try:
             # Create a new review object with the form data
@@ -129,9 +739,26 @@ class SQLiteDataManager(DataManagerInterface):
             # Add the review to the database
             db.session.add(new_review)
             db.session.commit()
+        except OperationalError as error:
+            if is_locked_error(error):
+                raise  # Retried by retry_on_locked
+            print(error)
         except Exception as e:
             print(e)
 
     def get_reviews_for_movie(self, movie_id):
         reviews = Reviews.query.filter_by(movie_id=movie_id).all()
         return reviews
+
+    def get_movie_reviews(self, user_id, movie_id, after=None,
+                          limit=REVIEWS_PAGE_SIZE):
+        # Two queries whatever the number of reviews: details, then a page
+        details = movie_details(user_id, movie_id)
+        if details is None:
+            return None
+        details['reviews'], details['next_cursor'] = reviews_page(
+            movie_id, after, limit)
+        return details
+
+    def bulk_add_movies(self, user_id, titles, max_workers=8):
+        return bulk_add_movies(user_id, titles, max_workers)
@@ -1,13 +1,19 @@
-import os
-import sys
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import (DDL, Column, Float, ForeignKey, Index, Integer, String,
+                        Text, event, text)
+from sqlalchemy.orm import relationship
+from .MovieFacets import facet_statements
+from .migrations.m0003_search import SEARCH_SCHEMA
+from .migrations.m0004_movie_stats import STATS_SCHEMA
 
 db = SQLAlchemy()
 
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_email', 'email', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String, nullable=False)
@@ -30,6 +36,11 @@ class User(db.Model):
 
 class UserMovies(db.Model):
     __tablename__ = 'favorite_movies'
+    __table_args__ = (
+        # A user can have each movie only once
+        Index('ux_favorite_movies_user_movie', 'user_id', 'movie_id',
+              unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -55,6 +66,12 @@ class UserMovies(db.Model):
 
 class Movies(db.Model):
     __tablename__ = 'movies'
+    __table_args__ = (
+        Index('ix_movies_title', 'title'),
+        Index('ix_movies_imdb_id', 'imdb_id', unique=True),
+        Index('ix_movies_release_year', 'release_year'),
+        Index('ix_movies_imdb_rating', 'imdb_rating'),
+    )
 
     movie_id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String, nullable=False)
@@ -69,6 +86,17 @@ class Movies(db.Model):
     country = Column(String, nullable=False)
     poster = Column(String, nullable=False)
     _type = Column(String, nullable=False)
+    imdb_id = Column(String, nullable=True)
+    # Typed copies of year and rating, parsed at ingest (MovieFacets);
+    # None where OMDb had no usable value
+    release_year = Column(Integer, nullable=True)
+    end_year = Column(Integer, nullable=True)
+    imdb_rating = Column(Float, nullable=True)
+    # The normalized facets, written by the insert hook below
+    genres = relationship('Genre', secondary='movie_genres', viewonly=True)
+    cast = relationship('Actor', secondary='movie_actors', viewonly=True)
+    directors = relationship('Director', secondary='movie_directors',
+                             viewonly=True)
 
     def to_dict(self):
         return {
@@ -84,7 +112,11 @@ class Movies(db.Model):
             'language': self.language,
             'country': self.country,
             'poster': self.poster,
-            '_type': self._type
+            '_type': self._type,
+            'imdb_id': self.imdb_id,
+            'release_year': self.release_year,
+            'end_year': self.end_year,
+            'imdb_rating': self.imdb_rating
         }
 
     def __str__(self):
@@ -112,12 +144,18 @@ class Movies(db.Model):
 
 class Reviews(db.Model):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        Index('ix_reviews_movie_id', 'movie_id'),
+    )
 
     review_id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     movie_id = Column(Integer, ForeignKey('movies.movie_id'), nullable=False)
     review_text = Column(Text)
     rating = Column(Float)
+    # The reviewer; load it with joinedload(Reviews.user) when listing
+    # reviews, or every row lazily queries its author
+    user = relationship(User)
 
     def __str__(self):
         return f"Review {self.review_id} for Movie {self.movie_id}, \
@@ -127,18 +165,131 @@ class Reviews(db.Model):
         return f"<Review(review_id={self.review_id}, movie_id={self.movie_id},\
              user_id={self.user_id}, rating={self.rating})>"
 
-######################## This section is being used only for table creation ####################
-################################################################################################
-################################################################################################
-
-# important Note: To create tables uncomment below and comment out db.init_app(app) in SQLDataManager.py
-
-# if __name__ == '__main__':
-#     parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-#     # Add the parent directory to sys.path
-#     sys.path.insert(0, parent_dir)
-#     # Create the new tables
-#     from app import app
-#     with app.app_context():
-#         db.init_app(app)
-#         db.create_all()
+
+class MovieRatingStats(db.Model):
+    # Maintained by triggers on reviews (migration m0004); never write it
+    __tablename__ = 'movie_rating_stats'
+    __table_args__ = (
+        Index('ix_movie_rating_stats_average', 'average_rating',
+              'rating_count'),
+    )
+
+    movie_id = Column(Integer, ForeignKey('movies.movie_id'),
+                      primary_key=True, autoincrement=False)
+    rating_count = Column(Integer, nullable=False)
+    rating_sum = Column(Float, nullable=False)
+    average_rating = Column(Float, nullable=False)
+
+
+class RatingHistogram(db.Model):
+    # Reviews per movie and rating bucket (integer part of the rating)
+    __tablename__ = 'movie_rating_histogram'
+
+    movie_id = Column(Integer, ForeignKey('movies.movie_id'),
+                      primary_key=True, autoincrement=False)
+    bucket = Column(Integer, primary_key=True, autoincrement=False)
+    count = Column(Integer, nullable=False)
+
+
+class FavoriteCounts(db.Model):
+    # Maintained by triggers on favorite_movies (migration m0004)
+    __tablename__ = 'movie_favorite_counts'
+    __table_args__ = (
+        Index('ix_movie_favorite_counts_count', 'favorite_count'),
+    )
+
+    movie_id = Column(Integer, ForeignKey('movies.movie_id'),
+                      primary_key=True, autoincrement=False)
+    favorite_count = Column(Integer, nullable=False)
+
+
+class Genre(db.Model):
+    __tablename__ = 'genres'
+    __table_args__ = (
+        Index('ux_genres_name', 'name', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(collation='NOCASE'), nullable=False)
+
+
+class Actor(db.Model):
+    __tablename__ = 'actors'
+    __table_args__ = (
+        Index('ux_actors_name', 'name', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(collation='NOCASE'), nullable=False)
+
+
+class Director(db.Model):
+    __tablename__ = 'directors'
+    __table_args__ = (
+        Index('ux_directors_name', 'name', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(collation='NOCASE'), nullable=False)
+
+
+class MovieGenre(db.Model):
+    # Junction rows; the primary key serves lookups by movie, the index
+    # lookups by genre
+    __tablename__ = 'movie_genres'
+    __table_args__ = (
+        Index('ix_movie_genres_genre_id', 'genre_id', 'movie_id'),
+    )
+
+    movie_id = Column(Integer, ForeignKey('movies.movie_id'),
+                      primary_key=True, autoincrement=False)
+    genre_id = Column(Integer, ForeignKey('genres.id'), primary_key=True,
+                      autoincrement=False)
+
+
+class MovieActor(db.Model):
+    __tablename__ = 'movie_actors'
+    __table_args__ = (
+        Index('ix_movie_actors_actor_id', 'actor_id', 'movie_id'),
+    )
+
+    movie_id = Column(Integer, ForeignKey('movies.movie_id'),
+                      primary_key=True, autoincrement=False)
+    actor_id = Column(Integer, ForeignKey('actors.id'), primary_key=True,
+                      autoincrement=False)
+
+
+class MovieDirector(db.Model):
+    __tablename__ = 'movie_directors'
+    __table_args__ = (
+        Index('ix_movie_directors_director_id', 'director_id', 'movie_id'),
+    )
+
+    movie_id = Column(Integer, ForeignKey('movies.movie_id'),
+                      primary_key=True, autoincrement=False)
+    director_id = Column(Integer, ForeignKey('directors.id'),
+                         primary_key=True, autoincrement=False)
+
+
+@event.listens_for(Movies, 'after_insert')
+def link_movie_facets(mapper, connection, movie):
+    # Every Movies row added through the ORM gets its facet rows in the
+    # same flush; bulk inserts call facet_statements themselves
+    for sql, parameters in facet_statements([(movie.movie_id, {
+            'genre': movie.genre, 'actors': movie.actors,
+            'director': movie.director})]):
+        connection.execute(text(sql), parameters)
+
+
+# The FTS5 search indexes, their sync triggers and the triggers that
+# maintain the aggregates are not ORM models; create_all() builds them
+# with the same DDL as migrations m0003 and m0004
+for statement in SEARCH_SCHEMA + STATS_SCHEMA:
+    event.listen(db.metadata, 'after_create',
+                 DDL(statement).execute_if(dialect='sqlite'))
+
+
+# Tables are created and upgraded by the versioned migrations in
+# data_management/migrations: run 'python migrate.py upgrade' (or let
+# SQLiteDataManager apply them on startup). A schema change here needs a
+# new migration module.
@@ -0,0 +1,97 @@
+import functools
+import random
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+LOCKED_ERRORS = ('database is locked', 'database is busy')
+
+
+class SQLiteProfile:
+    """
+    SQLite performance settings applied to every pooled connection.
+
+    The defaults suit several web workers sharing one database file:
+    WAL lets readers proceed while a writer commits, synchronous=NORMAL
+    is durable across application crashes in WAL mode, and the busy
+    timeout makes writers wait for the lock instead of failing at once.
+    """
+
+    def __init__(self, journal_mode='WAL', synchronous='NORMAL',
+                 cache_size_kib=64 * 1024, mmap_size=256 * 1024 * 1024,
+                 busy_timeout_ms=5000, temp_store='MEMORY'):
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.temp_store = temp_store
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a profile from a dict such as app.config['SQLITE_PROFILE'].
+        Returns None when config is False (tuning disabled).
+        """
+        if config is False:
+            return None
+        if isinstance(config, cls):
+            return config
+        return cls(**(config or {}))
+
+    def pragmas(self):
+        pragmas = [f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}"]
+        if self.journal_mode:
+            pragmas.append(f"PRAGMA journal_mode = {self.journal_mode}")
+        if self.synchronous:
+            pragmas.append(f"PRAGMA synchronous = {self.synchronous}")
+        if self.cache_size_kib:
+            # A negative cache_size is a size in KiB rather than in pages
+            pragmas.append(f"PRAGMA cache_size = -{int(self.cache_size_kib)}")
+        if self.mmap_size is not None:
+            pragmas.append(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        if self.temp_store:
+            pragmas.append(f"PRAGMA temp_store = {self.temp_store}")
+        return pragmas
+
+    def apply(self, dbapi_connection):
+        # Apply the profile to a raw sqlite3 connection
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in self.pragmas():
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    def install(self, engine):
+        # Apply the profile to every connection the engine's pool opens
+        event.listen(engine, 'connect',
+                     lambda dbapi_connection, connection_record:
+                     self.apply(dbapi_connection))
+
+
+def is_locked_error(error):
+    return any(message in str(error) for message in LOCKED_ERRORS)
+
+
+def retry_on_locked(attempts=5, base_delay=0.05, max_delay=1.0):
+    """
+    Retry a database write when SQLite reports the database is locked.
+    The session is rolled back before each retry, and retries back off
+    exponentially with jitter so contending workers spread out.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            from .SQL_Data_Models import db
+            for attempt in range(attempts):
+                try:
+                    return function(*args, **kwargs)
+                except OperationalError as error:
+                    if not is_locked_error(error) or attempt == attempts - 1:
+                        raise
+                    db.session.rollback()
+                    delay = min(max_delay, base_delay * 2 ** attempt)
+                    time.sleep(delay * random.uniform(0.5, 1.5))
+        return wrapper
+    return decorator
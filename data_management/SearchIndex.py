@@ -0,0 +1,94 @@
+import bisect
+import math
+import re
+
+# Words are runs of letters and digits; matching is case-insensitive
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text or '').lower())
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index with weighted fields, used to search the JSON
+    and CSV backends. Every query term matches as a prefix ("matr" finds
+    "matrix"), all terms must match, and documents are ranked by a tf-idf
+    score in which each field counts with its weight.
+    """
+
+    def __init__(self, weights):
+        self.weights = weights
+        self.postings = {}  # term -> {doc_id: weighted term frequency}
+        self.terms = []  # sorted terms, for prefix lookups
+        self.documents = 0
+
+    def add(self, doc_id, fields):
+        self.documents += 1
+        for field, weight in self.weights.items():
+            for term in tokenize(fields.get(field)):
+                postings = self.postings.setdefault(term, {})
+                postings[doc_id] = postings.get(doc_id, 0) + weight
+
+    def finish(self):
+        # Call after the last add(): prepares the term list for searching
+        self.terms = sorted(self.postings)
+        return self
+
+    def _prefix_scores(self, prefix):
+        scores = {}
+        position = bisect.bisect_left(self.terms, prefix)
+        while position < len(self.terms) and \
+                self.terms[position].startswith(prefix):
+            postings = self.postings[self.terms[position]]
+            idf = math.log(1 + self.documents / len(postings))
+            for doc_id, frequency in postings.items():
+                scores[doc_id] = scores.get(doc_id, 0) + frequency * idf
+            position += 1
+        return scores
+
+    def search(self, query, limit=20, offset=0, where=None):
+        """
+        Rank the documents matching every term of query.
+        Args:
+            where (callable): Optional filter applied to doc ids.
+        Returns:
+            tuple: (list of doc ids for the page, next offset or None).
+        """
+        scores = None
+        for term in set(tokenize(query)):
+            term_scores = self._prefix_scores(term)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {doc_id: score + term_scores[doc_id]
+                          for doc_id, score in scores.items()
+                          if doc_id in term_scores}
+            if not scores:
+                return [], None
+        if scores is None:
+            return [], None
+        ranked = sorted((doc_id for doc_id in scores
+                         if where is None or where(doc_id)),
+                        key=lambda doc_id: (-scores[doc_id], str(doc_id)))
+        page = ranked[offset:offset + limit]
+        next_offset = offset + limit if len(ranked) > offset + limit else None
+        return page, next_offset
+
+
+def movies_index(users):
+    # Index every movie of every user; doc ids are (user_id, movie_id)
+    index = InvertedIndex({'name': 10, 'director': 3, 'note': 1})
+    for user_id, user_data in (users or {}).items():
+        for movie_id, movie in user_data.get('movies', {}).items():
+            if movie.get('name'):
+                index.add((user_id, movie_id), movie)
+    return index.finish()
+
+
+def users_index(users):
+    index = InvertedIndex({'name': 2, 'email': 1})
+    for user_id, user_data in (users or {}).items():
+        index.add(user_id, user_data)
+    return index.finish()
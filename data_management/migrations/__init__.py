@@ -0,0 +1,171 @@
+"""
+Versioned schema migrations for the SQLite data model.
+
+Each migration is a module named mNNNN_<description>.py that defines
+upgrade(context) and downgrade(context). The schema version of a database
+is stored in PRAGMA user_version. Migrations run step by step, each step
+in its own short transaction, and data changes on large tables run in
+batches so the application can keep writing while a migration runs.
+
+Run them with migrate.py, or let SQLiteDataManager apply pending upgrades
+on startup.
+"""
+import contextlib
+import importlib
+import pkgutil
+import sqlite3
+import time
+
+# Rows touched per transaction by batched data migrations
+DEFAULT_BATCH_SIZE = 1000
+# How long to wait for a lock held by the application, in milliseconds
+BUSY_TIMEOUT_MS = 30000
+
+
+class MigrationContext:
+    """
+    Connection wrapper handed to migrations.
+    Every execute() is committed on its own, so a migration never holds
+    the write lock for longer than a single statement or batch.
+    """
+
+    def __init__(self, connection, batch_size=DEFAULT_BATCH_SIZE, pause=0.0):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.pause = pause
+        self._in_transaction = False
+
+    def execute(self, sql, parameters=()):
+        cursor = self.connection.execute(sql, parameters)
+        if not self._in_transaction:
+            self.connection.commit()
+        return cursor
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Run the execute() calls of the block in one write transaction,
+        for steps that application writes must not fall in between (e.g.
+        a snapshot of existing rows and the triggers that take over from
+        it). The write lock is taken up front (BEGIN IMMEDIATE) and held
+        until the block ends; an exception rolls the block back.
+        """
+        self.connection.commit()
+        self.connection.execute("BEGIN IMMEDIATE")
+        self._in_transaction = True
+        try:
+            yield self
+        except BaseException:
+            self.connection.rollback()
+            raise
+        else:
+            self.connection.commit()
+        finally:
+            self._in_transaction = False
+
+    def query(self, sql, parameters=()):
+        return self.connection.execute(sql, parameters).fetchall()
+
+    def table_exists(self, table):
+        return bool(self.query("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                               "AND name = ?", (table,)))
+
+    def columns(self, table):
+        return {row[1] for row in self.query(f"PRAGMA table_info({table})")}
+
+    def add_column(self, table, column, definition):
+        if column not in self.columns(table):
+            self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def drop_column(self, table, column):
+        if column in self.columns(table):
+            self.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+
+    def run_in_batches(self, table, sql, key='rowid'):
+        """
+        Run a data change over a table in windows of batch_size keys.
+        The statement receives the window as :low and :high parameters
+        (low <= key < high) and is committed after every window.
+        Returns:
+            int: Number of rows changed.
+        """
+        low, high = self.query(f"SELECT MIN({key}), MAX({key}) FROM {table}")[0]
+        if low is None:
+            return 0
+        changed = 0
+        while low <= high:
+            cursor = self.execute(sql, {'low': low, 'high': low + self.batch_size})
+            changed += max(cursor.rowcount, 0)
+            low += self.batch_size
+            if self.pause:
+                # Let application writers in between batches
+                time.sleep(self.pause)
+        return changed
+
+
+def load_migrations():
+    # Discover mNNNN_*.py modules in version order
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        name = module_info.name
+        if name.startswith('m') and name[1:5].isdigit():
+            module = importlib.import_module(f'{__name__}.{name}')
+            migrations.append((int(name[1:5]), name, module))
+    return sorted(migrations)
+
+
+def latest_version():
+    migrations = load_migrations()
+    return migrations[-1][0] if migrations else 0
+
+
+def current_version(connection):
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def set_version(connection, version):
+    connection.execute(f"PRAGMA user_version = {int(version)}")
+    connection.commit()
+
+
+def connect(db_file_name):
+    connection = sqlite3.connect(db_file_name, timeout=BUSY_TIMEOUT_MS / 1000)
+    connection.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    return connection
+
+
+def upgrade(connection, target=None, batch_size=DEFAULT_BATCH_SIZE, pause=0.0,
+            log=print):
+    """
+    Apply pending migrations up to the target version (default: latest).
+    Returns:
+        int: The schema version after the upgrade.
+    """
+    context = MigrationContext(connection, batch_size, pause)
+    version = current_version(connection)
+    for migration_version, name, module in load_migrations():
+        if version < migration_version and (target is None
+                                            or migration_version <= target):
+            log(f"Applying {name}")
+            module.upgrade(context)
+            set_version(connection, migration_version)
+            version = migration_version
+    return version
+
+
+def downgrade(connection, target, batch_size=DEFAULT_BATCH_SIZE, pause=0.0,
+              log=print):
+    """
+    Revert applied migrations down to the target version.
+    Returns:
+        int: The schema version after the downgrade.
+    """
+    context = MigrationContext(connection, batch_size, pause)
+    version = current_version(connection)
+    for migration_version, name, module in reversed(load_migrations()):
+        if target < migration_version <= version:
+            log(f"Reverting {name}")
+            module.downgrade(context)
+            set_version(connection, migration_version - 1)
+            version = migration_version - 1
+    return version
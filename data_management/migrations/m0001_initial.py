@@ -0,0 +1,64 @@
+"""
+Initial schema: users, movies, favorite_movies and reviews.
+Databases created before migrations existed already have these tables,
+so every statement is a no-op for them.
+"""
+
+TABLES = {
+    'users': """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER NOT NULL,
+            name VARCHAR NOT NULL,
+            email VARCHAR NOT NULL,
+            password VARCHAR NOT NULL,
+            PRIMARY KEY (id)
+        )""",
+    'movies': """
+        CREATE TABLE IF NOT EXISTS movies (
+            movie_id INTEGER NOT NULL,
+            title VARCHAR NOT NULL,
+            year INTEGER NOT NULL,
+            rating FLOAT NOT NULL,
+            genre VARCHAR NOT NULL,
+            director VARCHAR NOT NULL,
+            writer VARCHAR NOT NULL,
+            actors VARCHAR NOT NULL,
+            plot VARCHAR NOT NULL,
+            language VARCHAR NOT NULL,
+            country VARCHAR NOT NULL,
+            poster VARCHAR NOT NULL,
+            _type VARCHAR NOT NULL,
+            PRIMARY KEY (movie_id)
+        )""",
+    'favorite_movies': """
+        CREATE TABLE IF NOT EXISTS favorite_movies (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            movie_id INTEGER NOT NULL,
+            note VARCHAR NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES users (id),
+            FOREIGN KEY(movie_id) REFERENCES movies (movie_id)
+        )""",
+    'reviews': """
+        CREATE TABLE IF NOT EXISTS reviews (
+            review_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            movie_id INTEGER NOT NULL,
+            review_text TEXT,
+            rating FLOAT,
+            PRIMARY KEY (review_id),
+            FOREIGN KEY(user_id) REFERENCES users (id),
+            FOREIGN KEY(movie_id) REFERENCES movies (movie_id)
+        )""",
+}
+
+
+def upgrade(context):
+    for statement in TABLES.values():
+        context.execute(statement)
+
+
+def downgrade(context):
+    for table in reversed(list(TABLES)):
+        context.execute(f"DROP TABLE IF EXISTS {table}")
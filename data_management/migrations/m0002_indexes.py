@@ -0,0 +1,51 @@
+"""
+Secondary indexes and unique constraints: users.email (unique),
+movies.title, movies.imdb_id (new column, unique),
+favorite_movies(user_id, movie_id) (unique) and reviews(movie_id).
+"""
+
+INDEXES = {
+    'ix_users_email': 'CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email '
+                      'ON users (email)',
+    'ix_movies_title': 'CREATE INDEX IF NOT EXISTS ix_movies_title '
+                       'ON movies (title)',
+    'ix_movies_imdb_id': 'CREATE UNIQUE INDEX IF NOT EXISTS ix_movies_imdb_id '
+                         'ON movies (imdb_id)',
+    'ux_favorite_movies_user_movie':
+        'CREATE UNIQUE INDEX IF NOT EXISTS ux_favorite_movies_user_movie '
+        'ON favorite_movies (user_id, movie_id)',
+    'ix_reviews_movie_id': 'CREATE INDEX IF NOT EXISTS ix_reviews_movie_id '
+                           'ON reviews (movie_id)',
+}
+
+
+def upgrade(context):
+    context.add_column('movies', 'imdb_id', 'VARCHAR')
+
+    duplicate_emails = [row[0] for row in context.query(
+        "SELECT email FROM users GROUP BY email HAVING COUNT(*) > 1")]
+    if duplicate_emails:
+        raise ValueError("Cannot create unique index on users.email, "
+                         f"duplicate emails: {', '.join(duplicate_emails)}")
+
+    # Remove duplicate favorites in batches, keeping the oldest row. The
+    # helper index makes each batch an index lookup instead of a scan.
+    context.execute("CREATE INDEX IF NOT EXISTS tmp_favorite_movies_user_movie "
+                    "ON favorite_movies (user_id, movie_id, id)")
+    context.run_in_batches('favorite_movies', """
+        DELETE FROM favorite_movies
+        WHERE id >= :low AND id < :high
+          AND EXISTS (SELECT 1 FROM favorite_movies AS older
+                      WHERE older.user_id = favorite_movies.user_id
+                        AND older.movie_id = favorite_movies.movie_id
+                        AND older.id < favorite_movies.id)""", key='id')
+
+    for statement in INDEXES.values():
+        context.execute(statement)
+    context.execute("DROP INDEX IF EXISTS tmp_favorite_movies_user_movie")
+
+
+def downgrade(context):
+    for name in INDEXES:
+        context.execute(f"DROP INDEX IF EXISTS {name}")
+    context.drop_column('movies', 'imdb_id')
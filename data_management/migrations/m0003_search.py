@@ -0,0 +1,60 @@
+"""
+Full-text search: FTS5 indexes over movies (title, director, actors,
+genre, plot), users (name, email) and reviews (review text).
+
+The indexes are external-content tables that store only the index, and
+triggers keep them in sync with every insert, update and delete on the
+source tables, whichever code path writes them.
+"""
+
+# fts table -> (source table, key column, indexed columns)
+SEARCH_INDEXES = {
+    'movies_fts': ('movies', 'movie_id',
+                   ('title', 'director', 'actors', 'genre', 'plot')),
+    'users_fts': ('users', 'id', ('name', 'email')),
+    'reviews_fts': ('reviews', 'review_id', ('review_text',)),
+}
+
+
+def search_index_schema(fts_table, table, key, columns):
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    insert = (f"INSERT INTO {fts_table} (rowid, {column_list}) "
+              f"VALUES (new.{key}, {new_values});")
+    delete = (f"INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) "
+              f"VALUES ('delete', old.{key}, {old_values});")
+    return [
+        # prefix='2 3' adds prefix indexes so "tit*" queries stay fast
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"{column_list}, content='{table}', content_rowid='{key}', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_insert AFTER INSERT "
+        f"ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_delete AFTER DELETE "
+        f"ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_update AFTER UPDATE "
+        f"OF {column_list} ON {table} BEGIN {delete} {insert} END",
+    ]
+
+
+SEARCH_SCHEMA = [statement
+                 for fts_table, (table, key, columns) in SEARCH_INDEXES.items()
+                 for statement in search_index_schema(fts_table, table, key,
+                                                      columns)]
+
+
+def upgrade(context):
+    for statement in SEARCH_SCHEMA:
+        context.execute(statement)
+    # Index the rows that already exist
+    for fts_table in SEARCH_INDEXES:
+        context.execute(f"INSERT INTO {fts_table} ({fts_table}) "
+                        f"VALUES ('rebuild')")
+
+
+def downgrade(context):
+    for fts_table in SEARCH_INDEXES:
+        for trigger in ('insert', 'delete', 'update'):
+            context.execute(f"DROP TRIGGER IF EXISTS {fts_table}_{trigger}")
+        context.execute(f"DROP TABLE IF EXISTS {fts_table}")
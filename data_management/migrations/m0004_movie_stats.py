@@ -0,0 +1,165 @@
+"""
+Materialized per-movie aggregates: rating count, sum, average and
+histogram (movie_rating_stats, movie_rating_histogram) and favorite
+counts (movie_favorite_counts), for leaderboards that read only these rows.
+
+Triggers on reviews and favorite_movies update the aggregates
+incrementally in the transaction of the write, whichever code path
+writes them; existing rows are aggregated once on upgrade, in the
+transaction that creates the triggers.
+"""
+
+STATS_TABLES = {
+    'movie_rating_stats': """
+        CREATE TABLE IF NOT EXISTS movie_rating_stats (
+            movie_id INTEGER NOT NULL,
+            rating_count INTEGER NOT NULL,
+            rating_sum FLOAT NOT NULL,
+            average_rating FLOAT NOT NULL,
+            PRIMARY KEY (movie_id),
+            FOREIGN KEY(movie_id) REFERENCES movies (movie_id)
+        )""",
+    'movie_rating_histogram': """
+        CREATE TABLE IF NOT EXISTS movie_rating_histogram (
+            movie_id INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (movie_id, bucket),
+            FOREIGN KEY(movie_id) REFERENCES movies (movie_id)
+        )""",
+    'movie_favorite_counts': """
+        CREATE TABLE IF NOT EXISTS movie_favorite_counts (
+            movie_id INTEGER NOT NULL,
+            favorite_count INTEGER NOT NULL,
+            PRIMARY KEY (movie_id),
+            FOREIGN KEY(movie_id) REFERENCES movies (movie_id)
+        )""",
+}
+
+STATS_INDEXES = {
+    'ix_movie_rating_stats_average':
+        'CREATE INDEX IF NOT EXISTS ix_movie_rating_stats_average '
+        'ON movie_rating_stats (average_rating, rating_count)',
+    'ix_movie_favorite_counts_count':
+        'CREATE INDEX IF NOT EXISTS ix_movie_favorite_counts_count '
+        'ON movie_favorite_counts (favorite_count)',
+}
+
+
+def rating_bucket(rating):
+    # Histogram bucket of a rating: its integer part, clamped to 0..10
+    return f"MIN(MAX(CAST({rating} AS INTEGER), 0), 10)"
+
+
+def add_rating(row):
+    return (
+        f"INSERT INTO movie_rating_stats "
+        f"(movie_id, rating_count, rating_sum, average_rating) "
+        f"SELECT {row}.movie_id, 1, {row}.rating, {row}.rating "
+        f"WHERE {row}.rating IS NOT NULL "
+        f"ON CONFLICT (movie_id) DO UPDATE SET "
+        f"rating_count = rating_count + 1, "
+        f"rating_sum = rating_sum + excluded.rating_sum, "
+        f"average_rating = (rating_sum + excluded.rating_sum) "
+        f"/ (rating_count + 1); "
+        f"INSERT INTO movie_rating_histogram (movie_id, bucket, count) "
+        f"SELECT {row}.movie_id, {rating_bucket(f'{row}.rating')}, 1 "
+        f"WHERE {row}.rating IS NOT NULL "
+        f"ON CONFLICT (movie_id, bucket) DO UPDATE SET count = count + 1;")
+
+
+def remove_rating(row):
+    return (
+        f"UPDATE movie_rating_stats SET "
+        f"rating_count = rating_count - 1, "
+        f"rating_sum = rating_sum - {row}.rating, "
+        f"average_rating = CASE WHEN rating_count > 1 "
+        f"THEN (rating_sum - {row}.rating) / (rating_count - 1) ELSE 0 END "
+        f"WHERE movie_id = {row}.movie_id AND {row}.rating IS NOT NULL; "
+        f"DELETE FROM movie_rating_stats "
+        f"WHERE movie_id = {row}.movie_id AND rating_count <= 0; "
+        f"UPDATE movie_rating_histogram SET count = count - 1 "
+        f"WHERE movie_id = {row}.movie_id "
+        f"AND bucket = {rating_bucket(f'{row}.rating')} "
+        f"AND {row}.rating IS NOT NULL; "
+        f"DELETE FROM movie_rating_histogram "
+        f"WHERE movie_id = {row}.movie_id AND count <= 0;")
+
+
+def add_favorite(row):
+    return (
+        f"INSERT INTO movie_favorite_counts (movie_id, favorite_count) "
+        f"VALUES ({row}.movie_id, 1) "
+        f"ON CONFLICT (movie_id) DO UPDATE SET "
+        f"favorite_count = favorite_count + 1;")
+
+
+def remove_favorite(row):
+    return (
+        f"UPDATE movie_favorite_counts SET favorite_count = favorite_count - 1 "
+        f"WHERE movie_id = {row}.movie_id; "
+        f"DELETE FROM movie_favorite_counts "
+        f"WHERE movie_id = {row}.movie_id AND favorite_count <= 0;")
+
+
+def stats_triggers(name, table, columns, add, remove):
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {name}_insert AFTER INSERT "
+        f"ON {table} BEGIN {add('new')} END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_delete AFTER DELETE "
+        f"ON {table} BEGIN {remove('old')} END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_update AFTER UPDATE "
+        f"OF {columns} ON {table} BEGIN {remove('old')} {add('new')} END",
+    ]
+
+
+# trigger name prefix -> trigger statements
+STATS_TRIGGERS = {
+    'movie_rating_stats': stats_triggers('movie_rating_stats', 'reviews',
+                                         'movie_id, rating', add_rating,
+                                         remove_rating),
+    'movie_favorite_counts': stats_triggers('movie_favorite_counts',
+                                            'favorite_movies', 'movie_id',
+                                            add_favorite, remove_favorite),
+}
+
+STATS_SCHEMA = [statement for triggers in STATS_TRIGGERS.values()
+                for statement in triggers]
+
+
+def upgrade(context):
+    for statement in STATS_TABLES.values():
+        context.execute(statement)
+    for statement in STATS_INDEXES.values():
+        context.execute(statement)
+
+    # Aggregate the rows that already exist and hand over to the triggers
+    # in one write transaction, so no review or favorite written meanwhile
+    # is counted twice or missed
+    with context.transaction():
+        for statement in STATS_SCHEMA:
+            context.execute(statement)
+        for table in STATS_TABLES:
+            context.execute(f"DELETE FROM {table}")
+        context.execute("""
+            INSERT INTO movie_rating_stats
+                (movie_id, rating_count, rating_sum, average_rating)
+            SELECT movie_id, COUNT(rating), SUM(rating), AVG(rating)
+            FROM reviews WHERE rating IS NOT NULL GROUP BY movie_id""")
+        context.execute(f"""
+            INSERT INTO movie_rating_histogram (movie_id, bucket, count)
+            SELECT movie_id, {rating_bucket('rating')} AS bucket, COUNT(*)
+            FROM reviews WHERE rating IS NOT NULL GROUP BY movie_id, bucket""")
+        context.execute("""
+            INSERT INTO movie_favorite_counts (movie_id, favorite_count)
+            SELECT movie_id, COUNT(*) FROM favorite_movies GROUP BY movie_id""")
+
+
+def downgrade(context):
+    for name in STATS_TRIGGERS:
+        for trigger in ('insert', 'delete', 'update'):
+            context.execute(f"DROP TRIGGER IF EXISTS {name}_{trigger}")
+    for name in STATS_INDEXES:
+        context.execute(f"DROP INDEX IF EXISTS {name}")
+    for table in STATS_TABLES:
+        context.execute(f"DROP TABLE IF EXISTS {table}")
@@ -0,0 +1,73 @@
+"""
+Normalized movie facets and typed movie columns: genres, actors and
+directors tables with movie_genres, movie_actors and movie_directors
+junction tables, and release_year, end_year and imdb_rating columns on
+movies parsed from OMDb's year and rating strings.
+
+Existing movies are parsed and linked in batches on upgrade
+(MovieFacets.backfill).
+"""
+from ..MovieFacets import backfill
+
+# facet table -> (junction table, junction key)
+FACET_TABLES = {
+    'genres': ('movie_genres', 'genre_id'),
+    'actors': ('movie_actors', 'actor_id'),
+    'directors': ('movie_directors', 'director_id'),
+}
+
+# column -> definition
+TYPED_COLUMNS = {
+    'release_year': 'INTEGER',
+    'end_year': 'INTEGER',
+    'imdb_rating': 'FLOAT',
+}
+
+MOVIE_INDEXES = {
+    'ix_movies_release_year': 'CREATE INDEX IF NOT EXISTS '
+                              'ix_movies_release_year ON movies (release_year)',
+    'ix_movies_imdb_rating': 'CREATE INDEX IF NOT EXISTS '
+                             'ix_movies_imdb_rating ON movies (imdb_rating)',
+}
+
+
+def facet_schema(table, junction, key):
+    return [
+        f"""CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER NOT NULL,
+            name VARCHAR COLLATE NOCASE NOT NULL,
+            PRIMARY KEY (id)
+        )""",
+        f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{table}_name ON {table} (name)",
+        f"""CREATE TABLE IF NOT EXISTS {junction} (
+            movie_id INTEGER NOT NULL,
+            {key} INTEGER NOT NULL,
+            PRIMARY KEY (movie_id, {key}),
+            FOREIGN KEY(movie_id) REFERENCES movies (movie_id),
+            FOREIGN KEY({key}) REFERENCES {table} (id)
+        )""",
+        # The primary key serves lookups by movie, this one by facet
+        f"CREATE INDEX IF NOT EXISTS ix_{junction}_{key} "
+        f"ON {junction} ({key}, movie_id)",
+    ]
+
+
+def upgrade(context):
+    for column, definition in TYPED_COLUMNS.items():
+        context.add_column('movies', column, definition)
+    for statement in MOVIE_INDEXES.values():
+        context.execute(statement)
+    for table, (junction, key) in FACET_TABLES.items():
+        for statement in facet_schema(table, junction, key):
+            context.execute(statement)
+    backfill(context.connection, context.batch_size, context.pause)
+
+
+def downgrade(context):
+    for table, (junction, key) in FACET_TABLES.items():
+        context.execute(f"DROP TABLE IF EXISTS {junction}")
+        context.execute(f"DROP TABLE IF EXISTS {table}")
+    for name in MOVIE_INDEXES:
+        context.execute(f"DROP INDEX IF EXISTS {name}")
+    for column in TYPED_COLUMNS:
+        context.drop_column('movies', column)
@@ -0,0 +1,57 @@
+"""
+Bulk import movies into a user's collection (SQLite data model).
+
+Titles can be given on the command line and/or read from a CSV, JSON or
+plain-text file. OMDb lookups run concurrently and all rows are written in
+one transaction. A per-title report is printed at the end.
+
+Usage:
+    python import_movies.py 1 "The Matrix" "Gladiator"
+    python import_movies.py 1 --file watchlist.csv --workers 8
+"""
+import argparse
+import json
+import sys
+from data_management.BulkImport import parse_titles
+from data_management.SQLDataManager import bulk_add_movies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('user_id', type=int)
+    parser.add_argument('titles', nargs='*', help='movie titles')
+    parser.add_argument('--file', help='CSV, JSON or text file of titles')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='concurrent OMDb lookups (default: 8)')
+    parser.add_argument('--json', action='store_true',
+                        help='print the report as JSON')
+    args = parser.parse_args()
+
+    titles = list(args.titles)
+    if args.file:
+        with open(args.file, 'r') as file:
+            try:
+                titles.extend(parse_titles(file.read(), args.file))
+            except ValueError as error:
+                parser.error(f"invalid import file: {error}")
+    if not titles:
+        parser.error('no titles given')
+
+    from app import app
+    with app.app_context():
+        results = bulk_add_movies(args.user_id, titles, args.workers)
+
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        for result in results:
+            line = f"{result['status']:>22}  {result['title']}"
+            if result.get('error'):
+                line += f"  ({result['error']})"
+            print(line)
+    failed = sum(result['status'] == 'error' for result in results)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
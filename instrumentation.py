@@ -0,0 +1,432 @@
+"""
+Opt-in instrumentation for the Flask app.
+
+When enabled (MOVIWEB_METRICS=1, or app.config['METRICS_ENABLED']), it
+records:
+    - request duration per route, method and status
+    - duration of every data manager call, per backend and method
+    - SQL statement counts and durations (SQLAlchemy engine events)
+    - outbound OMDb request latency
+    - Jinja template render time
+    - password hashing/checking time and JSON/CSV file parsing time
+and exposes them at /metrics in the Prometheus text format. Each response
+also gets a Server-Timing header with the request's own breakdown.
+
+Sampled request profiles: set MOVIWEB_PROFILE_SAMPLE_RATE (0..1). A sampled
+request runs under cProfile and is dumped to MOVIWEB_PROFILE_DIR as
+<name>.prof (open with pstats or snakeviz) next to <name>.json with its
+timings; only the newest MOVIWEB_PROFILE_MAX_DUMPS (default 100) are kept.
+
+The rate can be changed at runtime with POST /debug/profile?sample_rate=0.05.
+That route is only registered when MOVIWEB_PROFILE_ENDPOINT=1 (or
+app.config['PROFILE_ENDPOINT']), and it requires the admin token in
+MOVIWEB_PROFILE_TOKEN (app.config['PROFILE_TOKEN']) as an
+"Authorization: Bearer <token>" header.
+"""
+import cProfile
+import functools
+import hmac
+import json
+import os
+import random
+import re
+import threading
+import time
+from flask import Response, before_render_template, g, has_app_context, \
+    jsonify, request, template_rendered
+
+# Histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+PROFILE_DIR = os.environ.get('MOVIWEB_PROFILE_DIR', 'profiles')
+# Profiles kept in PROFILE_DIR; the oldest are deleted first
+DEFAULT_PROFILE_MAX_DUMPS = 100
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n') \
+        .replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"'
+                          for name, value in labels) + '}'
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters, gauges and histograms keyed by name and labels,
+    rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.help = {}
+        self.counters = {}  # (name, labels) -> value
+        self.gauges = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, text):
+        self.help[name] = (kind, text)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted((label, str(value))
+                                  for label, value in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted((label, str(value))
+                                  for label, value in labels.items())))
+        with self._lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted((label, str(value))
+                                  for label, value in labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = [[0] * len(self.buckets), 0.0, 0]
+                self.histograms[key] = histogram
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted((key, (list(buckets), total, count))
+                                for key, (buckets, total, count)
+                                in self.histograms.items())
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                text = self.help.get(name, (kind, name))[1]
+                lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f'{name}{format_labels(labels)} {value}')
+        for (name, labels), value in gauges:
+            header(name, 'gauge')
+            lines.append(f'{name}{format_labels(labels)} {value}')
+        for (name, labels), (buckets, total, count) in histograms:
+            header(name, 'histogram')
+            for bound, bucket_count in zip(self.buckets, buckets):
+                bucket_labels = labels + (('le', bound),)
+                lines.append(f'{name}_bucket{format_labels(bucket_labels)} '
+                             f'{bucket_count}')
+            infinity_labels = labels + (('le', '+Inf'),)
+            lines.append(f'{name}_bucket{format_labels(infinity_labels)} '
+                         f'{count}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+metrics.describe('moviweb_http_request_duration_seconds', 'histogram',
+                 'Time spent handling requests.')
+metrics.describe('moviweb_data_manager_call_duration_seconds', 'histogram',
+                 'Time spent in data manager methods.')
+metrics.describe('moviweb_sql_statements_total', 'counter',
+                 'SQL statements executed.')
+metrics.describe('moviweb_sql_statement_duration_seconds', 'histogram',
+                 'Time spent executing SQL statements.')
+metrics.describe('moviweb_omdb_request_duration_seconds', 'histogram',
+                 'Latency of outbound OMDb requests.')
+metrics.describe('moviweb_template_render_duration_seconds', 'histogram',
+                 'Time spent rendering Jinja templates.')
+metrics.describe('moviweb_operation_duration_seconds', 'histogram',
+                 'Time spent in other hot paths (password hashing, '
+                 'file parsing).')
+
+
+def record(component, seconds):
+    # Add time to the current request's breakdown (Server-Timing, profiles)
+    if has_app_context() and 'request_timings' in g:
+        timings = g.request_timings
+        total, count = timings.get(component, (0.0, 0))
+        timings[component] = (total + seconds, count + 1)
+
+
+def timed(operation, component=None):
+    """
+    Decorator recording a function's duration as an operation metric.
+    Costs one flag check while instrumentation is disabled.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                metrics.observe('moviweb_operation_duration_seconds',
+                                elapsed, operation=operation)
+                record(component or operation, elapsed)
+        return wrapper
+    return decorator
+
+
+class InstrumentedDataManager:
+    """
+    Wraps a data manager and times every public method call.
+    """
+
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+        self.backend = type(data_manager).__name__
+
+    def __getattr__(self, name):
+        attribute = getattr(self.data_manager, name)
+        if name.startswith('_') or not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                metrics.observe('moviweb_data_manager_call_duration_seconds',
+                                elapsed, backend=self.backend, method=name)
+                record('data', elapsed)
+        return wrapper
+
+
+SQL_OPERATION = re.compile(r'\s*(\w+)')
+
+
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.profile_dir = PROFILE_DIR
+        self.profile_max_dumps = DEFAULT_PROFILE_MAX_DUMPS
+        self.profile_token = None
+        self._engines = set()
+        self._parsing_wrapped = False
+
+    def init_app(self, app, data_manager=None, enabled=None):
+        """
+        Install the instrumentation on app when enabled.
+        Returns:
+            The data manager to use: wrapped for timing when enabled.
+        """
+        if enabled is None:
+            enabled = app.config.get(
+                'METRICS_ENABLED',
+                os.environ.get('MOVIWEB_METRICS', '') not in ('', '0'))
+        if not enabled:
+            return data_manager
+        self.enabled = True
+        self.sample_rate = float(app.config.get(
+            'PROFILE_SAMPLE_RATE',
+            os.environ.get('MOVIWEB_PROFILE_SAMPLE_RATE', 0)))
+        self.profile_dir = app.config.get('PROFILE_DIR', self.profile_dir)
+        self.profile_max_dumps = int(app.config.get(
+            'PROFILE_MAX_DUMPS',
+            os.environ.get('MOVIWEB_PROFILE_MAX_DUMPS',
+                           DEFAULT_PROFILE_MAX_DUMPS)))
+        profile_endpoint = app.config.get(
+            'PROFILE_ENDPOINT',
+            os.environ.get('MOVIWEB_PROFILE_ENDPOINT', '') not in ('', '0'))
+        self.profile_token = app.config.get(
+            'PROFILE_TOKEN', os.environ.get('MOVIWEB_PROFILE_TOKEN')) or None
+        if profile_endpoint and self.profile_token is None:
+            raise ValueError("The profile endpoint needs an admin token: "
+                             "set MOVIWEB_PROFILE_TOKEN")
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        if profile_endpoint:
+            app.add_url_rule('/debug/profile', 'debug_profile',
+                             self.profile_view, methods=['GET', 'POST'])
+        self._instrument_sql(app)
+        self._instrument_omdb()
+        self._instrument_parsing()
+        if data_manager is not None:
+            return InstrumentedDataManager(data_manager)
+        return data_manager
+
+    def _instrument_sql(self, app):
+        from sqlalchemy import event
+        from data_management.SQL_Data_Models import db
+        if 'sqlalchemy' not in app.extensions:
+            return
+        with app.app_context():
+            engine = db.engine
+        if engine in self._engines:
+            return
+        self._engines.add(engine)
+
+        def before_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+            conn.info.setdefault('query_start', []).append(
+                time.perf_counter())
+
+        def after_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+            elapsed = time.perf_counter() - conn.info['query_start'].pop()
+            match = SQL_OPERATION.match(statement)
+            operation = match.group(1).upper() if match else 'OTHER'
+            metrics.inc('moviweb_sql_statements_total', operation=operation)
+            metrics.observe('moviweb_sql_statement_duration_seconds', elapsed,
+                            operation=operation)
+            record('sql', elapsed)
+
+        event.listen(engine, 'before_cursor_execute', before_execute)
+        event.listen(engine, 'after_cursor_execute', after_execute)
+
+    def _instrument_omdb(self):
+        from data_management.OMDbClient import omdb_client
+        hooks = omdb_client.session.hooks['response']
+        if self._on_omdb_response not in hooks:
+            hooks.append(self._on_omdb_response)
+
+    def _on_omdb_response(self, response, *args, **kwargs):
+        # elapsed: from sending the request until the headers arrived
+        elapsed = response.elapsed.total_seconds()
+        metrics.observe('moviweb_omdb_request_duration_seconds', elapsed,
+                        status=response.status_code)
+        record('omdb', elapsed)
+
+    def _instrument_parsing(self):
+        # The managers call these module functions by name, so wrapping
+        # them in place times every full read of a JSON or CSV file
+        from data_management import CSVDataManager, JSONDataManager
+        if self._parsing_wrapped:
+            return
+        JSONDataManager.read_json_file = timed('read_json_file', 'parse')(
+            JSONDataManager.read_json_file)
+        CSVDataManager.read_csv_file = timed('read_csv_file', 'parse')(
+            CSVDataManager.read_csv_file)
+        self._parsing_wrapped = True
+
+    def _before_request(self):
+        g.request_timings = {}
+        g.request_start = time.perf_counter()
+        g.profiler = None
+        if self.sample_rate and random.random() < self.sample_rate:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    def _after_request(self, response):
+        if 'request_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('moviweb_http_request_duration_seconds', elapsed,
+                        route=route, method=request.method,
+                        status=response.status_code)
+        timings = dict(g.request_timings, total=(elapsed, 1))
+        response.headers['Server-Timing'] = ', '.join(
+            f'{component};dur={total * 1000:.2f}'
+            for component, (total, _) in timings.items())
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            self._dump_profile(profiler, route, response.status_code,
+                               timings)
+        return response
+
+    def _teardown_request(self, error):
+        # A view that raised skips _after_request when the exception
+        # propagates: stop its profiler so it does not outlive the request
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+    def _dump_profile(self, profiler, route, status, timings):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        slug = re.sub(r'[^\w]+', '_', route).strip('_') or 'root'
+        name = os.path.join(self.profile_dir,
+                            f'{time.strftime("%Y%m%d-%H%M%S")}-'
+                            f'{time.time_ns() % 1000000:06d}-{slug}')
+        profiler.dump_stats(name + '.prof')
+        with open(name + '.json', 'w') as file:
+            json.dump({'path': request.full_path, 'route': route,
+                       'method': request.method, 'status': status,
+                       'timings_ms': {component: {'total': total * 1000,
+                                                  'count': count}
+                                      for component, (total, count)
+                                      in timings.items()}},
+                      file, indent=4)
+        self._rotate_profiles()
+
+    def _rotate_profiles(self):
+        # Delete the oldest dumps beyond profile_max_dumps
+        dumps = []
+        for entry in os.scandir(self.profile_dir):
+            if entry.name.endswith('.prof'):
+                try:
+                    dumps.append((entry.stat().st_mtime_ns,
+                                  entry.name[:-len('.prof')]))
+                except FileNotFoundError:
+                    pass
+        dumps.sort()
+        for _, name in dumps[:max(len(dumps) - self.profile_max_dumps, 0)]:
+            for extension in ('.prof', '.json'):
+                try:
+                    os.unlink(os.path.join(self.profile_dir, name + extension))
+                except FileNotFoundError:
+                    # Deleted by another worker
+                    pass
+
+    def _before_render(self, sender, template, context, **extra):
+        g.setdefault('render_starts', []).append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        starts = g.get('render_starts')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        metrics.observe('moviweb_template_render_duration_seconds', elapsed,
+                        template=template.name)
+        record('template', elapsed)
+
+    def metrics_view(self):
+        return Response(metrics.render(),
+                        mimetype='text/plain; version=0.0.4')
+
+    def profile_view(self):
+        # GET shows the sample rate; POST ?sample_rate=<0..1> changes it
+        authorization = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(authorization.encode('utf-8'),
+                                   f'Bearer {self.profile_token}'
+                                   .encode('utf-8')):
+            return jsonify({"message": "Admin token required."}), 401
+        if request.method == 'POST':
+            try:
+                sample_rate = float(request.values['sample_rate'])
+            except (KeyError, ValueError):
+                return jsonify({"message": "sample_rate must be a number "
+                                           "between 0 and 1."}), 400
+            self.sample_rate = max(0.0, min(sample_rate, 1.0))
+        return jsonify({"sample_rate": self.sample_rate,
+                        "profile_dir": os.path.abspath(self.profile_dir)})
+
+
+# Shared by the app, the data managers and the decorators above
+instrumentation = Instrumentation()
@@ -0,0 +1,75 @@
+"""
+Schema migrations for the SQLite database.
+
+Usage:
+    python migrate.py status
+    python migrate.py upgrade [--to VERSION]
+    python migrate.py downgrade --to VERSION
+    python migrate.py backfill
+    python migrate.py --db path/to/file.sqlite upgrade --batch-size 500 --pause 0.05
+
+Data changes run in batches of --batch-size rows, each committed on its own,
+with an optional --pause (seconds) between batches so the running
+application can keep writing. backfill re-parses every movie's year,
+rating, genres, actors and directors into the typed columns and facet
+tables (migration m0005 runs it once on upgrade).
+"""
+import argparse
+import os
+import sys
+from data_management import migrations
+from data_management.MovieFacets import backfill
+
+DEFAULT_DB = os.path.abspath('user_data/user_movies.sqlite')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite schema migrations.')
+    parser.add_argument('--db', default=DEFAULT_DB,
+                        help=f'database file (default: {DEFAULT_DB})')
+    parser.add_argument('--batch-size', type=int,
+                        default=migrations.DEFAULT_BATCH_SIZE)
+    parser.add_argument('--pause', type=float, default=0.0,
+                        help='seconds to sleep between batches')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='show the schema version')
+    upgrade_parser = subparsers.add_parser('upgrade', help='apply migrations')
+    upgrade_parser.add_argument('--to', type=int, default=None,
+                                help='target version (default: latest)')
+    downgrade_parser = subparsers.add_parser('downgrade',
+                                             help='revert migrations')
+    downgrade_parser.add_argument('--to', type=int, required=True,
+                                  help='target version')
+    subparsers.add_parser('backfill', help='re-parse movie facets')
+    args = parser.parse_args()
+
+    connection = migrations.connect(args.db)
+    try:
+        if args.command == 'status':
+            version = migrations.current_version(connection)
+            print(f"{args.db}: version {version} "
+                  f"(latest {migrations.latest_version()})")
+            for migration_version, name, _ in migrations.load_migrations():
+                state = 'applied' if migration_version <= version else 'pending'
+                print(f"  {name}: {state}")
+        elif args.command == 'upgrade':
+            version = migrations.upgrade(connection, args.to, args.batch_size,
+                                         args.pause)
+            print(f"{args.db}: now at version {version}")
+        elif args.command == 'backfill':
+            count = backfill(connection, args.batch_size, args.pause)
+            print(f"{args.db}: {count} movies parsed and linked")
+        else:
+            version = migrations.downgrade(connection, args.to,
+                                           args.batch_size, args.pause)
+            print(f"{args.db}: now at version {version}")
+    except ValueError as error:
+        print(f"Migration failed: {error}")
+        return 1
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
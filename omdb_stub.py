@@ -0,0 +1,136 @@
+"""
+Local stub of the OMDb API for tests and benchmarks.
+
+Serves canned movies over HTTP on localhost, optionally with an artificial
+delay, and counts how many upstream requests were made per title.
+
+Usage:
+    server = OMDbStubServer(delay=0.1)
+    server.start()
+    client = OMDbClient(base_url=server.url)
+    ...
+    server.stop()
+"""
+import json
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+NOT_FOUND = {"Response": "False", "Error": "Movie not found!"}
+
+
+def make_movie(title, **fields):
+    movie = {
+        "Title": title,
+        "Year": "2000",
+        "imdbRating": "7.0",
+        "Genre": "Drama",
+        "Director": "Stub Director",
+        "Writer": "Stub Writer",
+        "Actors": "Actor One, Actor Two",
+        "Plot": f"Plot of {title}.",
+        "Language": "English",
+        "Country": "USA",
+        "Poster": "N/A",
+        "Type": "movie",
+        "imdbID": "tt" + str(zlib.crc32(title.encode()) % 10000000).zfill(7),
+        "Response": "True",
+    }
+    movie.update(fields)
+    return movie
+
+
+DEFAULT_MOVIES = [
+    make_movie("Titanic", Year="1997", imdbRating="7.9",
+               Director="James Cameron", imdbID="tt0120338"),
+    make_movie("The Matrix", Year="1999", imdbRating="8.7",
+               Director="Lana Wachowski, Lilly Wachowski", imdbID="tt0133093"),
+    make_movie("Gladiator", Year="2000", imdbRating="8.5",
+               Director="Ridley Scott", imdbID="tt0172495"),
+]
+
+
+class OMDbStubServer:
+    def __init__(self, movies=None, delay=0.0, host='127.0.0.1', port=0,
+                 synthesize=False):
+        # With synthesize=True any unknown title gets a generated movie
+        self.movies = {movie["Title"].casefold(): movie
+                       for movie in (movies or DEFAULT_MOVIES)}
+        self.delay = delay
+        self.synthesize = synthesize
+        self.request_counts = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    @property
+    def total_requests(self):
+        with self._lock:
+            return sum(self.request_counts.values())
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def lookup(self, title):
+        with self._lock:
+            self.request_counts[title] = self.request_counts.get(title, 0) + 1
+        movie = self.movies.get(' '.join(title.split()).casefold())
+        if movie is None and self.synthesize and title:
+            movie = make_movie(title)
+        return movie or NOT_FOUND
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                title = query.get('t', [''])[0]
+                if stub.delay:
+                    threading.Event().wait(stub.delay)
+                body = json.dumps(stub.lookup(title)).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Run a local OMDb stub.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0)
+    args = parser.parse_args()
+    server = OMDbStubServer(delay=args.delay, port=args.port,
+                            synthesize=True).start()
+    print(f"OMDb stub listening on {server.url} "
+          f"(set OMDB_API_URL={server.url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,190 @@
+"""
+Password hashing and verification off the request threads.
+
+bcrypt is deliberately slow CPU work; on the request threads a burst of
+logins ties up every worker and starves the cheap routes. PasswordHasher
+runs it on a dedicated process pool and bounds the jobs in flight: once
+the pool and its queue are full, further calls fail fast with HasherBusy,
+which the app answers with a 503 and a Retry-After header.
+
+Configuration (environment):
+    MOVIWEB_BCRYPT_ROUNDS  cost factor of new hashes (default 12); a login
+                           rehashes a password stored with another cost
+    MOVIWEB_HASH_WORKERS   worker processes (default: the CPU count; 0
+                           hashes on the calling thread, still bounded)
+    MOVIWEB_HASH_QUEUE     jobs allowed to wait for a worker (default: 4
+                           per worker)
+
+With the instrumentation enabled, /metrics gets the pending jobs gauge,
+rejected jobs and the time jobs waited for a worker.
+"""
+import concurrent.futures
+import multiprocessing.util
+import os
+import re
+import threading
+import time
+import bcrypt
+from instrumentation import instrumentation, metrics
+
+DEFAULT_ROUNDS = 12
+QUEUE_PER_WORKER = 4
+
+# $2b$12$<salt and hash>: the cost is the second field
+COST_PATTERN = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+
+metrics.describe('moviweb_password_hash_pending', 'gauge',
+                 'Password hashing jobs queued or running.')
+metrics.describe('moviweb_password_hash_rejected_total', 'counter',
+                 'Password hashing jobs rejected because the queue was full.')
+metrics.describe('moviweb_password_hash_queue_seconds', 'histogram',
+                 'Time password hashing jobs waited for a worker.')
+
+
+class HasherBusy(Exception):
+    """
+    Raised when the hashing queue is full; retry later.
+    """
+
+
+def hash_password(password, rounds):
+    # Runs in a worker process; returns the result and when it ran
+    started = time.time()
+    pw_hash = bcrypt.hashpw(password.encode('utf-8'),
+                            bcrypt.gensalt(rounds)).decode('utf-8')
+    return pw_hash, started
+
+
+def verify_password(password, pw_hash):
+    started = time.time()
+    try:
+        matches = bcrypt.checkpw(password.encode('utf-8'),
+                                 pw_hash.encode('utf-8'))
+    except ValueError:
+        # Not a bcrypt hash
+        matches = False
+    return matches, started
+
+
+def hash_cost(pw_hash):
+    """
+    Returns:
+        int: The bcrypt cost factor of pw_hash, or None if it is not one.
+    """
+    match = COST_PATTERN.match(pw_hash or '')
+    return int(match.group(1)) if match else None
+
+
+class PasswordHasher:
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=None, queue_size=None):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if queue_size is None:
+            queue_size = QUEUE_PER_WORKER * max(workers, 1)
+        self.rounds = rounds
+        self.workers = workers
+        self.queue_size = queue_size
+        self.capacity = max(workers, 1) + queue_size
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool = None
+        self._finalizer = None
+
+    @classmethod
+    def from_env(cls):
+        workers = os.environ.get('MOVIWEB_HASH_WORKERS')
+        queue_size = os.environ.get('MOVIWEB_HASH_QUEUE')
+        return cls(
+            rounds=int(os.environ.get('MOVIWEB_BCRYPT_ROUNDS',
+                                      DEFAULT_ROUNDS)),
+            workers=int(workers) if workers else None,
+            queue_size=int(queue_size) if queue_size else None)
+
+    def start(self):
+        """
+        Start the worker processes now rather than on the first job, so
+        they are forked before the server starts its request threads.
+        """
+        if self.workers and self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+            # Stop the workers before multiprocessing's exit handler waits
+            # for them, also when the pool was started outside app.py (an
+            # atexit hook does not run in a multiprocessing child). It must
+            # run before the pool's queues are closed, at priority 10
+            self._finalizer = multiprocessing.util.Finalize(
+                None, self.shutdown, exitpriority=100)
+            # Forces the pool to create its workers
+            self._pool.submit(time.time).result()
+        return self
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._finalizer.cancel()
+            self._pool.shutdown()
+            self._pool = None
+
+    def _set_pending(self, change):
+        with self._lock:
+            self._pending += change
+            pending = self._pending
+        if instrumentation.enabled:
+            metrics.set('moviweb_password_hash_pending', pending)
+
+    def _run(self, operation, function, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            if instrumentation.enabled:
+                metrics.inc('moviweb_password_hash_rejected_total',
+                            operation=operation)
+            raise HasherBusy(f"Password {operation} queue is full")
+        self._set_pending(1)
+        submitted = time.time()
+        try:
+            if self.workers:
+                if self._pool is None:
+                    with self._lock:
+                        if self._pool is None:
+                            self.start()
+                result, started = self._pool.submit(function, *args).result()
+            else:
+                result, started = function(*args)
+        finally:
+            self._set_pending(-1)
+            self._slots.release()
+        if instrumentation.enabled:
+            metrics.observe('moviweb_password_hash_queue_seconds',
+                            max(0.0, started - submitted), operation=operation)
+        return result
+
+    def hash(self, password):
+        """
+        Hash a password with the configured cost.
+        Raises:
+            HasherBusy: If the queue is full.
+        """
+        return self._run('hash', hash_password, password, self.rounds)
+
+    def check(self, password, pw_hash):
+        """
+        Check a password against a stored hash.
+        Raises:
+            HasherBusy: If the queue is full.
+        """
+        return self._run('check', verify_password, password, pw_hash)
+
+    def needs_rehash(self, pw_hash):
+        # True if pw_hash was made with another cost than the configured one
+        return hash_cost(pw_hash) != self.rounds
+
+    def stats(self):
+        with self._lock:
+            pending = self._pending
+        return {'rounds': self.rounds, 'workers': self.workers,
+                'capacity': self.capacity, 'pending': pending,
+                'rejected': self.rejected}
+
+
+password_hasher = PasswordHasher.from_env()
@@ -0,0 +1,463 @@
+"""
+Response cache for rendered pages and API responses.
+
+Views decorated with response_cache.cached(tags) are stored per URL (path
+and query string) in an in-process LRU, optionally backed by a shared
+SQLite file or a Redis-compatible server so several workers share entries
+and invalidations. Every response gets an ETag; a request whose
+If-None-Match matches is answered with 304 Not Modified.
+
+Entries are invalidated by tag: each tag (e.g. "user:1") has a generation
+number that is part of the cache key, and invalidating the tag bumps the
+generation, which makes every entry of that tag unreachable at once.
+
+Configuration (environment):
+    RESPONSE_CACHE=memory              in-process LRU only (default)
+    RESPONSE_CACHE=sqlite:/path/file   shared SQLite file
+    RESPONSE_CACHE=redis://host:6379/0 shared Redis (needs the redis package)
+    RESPONSE_CACHE=off                 disable caching
+"""
+import base64
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import make_response, request
+
+try:
+    import redis
+except ImportError:  # Optional: only needed for the Redis backend
+    redis = None
+
+# Entries kept by the in-process LRU
+DEFAULT_LOCAL_ENTRIES = 1024
+# Entries kept by a shared backend before the least recently used go
+DEFAULT_MAX_ENTRIES = 10000
+# Shared entries expire after this many seconds even if never invalidated
+DEFAULT_TTL = 24 * 3600
+
+# Response headers that are not replayed from a cache entry
+UNCACHED_HEADERS = {'content-length', 'content-type', 'etag', 'set-cookie',
+                    'cache-control'}
+
+
+def user_tag(user_id):
+    return f'user:{user_id}'
+
+
+USERS_TAG = 'users'
+
+
+class LRUCache:
+    # Thread-safe in-process LRU used on its own or in front of a backend
+
+    def __init__(self, max_entries=DEFAULT_LOCAL_ENTRIES):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class MemoryBackend:
+    """
+    Tag generations kept in process memory; entries live only in the
+    LRU. Invalidations are not seen by other worker processes.
+    """
+    name = 'memory'
+
+    def __init__(self):
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generations(self, tags):
+        with self._lock:
+            return [self._generations.get(tag, 0) for tag in tags]
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        with self._lock:
+            self._generations.clear()
+
+
+class SQLiteBackend:
+    """
+    Entries and tag generations shared through a SQLite file, for several
+    workers on one machine. Errors are printed and treated as misses.
+    """
+    name = 'sqlite'
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Opened lazily so importing the module never touches the disk
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False,
+                                         timeout=10)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS "
+                               "ix_response_cache_accessed_at "
+                               "ON response_cache (accessed_at)")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache_tags (
+                    tag TEXT PRIMARY KEY,
+                    generation INTEGER NOT NULL
+                )""")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _run(self, action, default=None):
+        with self._lock:
+            try:
+                return action(self._connect())
+            except sqlite3.Error as error:
+                print(f"Error using response cache {self.path}: {error}")
+                return default
+
+    def generations(self, tags):
+        def read(connection):
+            rows = dict(connection.execute(
+                f"SELECT tag, generation FROM response_cache_tags WHERE tag "
+                f"IN ({', '.join('?' * len(tags))})", tags).fetchall())
+            return [rows.get(tag, 0) for tag in tags]
+        return self._run(read, [0] * len(tags)) if tags else []
+
+    def invalidate(self, tags):
+        def bump(connection):
+            connection.executemany(
+                "INSERT INTO response_cache_tags (tag, generation) "
+                "VALUES (?, 1) ON CONFLICT (tag) "
+                "DO UPDATE SET generation = generation + 1",
+                [(tag,) for tag in tags])
+            connection.commit()
+        self._run(bump)
+
+    def get(self, key):
+        def read(connection):
+            now = time.time()
+            row = connection.execute(
+                "SELECT payload, stored_at FROM response_cache "
+                "WHERE cache_key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                return None
+            connection.execute("UPDATE response_cache SET accessed_at = ? "
+                               "WHERE cache_key = ?", (now, key))
+            connection.commit()
+            return row[0]
+        return self._run(read)
+
+    def set(self, key, value):
+        def write(connection):
+            now = time.time()
+            connection.execute(
+                "INSERT OR REPLACE INTO response_cache (cache_key, payload, "
+                "stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now))
+            count = connection.execute(
+                "SELECT COUNT(*) FROM response_cache").fetchone()[0]
+            if count > self.max_entries:
+                connection.execute(
+                    "DELETE FROM response_cache WHERE cache_key IN (SELECT "
+                    "cache_key FROM response_cache ORDER BY accessed_at "
+                    "LIMIT ?)", (count - self.max_entries,))
+            connection.commit()
+        self._run(write)
+
+    def clear(self):
+        def delete(connection):
+            connection.execute("DELETE FROM response_cache")
+            connection.execute("DELETE FROM response_cache_tags")
+            connection.commit()
+        self._run(delete)
+
+
+class RedisBackend:
+    """
+    Entries and tag generations shared through a Redis-compatible server.
+    Entries expire after the TTL; eviction is left to the server's
+    maxmemory policy. Errors are printed and treated as misses.
+    """
+    name = 'redis'
+
+    def __init__(self, url, ttl=DEFAULT_TTL, prefix='moviweb:'):
+        if redis is None:
+            raise RuntimeError("The redis package is required for "
+                               "RESPONSE_CACHE=redis://...")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _run(self, action, default=None):
+        try:
+            return action()
+        except redis.RedisError as error:
+            print(f"Error using response cache: {error}")
+            return default
+
+    def generations(self, tags):
+        keys = [f'{self.prefix}tag:{tag}' for tag in tags]
+        values = self._run(lambda: self.client.mget(keys), [None] * len(tags))
+        return [int(value or 0) for value in values]
+
+    def invalidate(self, tags):
+        def bump():
+            pipeline = self.client.pipeline()
+            for tag in tags:
+                pipeline.incr(f'{self.prefix}tag:{tag}')
+            pipeline.execute()
+        self._run(bump)
+
+    def get(self, key):
+        value = self._run(lambda: self.client.get(self.prefix + key))
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value):
+        self._run(lambda: self.client.set(self.prefix + key, value,
+                                          ex=self.ttl))
+
+    def clear(self):
+        self._run(lambda: [self.client.delete(key) for key in
+                           self.client.scan_iter(self.prefix + '*')])
+
+
+def backend_from_config(config):
+    # Build the backend named by RESPONSE_CACHE; None disables caching
+    if config in ('off', 'none', '0'):
+        return None
+    if not config or config == 'memory':
+        return MemoryBackend()
+    if config.startswith('sqlite:'):
+        return SQLiteBackend(config[len('sqlite:'):])
+    if config.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(config)
+    raise ValueError(f"Unknown RESPONSE_CACHE backend: {config}")
+
+
+def encode_entry(entry):
+    return json.dumps({**entry, 'body': base64.b64encode(
+        entry['body']).decode('ascii')})
+
+
+def decode_entry(payload):
+    entry = json.loads(payload)
+    entry['body'] = base64.b64decode(entry['body'])
+    return entry
+
+
+class ResponseCache:
+    """
+    Caches successful GET responses of decorated views.
+    Keys combine the URL with the current generation of each of the
+    view's tags; invalidate(tag) makes all entries of a tag stale.
+    """
+
+    def __init__(self, backend=None, local_entries=DEFAULT_LOCAL_ENTRIES,
+                 enabled=True):
+        self.backend = backend or MemoryBackend()
+        self.enabled = enabled
+        self.local = LRUCache(local_entries)
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        backend = backend_from_config(os.environ.get('RESPONSE_CACHE',
+                                                     'memory'))
+        return cls(backend, enabled=backend is not None)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def key(self, tags):
+        generations = self.backend.generations(tags)
+        versions = ','.join(f'{tag}={generation}'
+                            for tag, generation in zip(tags, generations))
+        return f'{request.full_path}|{versions}'
+
+    def lookup(self, key):
+        entry = self.local.get(key)
+        if entry is None:
+            payload = self.backend.get(key)
+            if payload is not None:
+                entry = decode_entry(payload)
+                self.local.set(key, entry)
+        return entry
+
+    def store(self, key, response):
+        body = response.get_data()
+        entry = {'status': response.status_code,
+                 'mimetype': response.mimetype,
+                 'headers': [(name, value) for name, value
+                             in response.headers.items()
+                             if name.lower() not in UNCACHED_HEADERS],
+                 'etag': hashlib.sha1(body).hexdigest(),
+                 'body': body}
+        self.local.set(key, entry)
+        self.backend.set(key, encode_entry(entry))
+        return entry
+
+    def respond(self, entry):
+        # Answer from a cache entry, with 304 if the client has this version
+        if request.if_none_match.contains(entry['etag']):
+            self._count('not_modified')
+            response = make_response('', 304)
+        else:
+            response = make_response(entry['body'], entry['status'])
+            response.mimetype = entry['mimetype']
+            response.headers.extend(entry['headers'])
+        response.set_etag(entry['etag'])
+        # Clients must revalidate, so invalidations are seen immediately
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def cached(self, tags):
+        """
+        Decorator caching a view's GET responses.
+        Args:
+            tags (callable): Called with the view's keyword arguments,
+                returns the tags the response depends on.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(**view_args):
+                if not self.enabled or request.method != 'GET':
+                    return view(**view_args)
+                key = self.key([str(tag) for tag in tags(**view_args)])
+                entry = self.lookup(key)
+                if entry is not None:
+                    self._count('hits')
+                    return self.respond(entry)
+                self._count('misses')
+                response = make_response(view(**view_args))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                return self.respond(self.store(key, response))
+            return wrapper
+        return decorator
+
+    def invalidate(self, *tags):
+        if not self.enabled or not tags:
+            return
+        self._count('invalidations')
+        self.backend.invalidate([str(tag) for tag in tags])
+
+    def clear(self):
+        self.local.clear()
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.backend.name,
+            'enabled': self.enabled,
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'invalidations': self.invalidations,
+            'local_entries': len(self.local),
+            'local_evictions': self.local.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CacheInvalidatingDataManager:
+    """
+    Wraps a data manager and invalidates the cached responses of the
+    users each write touches. Reads pass straight through.
+    """
+
+    def __init__(self, data_manager, cache):
+        self.data_manager = data_manager
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.data_manager, name)
+
+    def add_user(self, *args, **kwargs):
+        result = self.data_manager.add_user(*args, **kwargs)
+        self.cache.invalidate(USERS_TAG)
+        return result
+
+    def add_movie(self, user_id, movie_title):
+        result = self.data_manager.add_movie(user_id, movie_title)
+        self.cache.invalidate(user_tag(user_id))
+        return result
+
+    def update_movie(self, user_id, movie_id, *args, **kwargs):
+        result = self.data_manager.update_movie(user_id, movie_id, *args,
+                                                **kwargs)
+        self.cache.invalidate(user_tag(user_id))
+        return result
+
+    def delete_movie(self, user_id, movie_id):
+        result = self.data_manager.delete_movie(user_id, movie_id)
+        self.cache.invalidate(user_tag(user_id))
+        return result
+
+    def add_review(self, user_id, movie_id, rating, review):
+        result = self.data_manager.add_review(user_id, movie_id, rating,
+                                              review)
+        self.cache.invalidate(user_tag(user_id))
+        return result
+
+    def bulk_add_movies(self, user_id, titles, *args, **kwargs):
+        result = self.data_manager.bulk_add_movies(user_id, titles, *args,
+                                                   **kwargs)
+        self.cache.invalidate(user_tag(user_id))
+        return result
+
+
+# Cache shared by the app and the API blueprint
+response_cache = ResponseCache.from_env()
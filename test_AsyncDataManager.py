@@ -0,0 +1,89 @@
+import asyncio
+import json
+import pytest
+from data_management.AsyncDataManager import ThreadedAsyncDataManager
+from data_management.JSONDataManager import JSONDataManager
+
+
+def test_threaded_json_data_manager(tmpdir):
+    file_path = tmpdir.join("users.json")
+    file_path.write(json.dumps({}))
+    data_manager = JSONDataManager(str(file_path))
+
+    async def scenario():
+        async_data_manager = ThreadedAsyncDataManager(data_manager,
+                                                      max_workers=4)
+        try:
+            await async_data_manager.add_user({"name": "John",
+                                               "email": "john@example.com",
+                                               "password": "hash"})
+            users, user = await asyncio.gather(
+                async_data_manager.get_all_users(),
+                async_data_manager.get_user_by_email("john@example.com"))
+            return users, user
+        finally:
+            await async_data_manager.close()
+
+    users, user = asyncio.run(scenario())
+    assert user["name"] == "John"
+    assert user["id"] in {str(user_id) for user_id in users}
+
+
+def test_threaded_sql_data_manager(sql_app):
+    async def scenario():
+        async_data_manager = ThreadedAsyncDataManager(sql_app.data_manager,
+                                                      sql_app)
+        try:
+            results = await asyncio.gather(
+                async_data_manager.add_movie(1, "Titanic"),
+                async_data_manager.add_movie(1, "Gladiator"),
+                async_data_manager.add_movie(1, "No Such Movie"))
+            movies, user = await async_data_manager.get_user_movies(1)
+            page, next_cursor = await async_data_manager.get_users_page()
+            return results, movies, user, page, next_cursor
+        finally:
+            await async_data_manager.close()
+
+    results, movies, user, page, next_cursor = asyncio.run(scenario())
+    assert results[2] == "Movie not found!"
+    assert user.name == "John"
+    assert sorted(movie.title for _, movie in movies) == ["Gladiator",
+                                                          "Titanic"]
+    assert [user.name for user in page] == ["John"]
+    assert next_cursor is None
+
+
+def test_async_sqlite_data_manager(sql_app, omdb_stub):
+    pytest.importorskip("greenlet")
+    pytest.importorskip("aiosqlite")
+    pytest.importorskip("httpx")
+    from data_management.AsyncOMDbClient import AsyncOMDbClient
+    from data_management.AsyncSQLDataManager import AsyncSQLiteDataManager
+    db_file = sql_app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):]
+    # Slow enough that the second Titanic lookup starts while the first
+    # is still waiting for the upstream
+    omdb_stub.delay = 0.2
+
+    async def scenario():
+        async_data_manager = AsyncSQLiteDataManager(
+            db_file, sql_app.data_manager, sql_app,
+            omdb=AsyncOMDbClient(base_url=omdb_stub.url))
+        try:
+            # Concurrent lookups of one title make one upstream request
+            results = await asyncio.gather(
+                async_data_manager.add_movie(1, "Titanic"),
+                async_data_manager.add_movie(1, "Titanic"))
+            not_found = await async_data_manager.add_movie(1, "No Such Movie")
+            movies, user = await async_data_manager.get_user_movies(1)
+            # A fallback method runs the synchronous manager on the pool
+            matches, _ = await async_data_manager.search_movies("titanic")
+            return results, not_found, movies, matches
+        finally:
+            await async_data_manager.close()
+
+    results, not_found, movies, matches = asyncio.run(scenario())
+    assert "Movie added to the database and UserMovies." in results
+    assert not_found == "Movie not found!"
+    assert [movie.title for _, movie in movies] == ["Titanic"]
+    assert omdb_stub.request_counts.get("Titanic") == 1
+    assert [movie.title for movie in matches] == ["Titanic"]
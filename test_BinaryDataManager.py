@@ -0,0 +1,168 @@
+import json
+import os
+import pytest
+import data_management.BinaryDataManager as binary_data_manager_module
+from data_management.BinaryDataManager import BinaryDataManager, MAGIC, \
+    encode_record
+from data_management.CollectionQuery import CollectionQuery
+from data_management.Converter import convert, summarize
+
+# Test data
+USER_DATA = {
+    "1": {
+        "name": "John",
+        "email": "john@example.com",
+        "password": "hash1",
+        "movies": {
+            "1": {"name": "Movie 1", "director": "Director 1",
+                  "year": "2020", "rating": 7.5, "note": ""},
+            "2": {"name": "Movie 2", "director": "Director 2",
+                  "year": "2019", "rating": "N/A", "note": "line one\nlíne"}
+        }
+    },
+    "2": {
+        "name": "Jane",
+        "email": "jane@example.com",
+        "password": "hash2",
+        "movies": {
+            "1": {"name": "Movie 3", "director": None, "year": 2021,
+                  "rating": 0}
+        }
+    },
+    "3": {
+        "name": "Jim",
+        "email": "jim@example.com",
+        "password": "hash3",
+        "movies": {}
+    }
+}
+
+
+def write_binary_file(path, users):
+    with open(path, 'wb') as file:
+        file.write(MAGIC)
+        for user_id, user in users.items():
+            file.write(encode_record(user_id, user))
+
+
+# Fixture to initialize BinaryDataManager with test data
+@pytest.fixture
+def binary_data_manager(tmpdir):
+    binary_file = str(tmpdir.join("users.mwb"))
+    write_binary_file(binary_file, USER_DATA)
+
+    yield BinaryDataManager(binary_file)
+
+
+def test_get_all_users(binary_data_manager):
+    users = binary_data_manager.get_all_users()
+    # Values keep their types and missing keys stay missing
+    assert users == USER_DATA
+    assert list(users) == ["1", "2", "3"]
+    assert "4" not in users
+
+
+def test_reads_decode_only_requested_movies(binary_data_manager, monkeypatch):
+    decoded = []
+    decode_movies = binary_data_manager_module.decode_movies
+
+    def counting_decode_movies(buffer, position):
+        movies = decode_movies(buffer, position)
+        decoded.append(movies)
+        return movies
+
+    monkeypatch.setattr(binary_data_manager_module, "decode_movies",
+                        counting_decode_movies)
+    users = binary_data_manager.get_all_users()
+    assert users["2"]["name"] == "Jane"
+    assert binary_data_manager.get_user_by_email("jim@example.com") == {
+        'id': '3', 'name': 'Jim', 'email': 'jim@example.com',
+        'password': 'hash3'}
+    page, next_cursor = binary_data_manager.get_users_page(limit=2)
+    assert list(page) == ["1", "2"] and next_cursor == 2
+    assert decoded == []
+
+    assert binary_data_manager.get_user_movies("2") == \
+        USER_DATA["2"]["movies"]
+    assert binary_data_manager.get_user_movies("9") is None
+    assert len(decoded) == 1
+
+
+def test_mutations(binary_data_manager, omdb_stub):
+    binary_data_manager.add_movie("3", "Titanic")
+    assert binary_data_manager.add_movie("3", "No Such Movie") is False
+    movie = binary_data_manager.get_user_movies("3")["1"]
+    assert movie["name"] == "Titanic" and isinstance(movie["rating"], float)
+
+    binary_data_manager.update_movie("1", "2", "Movie 2b", "Director 2",
+                                     "8.0", "2019", "Seen")
+    assert binary_data_manager.delete_movie("1", "1") is True
+    assert binary_data_manager.delete_movie("1", "1") is None
+    binary_data_manager.update_password("2", "hash2b")
+    assert binary_data_manager.add_user(
+        {"name": "Max", "email": "max@example.com", "password": "hash4",
+         "movies": {}}) == "4"
+
+    # A fresh instance reads the same state back from the file
+    users = BinaryDataManager(binary_data_manager.filename).get_all_users()
+    assert users["1"]["movies"] == {"2": {
+        "name": "Movie 2b", "director": "Director 2", "year": "2019",
+        "rating": "8.0", "note": "Seen"}}
+    assert users["2"]["password"] == "hash2b"
+    assert users["4"] == {"name": "Max", "email": "max@example.com",
+                          "password": "hash4", "movies": {}}
+    assert binary_data_manager.search_movies("titanic")[0][0]["user_id"] == "3"
+    assert list(binary_data_manager.search_users("max")[0]) == ["4"]
+    movies, _ = binary_data_manager.get_collection_page(
+        "1", CollectionQuery(sort='title'))
+    assert list(movies) == ["2"]
+
+
+def test_reviews_are_not_supported(binary_data_manager):
+    with pytest.raises(NotImplementedError):
+        binary_data_manager.get_movie_reviews("1", "1")
+    with pytest.raises(NotImplementedError):
+        binary_data_manager.add_review("1", "1", 7, "Good")
+
+
+def test_compaction_drops_old_versions(tmpdir):
+    binary_file = str(tmpdir.join("users.mwb"))
+    data_manager = BinaryDataManager(binary_file, compact_min_bytes=0)
+    user_id = data_manager.add_user({"name": "John", "movies": {}})
+    for number in range(20):
+        data_manager.update_password(user_id, f"hash{number}")
+        # Never more dead bytes than live ones
+        assert os.path.getsize(binary_file) <= 4 + 2 * len(
+            encode_record(user_id, {"name": "John",
+                                    "password": f"hash{number}"}))
+    assert data_manager.get_all_users() == {
+        "1": {"name": "John", "password": "hash19", "movies": {}}}
+
+
+def test_torn_record_is_ignored_and_replaced(binary_data_manager):
+    filename = binary_data_manager.filename
+    record = encode_record("2", {"name": "Jane (new)", "movies": {}})
+    with open(filename, 'ab') as file:
+        # A crash in the middle of an append
+        file.write(record[:-3])
+    assert binary_data_manager.get_all_users()["2"]["name"] == "Jane"
+
+    binary_data_manager.update_password("3", "hash3b")
+    users = BinaryDataManager(filename).get_all_users()
+    assert users["2"]["name"] == "Jane"
+    assert users["3"]["password"] == "hash3b"
+
+
+def test_convert_to_and_from_binary(tmpdir):
+    json_file = str(tmpdir.join("users.json"))
+    with open(json_file, 'w') as file:
+        json.dump(USER_DATA, file)
+    binary_file = str(tmpdir.join("users.mwb"))
+    json_copy = str(tmpdir.join("copy.json"))
+
+    convert(json_file, binary_file, batch_size=2, log=lambda message: None)
+    convert(binary_file, json_copy, batch_size=2, log=lambda message: None)
+    assert summarize(binary_file) == summarize(json_file)
+    assert summarize(json_copy) == summarize(json_file)
+    assert BinaryDataManager(binary_file).get_user_movies("1") == \
+        USER_DATA["1"]["movies"]
@@ -0,0 +1,184 @@
+import pytest
+import data_management.CSVDataManager as csv_data_manager_module
+from data_management.CSVDataManager import (CSVDataManager, read_csv_file,
+                                            write_csv_file)
+
+# Test data
+USER_DATA = {
+    "1": {
+        "name": "John",
+        "email": "john@example.com",
+        "password": "hash1",
+        "movies": {
+            "1": {"name": "Movie 1", "director": "Director 1",
+                  "year": "2020", "rating": "7.5", "note": ""},
+            "2": {"name": "Movie 2", "director": "Director 2",
+                  "year": "2019", "rating": "8.2", "note": "line one\nline two"}
+        }
+    },
+    "2": {
+        "name": "Jane",
+        "email": "jane@example.com",
+        "password": "hash2",
+        "movies": {
+            "1": {"name": "Movie, 3", "director": "Director 3",
+                  "year": "2021", "rating": "6.9", "note": "said \"hi\""}
+        }
+    },
+    "3": {
+        "name": "Jim",
+        "email": "jim@example.com",
+        "password": "hash3",
+        "movies": {
+            "1": {"name": "Movie 4", "director": "Director 4",
+                  "year": "2018", "rating": "5.0", "note": ""}
+        }
+    }
+}
+
+
+# Fixture to initialize CSVDataManager in indexed mode with test data
+@pytest.fixture
+def indexed_csv_data_manager(tmpdir):
+    csv_file = tmpdir.join("test.csv")
+    write_csv_file(str(csv_file), USER_DATA)
+
+    data_manager = CSVDataManager(str(csv_file), indexed=True)
+
+    yield data_manager
+
+
+def test_read_csv_file_keeps_all_movies(indexed_csv_data_manager):
+    assert read_csv_file(indexed_csv_data_manager.filename) == USER_DATA
+
+
+def test_indexed_get_user_movies(indexed_csv_data_manager):
+    for user_id, user_data in USER_DATA.items():
+        assert indexed_csv_data_manager.get_user_movies(user_id) == \
+            user_data["movies"]
+    assert indexed_csv_data_manager.get_user_movies("42") is None
+
+
+def test_indexed_mutations_match_full_read(indexed_csv_data_manager):
+    data_manager = indexed_csv_data_manager
+    data_manager.update_movie("1", "2", "Updated Movie", "Updated Director",
+                              "9.0", "2022", "new note")
+    data_manager.delete_movie("2", "1")
+    data_manager.add_user("New User", "new@example.com", "hash4")
+    data_manager.update_movie("3", "2", "Added Movie", "Director 5",
+                              "4.0", "2001", "")
+
+    users = read_csv_file(data_manager.filename)
+    assert users["1"]["movies"]["2"]["name"] == "Updated Movie"
+    assert "2" not in users
+    assert users["4"]["email"] == "new@example.com"
+    assert list(users["3"]["movies"]) == ["1", "2"]
+    for user_id, user_data in users.items():
+        assert data_manager.get_user_movies(user_id) == user_data["movies"]
+
+
+def test_indexed_get_all_users_reads_only_looked_up_users(
+        indexed_csv_data_manager, monkeypatch):
+    def fail(file_path):
+        raise AssertionError("indexed reads must not parse the whole file")
+
+    monkeypatch.setattr(csv_data_manager_module, "read_csv_file", fail)
+    users = indexed_csv_data_manager.get_all_users()
+    assert list(users) == list(USER_DATA)
+    assert users["2"] == USER_DATA["2"]
+    assert "42" not in users
+    with pytest.raises(KeyError):
+        users["42"]
+    assert users == USER_DATA
+
+
+def test_index_is_reused_and_follows_appends(indexed_csv_data_manager):
+    data_manager = indexed_csv_data_manager
+    data_manager.get_user_movies("1")
+
+    # A second manager loads the sidecar index and picks up appended rows
+    data_manager.add_user("New User", "new@example.com", "hash4")
+    other = CSVDataManager(data_manager.filename, indexed=True)
+    assert other.get_user_movies("4") == {
+        "": {"name": "", "director": "", "year": "", "rating": "", "note": ""}}
+
+    # A full rewrite by the non-indexed path triggers a rescan
+    users = read_csv_file(data_manager.filename)
+    users["1"]["movies"].pop("1")
+    write_csv_file(data_manager.filename, users)
+    assert list(other.get_user_movies("1")) == ["2"]
+    assert other.get_user_movies("3") == USER_DATA["3"]["movies"]
+
+
+def test_get_user_by_email(indexed_csv_data_manager):
+    data_manager = indexed_csv_data_manager
+    assert data_manager.get_user_by_email("jane@example.com") == {
+        "id": "2", "name": "Jane", "email": "jane@example.com",
+        "password": "hash2"}
+    assert data_manager.get_user_by_email("nobody@example.com") is None
+
+    # Users added after the index was built are found as well
+    data_manager.add_user("New User", "new@example.com", "hash4")
+    assert data_manager.get_user_by_email("new@example.com")["id"] == "4"
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_update_password(tmpdir, indexed):
+    csv_file = tmpdir.join("test.csv")
+    write_csv_file(str(csv_file), USER_DATA)
+    data_manager = CSVDataManager(str(csv_file), indexed=indexed)
+
+    data_manager.update_password("2", "new hash")
+    users = read_csv_file(str(csv_file))
+    assert users["2"]["password"] == "new hash"
+    assert users["2"]["movies"] == USER_DATA["2"]["movies"]
+    assert users["1"]["password"] == "hash1"
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_delete_movie(tmpdir, indexed):
+    csv_file = tmpdir.join("test.csv")
+    write_csv_file(str(csv_file), USER_DATA)
+    data_manager = CSVDataManager(str(csv_file), indexed=indexed)
+
+    assert data_manager.delete_movie("1", "1") is True
+    assert list(read_csv_file(str(csv_file))["1"]["movies"]) == ["2"]
+    # Unknown movie or user: nothing deleted
+    assert data_manager.delete_movie("1", "1") is None
+    assert data_manager.delete_movie("42", "1") is None
+    assert read_csv_file(str(csv_file))["3"] == USER_DATA["3"]
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_get_users_page(tmpdir, indexed):
+    csv_file = tmpdir.join("test.csv")
+    write_csv_file(str(csv_file), USER_DATA)
+    data_manager = CSVDataManager(str(csv_file), indexed=indexed)
+
+    users, next_cursor = data_manager.get_users_page(limit=2)
+    assert users == {"1": USER_DATA["1"], "2": USER_DATA["2"]}
+    assert next_cursor == 2
+    users, next_cursor = data_manager.get_users_page(after=next_cursor,
+                                                     limit=2)
+    assert users == {"3": USER_DATA["3"]}
+    assert next_cursor is None
+
+
+def test_search(indexed_csv_data_manager):
+    data_manager = indexed_csv_data_manager
+    movies, _ = data_manager.search_movies("movie 4")
+    assert [movie["name"] for movie in movies] == ["Movie 4"]
+    users, _ = data_manager.search_users("example")
+    assert set(users) == {"1", "2", "3"}
+
+    # The index follows changes to the file
+    data_manager.add_user("Jill", "jill@example.com", "hash4")
+    users, _ = data_manager.search_users("jil")
+    assert list(users) == ["4"]
+
+
+def test_reviews_are_not_supported(indexed_csv_data_manager):
+    with pytest.raises(NotImplementedError):
+        indexed_csv_data_manager.get_movie_reviews("1", "1")
+    with pytest.raises(NotImplementedError):
+        indexed_csv_data_manager.add_review("1", "1", 7, "Good")
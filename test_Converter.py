@@ -0,0 +1,145 @@
+import json
+import sqlite3
+import pytest
+import data_management.Converter as converter_module
+from data_management.CSVDataManager import read_csv_file
+from data_management.Converter import convert, read_json_users, summarize
+
+# Test data: shared and edited movies, odd values and a user without movies
+USER_DATA = {
+    "1": {
+        "name": "Zoë",
+        "email": "zoe@example.com",
+        "password": "hash1",
+        "movies": {
+            "1": {"name": "Titanic", "director": "James Cameron",
+                  "year": "1997", "rating": 7.9, "note": "Seen twice"},
+            "2": {"name": "Breaking Bad", "director": "N/A",
+                  "year": "2008–2013", "rating": "N/A",
+                  "note": "Line one\nline \"two\", three"}
+        }
+    },
+    "2": {
+        "name": "Jane",
+        "email": "jane@example.com",
+        "password": "hash2",
+        "movies": {
+            "1": {"name": "Titanic", "director": "James Cameron",
+                  "year": "1997", "rating": 7.9, "note": ""},
+            "2": {"name": "Titanic", "director": "James Cameron",
+                  "year": "1997", "rating": 9.0}
+        }
+    },
+    "3": {
+        "name": "Max",
+        "email": "max@example.com",
+        "password": "hash3",
+        "movies": {}
+    }
+}
+
+
+def quiet(message):
+    pass
+
+
+@pytest.fixture
+def json_file(tmpdir):
+    path = tmpdir.join("users.json")
+    path.write(json.dumps(USER_DATA, indent=4))
+    return str(path)
+
+
+def test_round_trip(tmpdir, json_file, monkeypatch):
+    # A tiny chunk size makes the JSON reader refill mid-value
+    monkeypatch.setattr(converter_module, "CHUNK_SIZE", 7)
+    sqlite_file = str(tmpdir.join("users.sqlite"))
+    csv_file = str(tmpdir.join("users.csv"))
+    json_copy = str(tmpdir.join("copy.json"))
+
+    assert convert(json_file, sqlite_file, batch_size=2, log=quiet) == \
+        {'users': 3, 'movies': 4}
+    convert(sqlite_file, csv_file, batch_size=2, log=quiet)
+    convert(csv_file, json_copy, batch_size=2, log=quiet)
+
+    expected = summarize(json_file)
+    assert expected['users'] == 3 and expected['movies'] == 4
+    for path in (sqlite_file, csv_file, json_copy):
+        assert summarize(path) == expected
+
+    # Identical movies share a row, the edited rating gets its own
+    connection = sqlite3.connect(sqlite_file)
+    assert connection.execute(
+        "SELECT title, rating, release_year, end_year, imdb_rating "
+        "FROM movies ORDER BY movie_id").fetchall() == [
+        ("Titanic", 7.9, 1997, None, 7.9),
+        ("Breaking Bad", "N/A", 2008, 2013, None),
+        ("Titanic", 9.0, 1997, None, 9.0)]
+    connection.close()
+
+    # The written files are what the data managers read
+    with open(json_copy) as file:
+        users = json.load(file)
+    assert users["3"] == {"name": "Max", "email": "max@example.com",
+                          "password": "hash3", "movies": {}}
+    assert read_csv_file(csv_file)["3"]["movies"] == {
+        "": {"name": "", "director": "", "year": "", "rating": "",
+             "note": ""}}
+
+
+@pytest.mark.parametrize("extension", ["json", "csv", "sqlite"])
+def test_resume_after_interruption(tmpdir, json_file, monkeypatch, extension):
+    target = str(tmpdir.join(f"target.{extension}"))
+    writer_class = converter_module.WRITERS[extension]
+    write = writer_class.write
+    calls = []
+
+    def failing_write(self, users):
+        calls.append(len(users))
+        if len(calls) == 2:
+            # Interrupted after writing part of the second batch
+            write(self, users[:1])
+            raise KeyboardInterrupt
+        write(self, users)
+
+    monkeypatch.setattr(writer_class, "write", failing_write)
+    with pytest.raises(KeyboardInterrupt):
+        convert(json_file, target, batch_size=1, log=quiet)
+    assert tmpdir.join(f"target.{extension}.checkpoint").check()
+
+    monkeypatch.setattr(writer_class, "write", write)
+    messages = []
+    convert(json_file, target, batch_size=1, log=messages.append)
+    assert messages[0] == "Resuming after 1 users"
+    assert summarize(target) == summarize(json_file)
+    assert not tmpdir.join(f"target.{extension}.checkpoint").check()
+
+
+def test_convert_refuses_unsafe_targets(tmpdir, json_file):
+    target = str(tmpdir.join("users.csv"))
+    convert(json_file, target, log=quiet)
+    with pytest.raises(ValueError):
+        convert(json_file, target, log=quiet)
+    with pytest.raises(ValueError):
+        convert(json_file, json_file, log=quiet)
+
+    # Unapplied journal records are not in the snapshot
+    tmpdir.join("users.json.journal").write('{"op": "add_user"}\n')
+    with pytest.raises(ValueError):
+        list(read_json_users(json_file))
+
+
+def test_resume_rejects_changed_source(tmpdir, json_file, monkeypatch):
+    target = str(tmpdir.join("users.sqlite"))
+    monkeypatch.setattr(converter_module.SQLiteUserWriter, "finish",
+                        lambda self: (_ for _ in ()).throw(KeyboardInterrupt))
+    with pytest.raises(KeyboardInterrupt):
+        convert(json_file, target, log=quiet)
+    monkeypatch.undo()
+
+    with open(json_file, "a") as file:
+        file.write("\n")
+    with pytest.raises(ValueError):
+        convert(json_file, target, log=quiet)
+    convert(json_file, target, restart=True, log=quiet)
+    assert summarize(target) == summarize(json_file)
@@ -0,0 +1,191 @@
+import json
+import multiprocessing
+import os
+import threading
+import pytest
+import data_management.BinaryDataManager as binary_data_manager_module
+import data_management.CSVDataManager as csv_data_manager_module
+import data_management.JSONDataManager as json_data_manager_module
+from data_management.BinaryDataManager import BinaryDataManager, MAGIC, \
+    encode_record
+from data_management.CSVDataManager import CSVDataManager, read_csv_file, \
+    write_csv_file
+from data_management.FileLock import ReadWriteLock, atomic_write, fcntl, \
+    file_lock
+from data_management.JSONDataManager import JSONDataManager, read_json_file
+
+PROCESSES = 4
+THREADS = 4
+# add_movie calls per thread: 4 x 4 x 24 = 384 per data manager, over
+# 2000 in all; raise STRESS_MUTATIONS for a longer run
+MUTATIONS = int(os.environ.get('STRESS_MUTATIONS', 24))
+
+MANAGERS = {
+    'json': lambda path: JSONDataManager(path),
+    'json-cached': lambda path: JSONDataManager(path, cached=True),
+    'json-journal': lambda path: JSONDataManager(path, journal=True,
+                                                 compact_threshold=100),
+    'csv': lambda path: CSVDataManager(path),
+    'csv-indexed': lambda path: CSVDataManager(path, indexed=True),
+    'binary': lambda path: BinaryDataManager(path),
+}
+
+
+class FakeOMDbClient:
+    # Every title is found, without a network round trip
+    def fetch_movie(self, title):
+        return {'Response': 'True', 'Title': title, 'Director': 'Director',
+                'imdbRating': '7.0', 'Year': '2000'}
+
+
+def test_read_write_lock():
+    lock = ReadWriteLock()
+    events = []
+    reading, done_reading = threading.Event(), threading.Event()
+
+    def read():
+        with lock.read():
+            reading.set()
+            done_reading.wait(5)
+
+    def write():
+        with lock.write():
+            events.append('write')
+
+    with lock.read():
+        # Reentrant, and other readers are let in
+        with lock.read():
+            pass
+        reader = threading.Thread(target=read)
+        reader.start()
+        assert reading.wait(5)
+        writer = threading.Thread(target=write)
+        writer.start()
+        writer.join(timeout=0.2)
+        with pytest.raises(RuntimeError):
+            lock.acquire_write()
+    # The writer waits for the last reader
+    assert events == []
+    done_reading.set()
+    writer.join(timeout=5)
+    reader.join()
+    assert events == ['write']
+
+    with lock.write():
+        with lock.read():
+            with lock.write():
+                pass
+
+
+def test_writer_waits_for_readers_of_other_processes(tmpdir):
+    if fcntl is None:
+        pytest.skip("fcntl is not available on this platform")
+    path = str(tmpdir.join("users.json"))
+    context = multiprocessing.get_context('fork')
+    locked, release = context.Event(), context.Event()
+
+    def hold_shared():
+        with file_lock(path).shared():
+            locked.set()
+            release.wait(10)
+
+    process = context.Process(target=hold_shared)
+    process.start()
+    assert locked.wait(10)
+    acquired = threading.Event()
+
+    def write():
+        with file_lock(path).exclusive():
+            acquired.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    assert not acquired.wait(0.2)
+    release.set()
+    assert acquired.wait(10)
+    writer.join()
+    process.join()
+
+
+def test_atomic_write_keeps_old_file_on_error(tmpdir):
+    path = tmpdir.join("users.json")
+    path.write('{"1": {}}')
+    with pytest.raises(KeyError):
+        with atomic_write(str(path)) as file:
+            file.write('{"2"')
+            raise KeyError
+    assert path.read() == '{"1": {}}'
+    assert tmpdir.listdir(lambda item: item.ext == '.tmp') == []
+
+
+def mutate(kind, path, process_number):
+    data_manager = MANAGERS[kind](path)
+    errors = []
+
+    def work(thread_number):
+        try:
+            for number in range(MUTATIONS):
+                data_manager.add_movie(
+                    "1", f"Movie {process_number}-{thread_number}-{number}")
+                # Readers never see a missing or half-written file
+                if data_manager.get_user_movies("1") is None:
+                    errors.append("Movies not found")
+        except Exception as error:
+            errors.append(repr(error))
+
+    threads = [threading.Thread(target=work, args=(thread_number,))
+               for thread_number in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise AssertionError(errors[:5])
+
+
+@pytest.mark.parametrize("kind", list(MANAGERS))
+def test_concurrent_mutations_are_not_lost(tmpdir, monkeypatch, kind):
+    if fcntl is None:
+        pytest.skip("fcntl is not available on this platform")
+    for module in (json_data_manager_module, csv_data_manager_module,
+                   binary_data_manager_module):
+        monkeypatch.setattr(module, "omdb_client", FakeOMDbClient())
+    user = {'name': 'John', 'email': 'john@example.com', 'password': 'hash',
+            'movies': {}}
+    if kind.startswith('json'):
+        path = str(tmpdir.join("users.json"))
+        with open(path, 'w') as file:
+            json.dump({"1": user}, file)
+    elif kind == 'binary':
+        path = str(tmpdir.join("users.mwb"))
+        with open(path, 'wb') as file:
+            file.write(MAGIC + encode_record("1", user))
+    else:
+        path = str(tmpdir.join("users.csv"))
+        user['movies'] = {'': {'name': '', 'director': '', 'year': '',
+                               'rating': '', 'note': ''}}
+        write_csv_file(path, {"1": user})
+
+    # Forked workers inherit the fake OMDb client
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=mutate, args=(kind, path, number))
+                 for number in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0] * PROCESSES
+
+    movies = MANAGERS[kind](path).get_user_movies("1")
+    expected = {f"Movie {process_number}-{thread_number}-{number}"
+                for process_number in range(PROCESSES)
+                for thread_number in range(THREADS)
+                for number in range(MUTATIONS)}
+    assert len(movies) == len(expected)
+    assert {movie['name'] for movie in movies.values()} == expected
+    assert sorted(movies, key=int) == [str(movie_id) for movie_id in
+                                      range(1, len(expected) + 1)]
+    if kind.startswith('csv'):
+        assert len(read_csv_file(path)["1"]["movies"]) == len(expected)
+    elif kind == 'json':
+        assert len(read_json_file(path)["1"]["movies"]) == len(expected)
@@ -1,5 +1,7 @@
 import pytest
 import json
+import data_management.JSONDataManager as json_data_manager_module
+from data_management.CollectionQuery import CollectionQuery
 from data_management.JSONDataManager import JSONDataManager
 
 # Test data
@@ -70,7 +72,7 @@ def test_add_user(json_data_manager):
     assert users["3"] == new_user
 
 
-def test_add_movie(json_data_manager):
+def test_add_movie(json_data_manager, omdb_stub):
     user_id = "1"
     movie_title = "Titanic"
     json_data_manager.add_movie(user_id, movie_title)
@@ -105,5 +107,269 @@ def test_delete_movie(json_data_manager):
     assert movie_id not in movies
 
 
+# Fixture to initialize JSONDataManager in cached mode
+@pytest.fixture
+def cached_json_data_manager(tmpdir):
+    json_file = tmpdir.join("test_cached.json")
+    json_file.write_text(json.dumps(USER_DATA), encoding='utf-8')
+
+    data_manager = JSONDataManager(str(json_file), cached=True)
+
+    yield data_manager
+
+    json_file.remove()
+
+
+def test_cached_reads_parse_once(cached_json_data_manager, monkeypatch):
+    calls = []
+    original_read = json_data_manager_module.read_json_file
+
+    def counting_read(file_path):
+        calls.append(file_path)
+        return original_read(file_path)
+
+    monkeypatch.setattr(json_data_manager_module, "read_json_file",
+                        counting_read)
+    movies = cached_json_data_manager.get_user_movies("1")
+    for _ in range(5):
+        assert cached_json_data_manager.get_all_users() == USER_DATA
+        # Users are parsed from the file's memory map, never json.load
+        assert cached_json_data_manager.get_user_movies("1") == movies
+    assert movies == USER_DATA["1"]["movies"]
+    assert calls == []
+
+
+def test_cached_reads_return_copies(cached_json_data_manager):
+    users = cached_json_data_manager.get_all_users()
+    with pytest.raises(TypeError):
+        users["9"] = {"name": "Intruder", "movies": {}}
+    users["1"]["name"] = "Changed"
+    cached_json_data_manager.get_user_movies("1").clear()
+    page, _ = cached_json_data_manager.get_users_page()
+    page["1"]["movies"].clear()
+    assert cached_json_data_manager.get_all_users() == USER_DATA
+
+
+def test_cached_write_through(cached_json_data_manager):
+    cached_json_data_manager.update_movie("2", "1", "Updated Movie",
+                                          "Updated Director", 9.0, "2022")
+    with open(cached_json_data_manager.filename) as file:
+        on_disk = json.load(file)
+    assert on_disk["2"]["movies"]["1"]["name"] == "Updated Movie"
+    assert cached_json_data_manager.get_user_movies("2") == \
+        on_disk["2"]["movies"]
+
+
+def test_cached_invalidated_by_external_write(cached_json_data_manager):
+    assert cached_json_data_manager.get_all_users() == USER_DATA
+    # Simulate another process rewriting the file
+    external_data = {"7": {"name": "External", "movies": {}}}
+    with open(cached_json_data_manager.filename, 'w') as file:
+        json.dump(external_data, file, indent=4)
+    assert cached_json_data_manager.get_all_users() == external_data
+
+
+@pytest.mark.parametrize("indent", [None, 4])
+@pytest.mark.parametrize("chunk_size", [3, 1024 * 1024])
+def test_cached_reads_use_file_index(tmpdir, monkeypatch, indent, chunk_size):
+    # Compact files are scanned a chunk at a time, indent=4 ones by key
+    monkeypatch.setattr(json_data_manager_module, "SCAN_CHUNK_SIZE",
+                        chunk_size)
+    users = {**USER_DATA,
+             "3": {"name": "Zoë \"Z\"\n", "movies": {"1": {
+                 "name": "}{,", "director": None, "rating": 0,
+                 "year": "2000"}}},
+             "a\"b\u00e9": {"name": "Escaped key", "movies": {}}}
+    json_file = tmpdir.join("test_index.json")
+    json_file.write_text(json.dumps(users, indent=indent), encoding='utf-8')
+    data_manager = JSONDataManager(str(json_file), cached=True)
+
+    assert dict(data_manager.get_all_users()) == users
+    assert list(data_manager.get_all_users()) == list(users)
+    assert data_manager.get_user_movies("3") == users["3"]["movies"]
+    assert data_manager.get_user_movies("a\"b\u00e9") == {}
+    assert data_manager.get_user_movies("4") is None
+
+
+def test_scan_users_window_stays_small(monkeypatch):
+    monkeypatch.setattr(json_data_manager_module, "SCAN_CHUNK_SIZE", 64)
+    users = {str(user_id): {"name": f"User {user_id}", "movies": {
+        "1": {"name": "Movie", "year": "2000"}}} for user_id in range(200)}
+    document = json.dumps(users).encode('utf-8')
+    slices = []
+
+    class RecordingBuffer(bytes):
+        def __getitem__(self, key):
+            slices.append(len(range(*key.indices(len(self)))))
+            return super().__getitem__(key)
+
+    spans = {user_id: document[start:end] for user_id, start, end
+             in json_data_manager_module.scan_users(
+                 RecordingBuffer(document))}
+    assert {user_id: json.loads(data) for user_id, data in spans.items()} \
+        == users
+    # Windows follow the values instead of growing with the document
+    largest = max(len(json.dumps(user)) for user in users.values())
+    assert max(slices) <= max(64, 2 * largest)
+
+
+def test_cached_index_follows_writes(cached_json_data_manager):
+    users = cached_json_data_manager.get_all_users()
+    assert users["1"] == USER_DATA["1"]
+    # Simulate another process rewriting the file
+    external_data = {"2": {"name": "Jane (new)", "movies": {}},
+                     "7": {"name": "External", "movies": {}}}
+    with open(cached_json_data_manager.filename, 'w') as file:
+        json.dump(external_data, file, indent=4)
+    assert cached_json_data_manager.get_user_movies("1") is None
+    assert cached_json_data_manager.get_user_movies("7") == {}
+    # The old version's mapping was closed: a user not read from it yet is
+    # read from the current file
+    assert users["1"] == USER_DATA["1"]
+    assert users["2"] == external_data["2"]
+    cached_json_data_manager.close()
+
+
+def test_cached_index_of_malformed_file(cached_json_data_manager, capsys):
+    with open(cached_json_data_manager.filename, 'w') as file:
+        file.write('{"1": {"name": "John"')
+    assert cached_json_data_manager.get_all_users() is None
+    assert "Error decoding JSON file" in capsys.readouterr().out
+
+
+# Fixture to initialize JSONDataManager in journal mode
+@pytest.fixture
+def journal_json_data_manager(tmpdir):
+    json_file = tmpdir.join("test_journal.json")
+    json_file.write_text(json.dumps(USER_DATA), encoding='utf-8')
+
+    data_manager = JSONDataManager(str(json_file), journal=True,
+                                   compact_threshold=5)
+
+    yield data_manager
+
+
+def test_journal_appends_instead_of_rewriting(journal_json_data_manager):
+    journal_json_data_manager.update_movie("1", "1", "Updated Movie",
+                                           "Updated Director", 9.0, "2022")
+    journal_json_data_manager.delete_movie("2", "1")
+    # The snapshot is untouched; the changes live in the journal
+    with open(journal_json_data_manager.filename) as file:
+        assert json.load(file) == USER_DATA
+    with open(journal_json_data_manager.journal_filename) as file:
+        assert len(file.readlines()) == 2
+
+    # A fresh manager replays the journal over the snapshot
+    replayed = JSONDataManager(journal_json_data_manager.filename,
+                               journal=True)
+    assert replayed.get_user_movies("1")["1"]["name"] == "Updated Movie"
+    assert replayed.get_user_movies("2") == {}
+
+
+def test_journal_ignores_torn_record(journal_json_data_manager):
+    journal_json_data_manager.delete_movie("1", "2")
+    with open(journal_json_data_manager.journal_filename, 'a') as file:
+        file.write('{"op":"delete_movie","user_id":"1","mov')
+
+    replayed = JSONDataManager(journal_json_data_manager.filename,
+                               journal=True)
+    assert list(replayed.get_user_movies("1")) == ["1"]
+    replayed.add_user({"name": "New User", "movies": {}})
+
+    again = JSONDataManager(journal_json_data_manager.filename, journal=True)
+    assert again.get_all_users()["3"] == {"name": "New User", "movies": {}}
+    assert list(again.get_user_movies("1")) == ["1"]
+
+
+def test_journal_compaction(journal_json_data_manager):
+    for index in range(5):
+        journal_json_data_manager.update_movie("1", "1", f"Movie {index}",
+                                               "Director", 5.0, "2000")
+    # The fifth record reached the threshold and triggered a compaction
+    with open(journal_json_data_manager.journal_filename) as file:
+        assert file.read() == ""
+    with open(journal_json_data_manager.filename) as file:
+        assert json.load(file)["1"]["movies"]["1"]["name"] == "Movie 4"
+    assert journal_json_data_manager.get_user_movies("1")["1"]["name"] == \
+        "Movie 4"
+
+
+@pytest.mark.parametrize("journal", [False, True])
+def test_get_user_by_email(tmpdir, journal):
+    json_file = tmpdir.join("test.json")
+    json_file.write_text(json.dumps({
+        "1": {"name": "John", "email": "john@example.com",
+              "password": "hash1", "movies": {}}}), encoding='utf-8')
+    data_manager = JSONDataManager(str(json_file), journal=journal)
+
+    assert data_manager.get_user_by_email("john@example.com") == {
+        "id": "1", "name": "John", "email": "john@example.com",
+        "password": "hash1"}
+    assert data_manager.get_user_by_email("jane@example.com") is None
+
+    data_manager.add_user({"name": "Jane", "email": "jane@example.com",
+                           "password": "hash2", "movies": {}})
+    assert data_manager.get_user_by_email("jane@example.com")["id"] == "2"
+
+
+@pytest.mark.parametrize("journal", [False, True])
+def test_update_password(tmpdir, journal):
+    json_file = tmpdir.join("test.json")
+    json_file.write_text(json.dumps({
+        "1": {"name": "John", "email": "john@example.com",
+              "password": "hash1", "movies": {}}}), encoding='utf-8')
+    data_manager = JSONDataManager(str(json_file), journal=journal)
+
+    data_manager.update_password("1", "new hash")
+    assert data_manager.get_user_by_email("john@example.com")["password"] == \
+        "new hash"
+    # Persisted (replayed from the journal in journal mode)
+    assert JSONDataManager(str(json_file), journal=journal).get_user_by_email(
+        "john@example.com")["password"] == "new hash"
+
+
+def test_get_users_page(json_data_manager):
+    users, next_cursor = json_data_manager.get_users_page(limit=1)
+    assert users == {"1": USER_DATA["1"]}
+    assert next_cursor == 1
+    users, next_cursor = json_data_manager.get_users_page(after=1, limit=1)
+    assert users == {"2": USER_DATA["2"]}
+    assert next_cursor is None
+
+
+def test_search(json_data_manager):
+    movies, next_offset = json_data_manager.search_movies("mov")
+    assert len(movies) == 3
+    assert next_offset is None
+    movies, _ = json_data_manager.search_movies("director 3")
+    assert movies == [{"user_id": "2", "movie_id": "1",
+                       **USER_DATA["2"]["movies"]["1"]}]
+    movies, next_offset = json_data_manager.search_movies("movie", user_id="1",
+                                                          limit=1)
+    assert len(movies) == 1 and movies[0]["user_id"] == "1"
+    assert next_offset == 1
+
+    users, _ = json_data_manager.search_users("ja")
+    assert users == {"2": USER_DATA["2"]}
+
+
+def test_get_collection_page(json_data_manager):
+    movies, next_cursor = json_data_manager.get_collection_page(
+        "1", CollectionQuery(sort="rating", descending=True, limit=1))
+    assert list(movies) == ["2"]
+    movies, next_cursor = json_data_manager.get_collection_page(
+        "1", CollectionQuery(sort="rating", descending=True, limit=1,
+                             after=next_cursor))
+    assert list(movies) == ["1"]
+    assert next_cursor is None
+    movies, _ = json_data_manager.get_collection_page(
+        "1", CollectionQuery(year_to=2019))
+    assert movies == {"2": USER_DATA["1"]["movies"]["2"]}
+    # JSON files store no genres
+    with pytest.raises(ValueError):
+        json_data_manager.get_collection_page(
+            "1", CollectionQuery(genre="Drama"))
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,78 @@
+import pytest
+import data_management.OMDbCache as omdb_cache_module
+from data_management.OMDbCache import OMDbCache
+from data_management.OMDbClient import OMDbClient
+from omdb_stub import NOT_FOUND, OMDbStubServer, make_movie
+
+TITANIC = make_movie("Titanic", imdbID="tt0120338")
+
+
+# Fixture to create an OMDb cache in a temporary SQLite file
+@pytest.fixture
+def omdb_cache(tmpdir):
+    yield OMDbCache(str(tmpdir.join("omdb_cache.sqlite")), max_entries=4)
+
+
+def test_hit_and_miss(omdb_cache):
+    assert omdb_cache.get("titanic") is None
+    omdb_cache.put("titanic", TITANIC)
+    assert omdb_cache.get("  TITANIC ") == TITANIC
+    assert omdb_cache.get_by_imdb_id("tt0120338") == TITANIC
+    stats = omdb_cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+
+def test_canonical_title_alias(omdb_cache):
+    matrix = make_movie("The Matrix")
+    omdb_cache.put("matrix", matrix)
+    assert omdb_cache.get("matrix") == matrix
+    assert omdb_cache.get("The Matrix") == matrix
+
+
+def test_negative_caching(omdb_cache):
+    omdb_cache.put("No Such Movie", NOT_FOUND)
+    assert omdb_cache.get("no such movie") == NOT_FOUND
+    assert omdb_cache.stats()["negative_hits"] == 1
+
+    # Other errors, e.g. rate limiting, are not cached
+    omdb_cache.put("Busy", {"Response": "False",
+                            "Error": "Request limit reached!"})
+    assert omdb_cache.get("Busy") is None
+
+
+def test_ttl_expiry(omdb_cache, monkeypatch):
+    omdb_cache.put("Titanic", TITANIC)
+    now = omdb_cache_module.time.time()
+    monkeypatch.setattr(omdb_cache_module.time, "time",
+                        lambda: now + omdb_cache.ttl + 1)
+    assert omdb_cache.get("Titanic") is None
+    assert omdb_cache.stats()["expired"] == 1
+
+
+def test_lru_eviction(omdb_cache, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(omdb_cache_module.time, "time", lambda: clock[0])
+    for index in range(4):
+        clock[0] += 1
+        omdb_cache.put(f"movie {index}", make_movie(f"Movie {index}"))
+    # Touch the oldest entry so it becomes the most recently used
+    clock[0] += 1
+    assert omdb_cache.get("movie 0") is not None
+
+    clock[0] += 1
+    omdb_cache.put("movie 4", make_movie("Movie 4"))
+    assert omdb_cache.get("movie 1") is None
+    assert omdb_cache.get("movie 0") is not None
+    assert omdb_cache.stats()["evictions"] == 1
+
+
+def test_client_consults_cache(omdb_cache):
+    server = OMDbStubServer().start()
+    try:
+        client = OMDbClient(base_url=server.url, cache=omdb_cache)
+        for title in ("Titanic", "titanic", "No Such Movie", "no such movie"):
+            client.fetch_movie(title)
+        assert server.total_requests == 2
+    finally:
+        server.stop()
@@ -0,0 +1,59 @@
+import threading
+import pytest
+import requests
+from data_management.OMDbClient import OMDbClient
+from omdb_stub import OMDbStubServer
+
+
+# Fixture to run the OMDb stub server with a small artificial delay
+@pytest.fixture
+def omdb_stub():
+    server = OMDbStubServer(delay=0.2).start()
+
+    yield server
+
+    server.stop()
+
+
+def test_fetch_movie(omdb_stub):
+    client = OMDbClient(base_url=omdb_stub.url)
+    movie = client.fetch_movie("titanic")
+    assert movie["Title"] == "Titanic"
+    assert movie["Response"] == "True"
+
+
+def test_fetch_movie_not_found(omdb_stub):
+    client = OMDbClient(base_url=omdb_stub.url)
+    assert client.fetch_movie("No Such Movie")["Response"] == "False"
+
+
+def test_concurrent_fetches_are_coalesced(omdb_stub):
+    client = OMDbClient(base_url=omdb_stub.url)
+    results = []
+
+    def fetch(title):
+        results.append(client.fetch_movie(title))
+
+    threads = [threading.Thread(target=fetch, args=(title,))
+               for title in ["Titanic", "titanic ", "TITANIC"] * 4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 12
+    assert all(movie["Title"] == "Titanic" for movie in results)
+    assert omdb_stub.total_requests == 1
+
+
+def test_submit_runs_in_background(omdb_stub):
+    client = OMDbClient(base_url=omdb_stub.url)
+    futures = [client.submit(title) for title in ("Titanic", "Gladiator")]
+    assert [future.result()["Title"] for future in futures] == \
+        ["Titanic", "Gladiator"]
+
+
+def test_timeout(omdb_stub):
+    client = OMDbClient(base_url=omdb_stub.url, timeout=(1, 0.05))
+    with pytest.raises(requests.exceptions.Timeout):
+        client.fetch_movie("Titanic")
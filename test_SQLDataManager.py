@@ -0,0 +1,371 @@
+import io
+import json
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from data_management.CollectionQuery import CollectionQuery
+from data_management.SQLiteTuning import retry_on_locked
+from data_management.SQL_Data_Models import db, Movies, User, UserMovies
+from omdb_stub import make_movie
+
+
+def test_movie_facets(sql_app, omdb_stub):
+    data_manager = sql_app.data_manager
+    omdb_stub.movies["breaking bad"] = make_movie(
+        "Breaking Bad", Year="2008–2013", imdbRating="N/A",
+        Genre="Crime, Drama, Thriller", Actors="Bryan Cranston, Aaron Paul")
+    data_manager.add_movie(1, "Titanic")
+    data_manager.add_movie(1, "Breaking Bad")
+    # Bulk inserts link their facets too
+    data_manager.bulk_add_movies(1, ["The Matrix", "Gladiator"])
+
+    show = Movies.query.filter_by(title="Breaking Bad").one()
+    assert (show.release_year, show.end_year, show.imdb_rating) == \
+        (2008, 2013, None)
+    assert data_manager.movie_facets(show.movie_id) == {
+        'genre': ['Crime', 'Drama', 'Thriller'],
+        'actor': ['Aaron Paul', 'Bryan Cranston'],
+        'director': ['Stub Director']}
+
+    movies, next_offset = data_manager.filter_movies(
+        director="lana wachowski")
+    assert [movie.title for movie in movies] == ["The Matrix"]
+    # Best rated first; Breaking Bad has no rating and comes last
+    movies, next_offset = data_manager.filter_movies(genre="Drama",
+                                                     year_from=1998, limit=2)
+    assert [movie.title for movie in movies] == ["The Matrix", "Gladiator"]
+    assert next_offset == 2
+    movies, next_offset = data_manager.filter_movies(
+        genre="Drama", year_from=1998, offset=2)
+    assert [movie.title for movie in movies] == ["Breaking Bad"]
+    assert next_offset is None
+
+    assert data_manager.facet_counts('genre') == [
+        ('Drama', 4), ('Crime', 1), ('Thriller', 1)]
+    assert data_manager.facet_counts('actor', genre='crime') == [
+        ('Aaron Paul', 1), ('Bryan Cranston', 1)]
+    assert data_manager.facet_counts('director', user_id=2) == []
+    with pytest.raises(ValueError):
+        data_manager.facet_counts('writer')
+
+
+def test_bulk_add_movies(sql_app):
+    data_manager = sql_app.data_manager
+    data_manager.add_movie(1, "Titanic")
+    results = data_manager.bulk_add_movies(
+        1, ["titanic", "Gladiator", "GLADIATOR", "The Matrix",
+            "No Such Movie"])
+
+    statuses = {result["title"]: result["status"] for result in results}
+    assert statuses == {"titanic": "already_in_collection",
+                        "Gladiator": "added",
+                        "The Matrix": "added",
+                        "No Such Movie": "not_found"}
+    assert Movies.query.count() == 3
+    assert UserMovies.query.filter_by(user_id=1).count() == 3
+
+
+def test_bulk_import_endpoint(sql_app):
+    client = sql_app.test_client()
+    response = client.post('/api/users/1/movies/bulk',
+                           json={"titles": ["Titanic", "Gladiator"]})
+    assert response.status_code == 200
+    assert response.get_json()["summary"] == {"added": 2}
+
+    upload = io.BytesIO(b"title\nGladiator\nThe Matrix\n")
+    response = client.post('/api/users/1/movies/bulk',
+                           data={"file": (upload, "watchlist.csv")},
+                           content_type='multipart/form-data')
+    assert response.get_json()["summary"] == {"already_in_collection": 1,
+                                              "added": 1}
+
+    # Malformed bodies and import files
+    for body in (["Titanic"], 5, "Titanic", {"titles": "Titanic"}):
+        response = client.post('/api/users/1/movies/bulk', json=body)
+        assert response.get_json() == {"message": "Expected a list of titles."}
+    for content in (b"5", b'{"titles": 5}', b'[1, 2]'):
+        response = client.post('/api/users/1/movies/bulk',
+                               data={"file": (io.BytesIO(content),
+                                              "watchlist.json")},
+                               content_type='multipart/form-data')
+        assert response.status_code == 400
+        assert response.get_json()["message"].startswith(
+            "Invalid import file")
+
+    for max_workers in ("abc", None, 0, -2, 1.5, True):
+        response = client.post('/api/users/1/movies/bulk', json={
+            "titles": ["Titanic"], "max_workers": max_workers})
+        assert response.status_code == 400
+    response = client.post('/api/users/1/movies/bulk',
+                           data={"file": (io.BytesIO(b"Titanic\n"),
+                                          "watchlist.txt"),
+                                 "max_workers": "many"},
+                           content_type='multipart/form-data')
+    assert response.get_json() == {
+        "message": "max_workers must be a positive integer."}
+    # Clamped, not rejected
+    response = client.post('/api/users/1/movies/bulk', json={
+        "titles": ["Titanic"], "max_workers": 1000})
+    assert response.get_json()["summary"] == {"already_in_collection": 1}
+
+    upload = io.BytesIO(json.dumps(["Titanic"]).encode())
+    response = client.post('/api/users/2/movies/bulk',
+                           data={"file": (upload, "watchlist.json")},
+                           content_type='multipart/form-data')
+    assert response.status_code == 404
+    assert User.query.count() == 1
+
+
+def test_sqlite_profile_applied(sql_app):
+    connection = db.session.connection()
+    assert connection.exec_driver_sql(
+        "PRAGMA journal_mode").scalar() == "wal"
+    assert connection.exec_driver_sql(
+        "PRAGMA busy_timeout").scalar() == 5000
+    assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+
+
+def test_retry_on_locked(sql_app):
+    calls = []
+
+    @retry_on_locked(attempts=3, base_delay=0)
+    def write():
+        calls.append(1)
+        if len(calls) < 3:
+            raise OperationalError("INSERT", {}, Exception(
+                "database is locked"))
+        return "done"
+
+    assert write() == "done"
+    assert len(calls) == 3
+
+
+def test_get_user_by_email(sql_app):
+    data_manager = sql_app.data_manager
+    assert data_manager.get_user_by_email("john@example.com") == {
+        "id": 1, "name": "John", "email": "john@example.com",
+        "password": "hash"}
+    assert data_manager.get_user_by_email("jane@example.com") is None
+
+    data_manager.update_password(1, "new hash")
+    assert data_manager.get_user_by_email("john@example.com")["password"] == \
+        "new hash"
+
+
+def test_users_pagination(sql_app):
+    data_manager = sql_app.data_manager
+    for index in range(4):
+        data_manager.add_user(f"User {index}", f"user{index}@example.com",
+                              "hash")
+    users, next_cursor = data_manager.get_users_page(limit=2)
+    assert [user.id for user in users] == [1, 2]
+    assert next_cursor == 2
+    users, next_cursor = data_manager.get_users_page(after=4, limit=2)
+    assert [user.id for user in users] == [5]
+    assert next_cursor is None
+
+    client = sql_app.test_client()
+    response = client.get('/api/users?limit=3')
+    assert [user["id"] for user in response.get_json()] == [1, 2, 3]
+    assert response.headers['X-Next-Cursor'] == "3"
+    response = client.get(response.headers['Link'][1:].split('>')[0])
+    assert [user["id"] for user in response.get_json()] == [4, 5]
+    assert 'Link' not in response.headers
+    assert client.get('/api/users?after=x').status_code == 400
+
+    response = client.get('/api/users/export')
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [1, 2, 3, 4, 5]
+
+
+def test_search(sql_app):
+    data_manager = sql_app.data_manager
+    data_manager.add_user("Jane Doe", "jane@example.com", "hash")
+    data_manager.bulk_add_movies(1, ["Titanic", "The Matrix", "Gladiator"])
+    data_manager.add_movie(2, "Gladiator")
+    gladiator = Movies.query.filter_by(title="Gladiator").first()
+    data_manager.add_review(2, gladiator.movie_id, 9, "Better than titanic")
+
+    # Prefix matching; a title match outranks a match in a review
+    movies, next_offset = data_manager.search_movies("titan")
+    assert [movie.title for movie in movies] == ["Titanic", "Gladiator"]
+    assert next_offset is None
+    movies, next_offset = data_manager.search_movies("titan", limit=1)
+    assert [movie.title for movie in movies] == ["Titanic"]
+    assert next_offset == 1
+    movies, _ = data_manager.search_movies("titan", user_id=2)
+    assert [movie.title for movie in movies] == ["Gladiator"]
+    movies, _ = data_manager.search_movies("ridley")
+    assert [movie.title for movie in movies] == ["Gladiator"]
+    assert data_manager.search_movies('" OR *') == ([], None)
+
+    users, _ = data_manager.search_users("jan")
+    assert [user.name for user in users] == ["Jane Doe"]
+
+    client = sql_app.test_client()
+    response = client.get('/api/search/movies?q=matr')
+    assert [movie["title"] for movie in response.get_json()["results"]] == \
+        ["The Matrix"]
+    response = client.get('/api/search/users?q=john')
+    assert response.get_json() == {
+        "results": [{"id": 1, "name": "John", "email": "john@example.com"}],
+        "next_offset": None}
+    assert client.get('/api/search/reviews?q=x').status_code == 404
+
+
+def test_collection_page(sql_app):
+    data_manager = sql_app.data_manager
+    data_manager.bulk_add_movies(1, ["Gladiator", "Titanic", "The Matrix"])
+    db.session.expire_all()
+
+    rows, next_cursor = data_manager.get_collection_page(
+        1, CollectionQuery(sort='rating', descending=True, limit=2))
+    assert [movie.title for _, movie in rows] == ["The Matrix", "Gladiator"]
+    # Only the columns the list renders are loaded
+    assert 'plot' not in vars(rows[0][1])
+    rows, next_cursor = data_manager.get_collection_page(
+        1, CollectionQuery(sort='rating', descending=True, limit=2,
+                           after=next_cursor))
+    assert [movie.title for _, movie in rows] == ["Titanic"]
+    assert next_cursor is None
+
+    rows, _ = data_manager.get_collection_page(
+        1, CollectionQuery(year_from=1998, min_rating=8.6))
+    assert [movie.title for _, movie in rows] == ["The Matrix"]
+    rows, _ = data_manager.get_collection_page(1, CollectionQuery())
+    assert [movie.title for _, movie in rows] == \
+        ["Gladiator", "Titanic", "The Matrix"]
+
+    client = sql_app.test_client()
+    response = client.get('/api/users/1/movies?sort=year&limit=2')
+    assert response.get_json() == [
+        {"movie_id": 2, "title": "Titanic", "year": 1997, "rating": 7.9,
+         "director": "James Cameron", "poster": "N/A"},
+        {"movie_id": 3, "title": "The Matrix", "year": 1999, "rating": 8.7,
+         "director": "Lana Wachowski, Lilly Wachowski", "poster": "N/A"}]
+    response = client.get(response.headers['Link'][1:].split('>')[0])
+    assert [movie["title"] for movie in response.get_json()] == ["Gladiator"]
+    response = client.get('/api/users/1/movies?fields=title,plot&genre=drama')
+    assert response.get_json()[0] == {"movie_id": 1, "title": "Gladiator",
+                                      "plot": "Plot of Gladiator."}
+    assert len(client.get('/api/users/1/movies?fields=all').get_json()[0]) \
+        == len(Movies.__table__.columns)
+    assert client.get('/api/users/1/movies?fields=secret').status_code == 400
+    assert client.get('/api/users/1/movies?sort=plot').status_code == 400
+
+
+def collection_titles(data_manager, **query):
+    # Every page of a collection, one movie at a time
+    titles, cursor = [], None
+    while True:
+        rows, cursor = data_manager.get_collection_page(
+            1, CollectionQuery(limit=1, after=cursor, **query))
+        titles += [movie.title for _, movie in rows]
+        if cursor is None:
+            return titles
+
+
+def test_collection_sorts_on_typed_columns(sql_app, omdb_stub):
+    data_manager = sql_app.data_manager
+    omdb_stub.movies["breaking bad"] = make_movie(
+        "Breaking Bad", Year="2008–2013", imdbRating="N/A")
+    omdb_stub.movies["unrated"] = make_movie(
+        "Unrated", Year="N/A", imdbRating="N/A")
+    data_manager.bulk_add_movies(1, ["Unrated", "Titanic", "Breaking Bad",
+                                     "The Matrix"])
+    db.session.expire_all()
+
+    # Ranges sort on their first year; movies without a value come last,
+    # in both directions
+    assert collection_titles(data_manager, sort='year') == \
+        ["Titanic", "The Matrix", "Breaking Bad", "Unrated"]
+    assert collection_titles(data_manager, sort='year', descending=True) == \
+        ["Breaking Bad", "The Matrix", "Titanic", "Unrated"]
+    assert collection_titles(data_manager, sort='rating', descending=True) \
+        == ["The Matrix", "Titanic", "Breaking Bad", "Unrated"]
+    assert collection_titles(data_manager, sort='rating') == \
+        ["Titanic", "The Matrix", "Unrated", "Breaking Bad"]
+
+
+def test_movie_reviews(sql_app):
+    data_manager = sql_app.data_manager
+    data_manager.add_user("Jane", "jane@example.com", "hash")
+    data_manager.add_movie(1, "Titanic")
+    movie_id = Movies.query.filter_by(title="Titanic").first().movie_id
+    for index in range(5):
+        data_manager.add_review(1 + index % 2, movie_id, index + 5,
+                                f"Review {index}")
+    db.session.expunge_all()
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count_statement)
+    try:
+        details = data_manager.get_movie_reviews(1, movie_id, limit=2)
+        names = [review.user.name for review in details['reviews']]
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+    # Details and aggregates in one query, the page and its authors in another
+    assert len(statements) == 2
+    assert names == ["John", "Jane"]
+    assert [review.review_text for review in details['reviews']] == \
+        ["Review 4", "Review 3"]
+    assert details['movie'].title == "Titanic"
+    assert details['user_name'] == "John"
+    assert details['review_count'] == 5
+    assert details['average_rating'] == 7.0
+
+    details = data_manager.get_movie_reviews(1, movie_id, after=details[
+        'next_cursor'], limit=2)
+    assert [review.review_text for review in details['reviews']] == \
+        ["Review 2", "Review 1"]
+    details = data_manager.get_movie_reviews(1, movie_id, after=details[
+        'next_cursor'], limit=2)
+    assert [review.review_text for review in details['reviews']] == \
+        ["Review 0"]
+    assert details['next_cursor'] is None
+
+    # Jane does not have the movie in her collection
+    assert data_manager.get_movie_reviews(2, movie_id) is None
+
+
+def test_leaderboards(sql_app):
+    data_manager = sql_app.data_manager
+    data_manager.add_user("Jane", "jane@example.com", "hash")
+    data_manager.bulk_add_movies(1, ["Titanic", "The Matrix", "Gladiator"])
+    data_manager.bulk_add_movies(2, ["The Matrix", "Gladiator"])
+    ids = {movie.title: movie.movie_id for movie in Movies.query}
+    data_manager.add_review(1, ids["Titanic"], 6.0, "Long")
+    data_manager.add_review(1, ids["The Matrix"], 9.0, "Great")
+    data_manager.add_review(2, ids["The Matrix"], 8.0, "Good")
+    data_manager.add_review(2, ids["Gladiator"], 8.8, "Epic")
+    data_manager.delete_movie(1, ids["Gladiator"])
+
+    client = sql_app.test_client()
+    response = client.get('/api/movies/top-rated')
+    assert [(movie["title"], movie["average_rating"], movie["rating_count"])
+            for movie in response.get_json()] == [
+        ("Gladiator", 8.8, 1), ("The Matrix", 8.5, 2), ("Titanic", 6.0, 1)]
+    response = client.get('/api/movies/top-rated?min_ratings=2')
+    assert [movie["title"] for movie in response.get_json()] == ["The Matrix"]
+    assert client.get('/api/movies/top-rated?limit=x').status_code == 400
+
+    # Ties are broken by movie id
+    response = client.get('/api/movies/most-favorited')
+    assert [(movie["title"], movie["favorite_count"])
+            for movie in response.get_json()] == [
+        ("The Matrix", 2), ("Titanic", 1), ("Gladiator", 1)]
+
+    response = client.get(f'/api/movies/{ids["The Matrix"]}/ratings')
+    stats = response.get_json()
+    assert (stats["rating_count"], stats["average_rating"]) == (2, 8.5)
+    assert stats["histogram"]["8"] == 1 and stats["histogram"]["9"] == 1
+    assert client.get('/api/movies/999/ratings').status_code == 404
+
+    # The review page reads the same precomputed row
+    details = data_manager.get_movie_reviews(1, ids["The Matrix"])
+    assert (details["review_count"], details["average_rating"]) == (2, 8.5)
@@ -0,0 +1,128 @@
+import os
+import sys
+import pytest
+from flask import Flask, render_template_string
+import data_management.SQLDataManager as sql_data_manager_module
+from data_management.JSONDataManager import JSONDataManager
+from data_management.OMDbClient import OMDbClient
+from data_management.SQLDataManager import SQLiteDataManager
+from instrumentation import instrumentation, metrics
+from omdb_stub import OMDbStubServer
+
+
+# Fixture to create an instrumented app with an empty SQLite database
+@pytest.fixture
+def instrumented_app(tmpdir, monkeypatch):
+    server = OMDbStubServer().start()
+    client = OMDbClient(base_url=server.url)
+    monkeypatch.setattr(sql_data_manager_module, "omdb_client", client)
+    monkeypatch.setattr("data_management.OMDbClient.omdb_client", client)
+
+    app = Flask(__name__)
+    app.config.update(PROFILE_DIR=str(tmpdir.join("profiles")),
+                      PROFILE_ENDPOINT=True, PROFILE_TOKEN="secret",
+                      PROFILE_MAX_DUMPS=3)
+    data_manager = SQLiteDataManager(app, str(tmpdir.join("test.sqlite")))
+    data_manager = instrumentation.init_app(app, data_manager, enabled=True)
+
+    @app.route('/users/<int:user_id>/add/<title>')
+    def add(user_id, title):
+        data_manager.add_movie(user_id, title)
+        return render_template_string("{{ title }} added", title=title)
+
+    with app.app_context():
+        data_manager.add_user("John", "john@example.com", "hash")
+    yield app
+
+    instrumentation.enabled = False
+    instrumentation.sample_rate = 0.0
+    server.stop()
+
+
+def test_metrics_endpoint(instrumented_app):
+    client = instrumented_app.test_client()
+    response = client.get('/users/1/add/Titanic')
+    assert response.get_data(as_text=True) == "Titanic added"
+    components = {part.split(';')[0]
+                  for part in response.headers['Server-Timing'].split(', ')}
+    assert {'data', 'sql', 'omdb', 'template', 'total'} <= components
+
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'moviweb_http_request_duration_seconds_count{method="GET",' \
+           'route="/users/<int:user_id>/add/<title>",status="200"} 1' in text
+    assert 'moviweb_data_manager_call_duration_seconds_count{' \
+           'backend="SQLiteDataManager",method="add_movie"}' in text
+    assert 'moviweb_sql_statements_total{operation="INSERT"}' in text
+    assert 'moviweb_omdb_request_duration_seconds_count{status="200"}' in text
+    assert 'moviweb_template_render_duration_seconds_count{' \
+           'template="None"}' in text
+
+
+def test_file_parsing_is_timed(instrumented_app, tmpdir):
+    json_file = tmpdir.join("users.json")
+    json_file.write_text('{"1": {"name": "John", "movies": {}}}',
+                         encoding='utf-8')
+    JSONDataManager(str(json_file)).get_all_users()
+    assert 'moviweb_operation_duration_seconds_count{' \
+           'operation="read_json_file"}' in metrics.render()
+
+
+def test_sampled_profiles(instrumented_app):
+    client = instrumented_app.test_client()
+    headers = {'Authorization': 'Bearer secret'}
+    response = client.post('/debug/profile?sample_rate=1', headers=headers)
+    assert response.get_json()["sample_rate"] == 1.0
+    client.get('/users/1/add/Gladiator')
+    client.post('/debug/profile?sample_rate=0', headers=headers)
+    client.get('/users/1/add/Titanic')
+
+    profile_dir = instrumented_app.config['PROFILE_DIR']
+    names = sorted(os.listdir(profile_dir))
+    # The request that turned profiling off is profiled too
+    assert [name.rsplit('.', 1)[1] for name in names] == \
+        ['json', 'prof', 'json', 'prof']
+    assert client.post('/debug/profile?sample_rate=x',
+                       headers=headers).status_code == 400
+
+    # Only the newest PROFILE_MAX_DUMPS profiles are kept
+    client.post('/debug/profile?sample_rate=1', headers=headers)
+    for _ in range(3):
+        client.get('/users/1/add/Titanic')
+    kept = sorted(os.listdir(profile_dir))
+    assert len(kept) == 6
+    assert not set(names) & set(kept)
+
+
+def test_profiler_stops_when_view_raises(instrumented_app):
+    @instrumented_app.route('/fail')
+    def fail():
+        raise RuntimeError("view failed")
+
+    instrumented_app.testing = True
+    client = instrumented_app.test_client()
+    client.post('/debug/profile?sample_rate=1',
+                headers={'Authorization': 'Bearer secret'})
+    with pytest.raises(RuntimeError):
+        client.get('/fail')
+    assert sys.getprofile() is None
+
+
+def test_profile_endpoint_requires_token(instrumented_app):
+    client = instrumented_app.test_client()
+    assert client.post('/debug/profile?sample_rate=1').status_code == 401
+    assert client.get('/debug/profile', headers={
+        'Authorization': 'Bearer wrong'}).status_code == 401
+    assert instrumentation.sample_rate == 0.0
+
+
+def test_profile_endpoint_is_opt_in():
+    app = Flask(__name__)
+    instrumentation.init_app(app, enabled=True)
+    try:
+        assert app.test_client().get('/debug/profile').status_code == 404
+        app = Flask(__name__)
+        app.config['PROFILE_ENDPOINT'] = True
+        with pytest.raises(ValueError):
+            instrumentation.init_app(app, enabled=True)
+    finally:
+        instrumentation.enabled = False
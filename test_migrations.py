@@ -0,0 +1,258 @@
+import sqlite3
+import pytest
+from flask import Flask
+from data_management.SQLDataManager import SQLiteDataManager, movie_filters
+from data_management.SQL_Data_Models import db, Movies, Reviews, User, UserMovies
+from data_management import migrations
+
+# Schema of databases created before the indexes were added
+OLD_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER NOT NULL, name VARCHAR NOT NULL, email VARCHAR NOT NULL,
+    password VARCHAR NOT NULL, PRIMARY KEY (id));
+CREATE TABLE movies (
+    movie_id INTEGER NOT NULL, title VARCHAR NOT NULL, year INTEGER NOT NULL,
+    rating FLOAT NOT NULL, genre VARCHAR NOT NULL, director VARCHAR NOT NULL,
+    writer VARCHAR NOT NULL, actors VARCHAR NOT NULL, plot VARCHAR NOT NULL,
+    language VARCHAR NOT NULL, country VARCHAR NOT NULL,
+    poster VARCHAR NOT NULL, _type VARCHAR NOT NULL, PRIMARY KEY (movie_id));
+CREATE TABLE favorite_movies (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, movie_id INTEGER NOT NULL,
+    note VARCHAR NOT NULL, PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id),
+    FOREIGN KEY(movie_id) REFERENCES movies (movie_id));
+CREATE TABLE reviews (
+    review_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+    movie_id INTEGER NOT NULL, review_text TEXT, rating FLOAT,
+    PRIMARY KEY (review_id),
+    FOREIGN KEY(user_id) REFERENCES users (id),
+    FOREIGN KEY(movie_id) REFERENCES movies (movie_id));
+INSERT INTO users VALUES (1, 'John', 'john@example.com', 'hash');
+INSERT INTO movies VALUES (1, 'Titanic', 1997, 7.9, 'Drama', 'James Cameron',
+    'James Cameron', 'Leonardo DiCaprio', 'Plot', 'English', 'USA', 'N/A',
+    'movie');
+INSERT INTO favorite_movies VALUES (1, 1, 1, '');
+INSERT INTO favorite_movies VALUES (2, 1, 1, '');
+INSERT INTO reviews VALUES (1, 1, 1, 'Great', 8.5);
+INSERT INTO reviews VALUES (2, 1, 1, 'Too long', 6.0);
+"""
+
+
+def upgrade_schema(connection):
+    migrations.upgrade(connection, batch_size=1, log=lambda message: None)
+
+
+# Fixture to create a database file with the old schema
+@pytest.fixture
+def old_database(tmpdir):
+    path = str(tmpdir.join("old.sqlite"))
+    connection = sqlite3.connect(path)
+    connection.executescript(OLD_SCHEMA)
+    connection.close()
+    yield path
+
+
+def index_names(connection):
+    return {row[0] for row in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def schema(connection):
+    return sorted(connection.execute(
+        "SELECT type, name, tbl_name FROM sqlite_master "
+        "WHERE name NOT LIKE 'sqlite_%'").fetchall())
+
+
+def test_upgrade_schema(old_database):
+    connection = sqlite3.connect(old_database)
+    upgrade_schema(connection)
+    assert migrations.current_version(connection) == \
+        migrations.latest_version()
+    # Re-running an interrupted migration is harmless
+    migrations.set_version(connection, 1)
+    upgrade_schema(connection)
+
+    assert {'ix_users_email', 'ix_movies_title', 'ix_movies_imdb_id',
+            'ux_favorite_movies_user_movie',
+            'ix_reviews_movie_id'} <= index_names(connection)
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(movies)")}
+    assert 'imdb_id' in columns
+    # Existing rows are in the search index
+    assert connection.execute("SELECT rowid FROM movies_fts "
+                              "WHERE movies_fts MATCH 'titan*'").fetchall() \
+        == [(1,)]
+    assert connection.execute(
+        "SELECT id FROM favorite_movies").fetchall() == [(1,)]
+    with pytest.raises(sqlite3.IntegrityError):
+        connection.execute("INSERT INTO favorite_movies VALUES (3, 1, 1, '')")
+    connection.close()
+
+
+def test_upgrade_aggregates_existing_rows(old_database):
+    connection = sqlite3.connect(old_database)
+    upgrade_schema(connection)
+    assert connection.execute(
+        "SELECT movie_id, rating_count, rating_sum, average_rating "
+        "FROM movie_rating_stats").fetchall() == [(1, 2, 14.5, 7.25)]
+    assert connection.execute(
+        "SELECT bucket, count FROM movie_rating_histogram "
+        "ORDER BY bucket").fetchall() == [(6, 1), (8, 1)]
+    # The duplicate favorite was removed before counting
+    assert connection.execute(
+        "SELECT movie_id, favorite_count FROM movie_favorite_counts"
+    ).fetchall() == [(1, 1)]
+
+    # From here on the triggers keep the aggregates up to date
+    connection.execute("UPDATE reviews SET rating = 9.5 WHERE review_id = 2")
+    connection.execute("DELETE FROM reviews WHERE review_id = 1")
+    assert connection.execute(
+        "SELECT rating_count, rating_sum, average_rating "
+        "FROM movie_rating_stats").fetchall() == [(1, 9.5, 9.5)]
+    assert connection.execute(
+        "SELECT bucket, count FROM movie_rating_histogram").fetchall() == \
+        [(9, 1)]
+    connection.execute("DELETE FROM favorite_movies")
+    assert connection.execute(
+        "SELECT * FROM movie_favorite_counts").fetchall() == []
+    connection.close()
+
+
+def test_migration_transaction_holds_write_lock(old_database):
+    connection = sqlite3.connect(old_database)
+    writer = sqlite3.connect(old_database, timeout=0)
+    context = migrations.MigrationContext(connection)
+    with pytest.raises(KeyError):
+        with context.transaction():
+            context.execute("DELETE FROM reviews")
+            # Application writes wait until the block ends
+            with pytest.raises(sqlite3.OperationalError):
+                writer.execute("DELETE FROM favorite_movies")
+            raise KeyError
+    # Rolled back
+    assert connection.execute("SELECT COUNT(*) FROM reviews").fetchone() == \
+        (2,)
+    writer.execute("DELETE FROM favorite_movies")
+    writer.commit()
+    writer.close()
+    connection.close()
+
+
+def test_upgrade_parses_movie_facets(old_database):
+    connection = sqlite3.connect(old_database)
+    connection.execute(
+        "INSERT INTO movies VALUES (2, 'Breaking Bad', '2008–2013', 'N/A', "
+        "'Crime, Drama, Thriller', 'N/A', 'Vince Gilligan', "
+        "'Bryan Cranston, Aaron Paul', 'Plot', 'English', 'USA', 'N/A', "
+        "'series')")
+    connection.commit()
+    upgrade_schema(connection)
+    assert connection.execute(
+        "SELECT movie_id, release_year, end_year, imdb_rating FROM movies "
+        "ORDER BY movie_id").fetchall() == [(1, 1997, None, 7.9),
+                                           (2, 2008, 2013, None)]
+    assert connection.execute(
+        "SELECT genres.name FROM movie_genres "
+        "JOIN genres ON genres.id = movie_genres.genre_id "
+        "WHERE movie_genres.movie_id = 2 ORDER BY genres.name").fetchall() \
+        == [('Crime',), ('Drama',), ('Thriller',)]
+    # Drama is stored once, whatever its case
+    assert connection.execute(
+        "SELECT COUNT(*) FROM genres WHERE name = 'DRAMA'").fetchone() == (1,)
+    assert connection.execute(
+        "SELECT movie_id FROM movie_actors JOIN actors "
+        "ON actors.id = movie_actors.actor_id "
+        "WHERE actors.name = 'Aaron Paul'").fetchall() == [(2,)]
+    # "N/A" is no director
+    assert connection.execute(
+        "SELECT movie_id FROM movie_directors").fetchall() == [(1,)]
+    connection.close()
+
+
+def test_downgrade_and_upgrade(old_database):
+    connection = sqlite3.connect(old_database)
+    upgrade_schema(connection)
+    upgraded = schema(connection)
+
+    migrations.downgrade(connection, 1, log=lambda message: None)
+    assert migrations.current_version(connection) == 1
+    assert 'ix_users_email' not in index_names(connection)
+    assert not connection.execute("SELECT 1 FROM sqlite_master "
+                                  "WHERE name LIKE '%_fts%'").fetchall()
+    assert 'imdb_id' not in {row[1] for row in connection.execute(
+        "PRAGMA table_info(movies)")}
+    assert not connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE tbl_name IN ('movie_rating_stats', "
+        "'movie_rating_histogram', 'movie_favorite_counts') "
+        "OR name LIKE '%_insert'").fetchall()
+
+    upgrade_schema(connection)
+    assert schema(connection) == upgraded
+    connection.close()
+
+
+def test_migrations_match_models(tmpdir):
+    # A fresh database built by the migrations has the same tables and
+    # indexes as one built by SQLAlchemy from the models
+    migrated = sqlite3.connect(str(tmpdir.join("migrated.sqlite")))
+    upgrade_schema(migrated)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = \
+        f'sqlite:///{tmpdir.join("models.sqlite")}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.engine.dispose()
+    from_models = sqlite3.connect(str(tmpdir.join("models.sqlite")))
+
+    assert schema(migrated) == schema(from_models)
+    for table in ('users', 'movies', 'favorite_movies', 'reviews', 'genres',
+                  'movie_genres', 'actors', 'movie_actors', 'directors',
+                  'movie_directors'):
+        query = f"PRAGMA table_info({table})"
+        assert {row[1] for row in migrated.execute(query)} == \
+            {row[1] for row in from_models.execute(query)}
+
+
+def test_upgrade_schema_rejects_duplicate_emails(old_database):
+    connection = sqlite3.connect(old_database)
+    connection.execute("INSERT INTO users VALUES "
+                       "(2, 'Johnny', 'john@example.com', 'hash')")
+    with pytest.raises(ValueError):
+        upgrade_schema(connection)
+    connection.close()
+
+
+def query_plan(query):
+    sql = str(query.statement.compile(dialect=db.engine.dialect,
+                                      compile_kwargs={"literal_binds": True}))
+    rows = db.session.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN " + sql).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize("make_query, index_name", [
+    (lambda: User.query.filter_by(email='john@example.com'), 'ix_users_email'),
+    (lambda: Movies.query.filter_by(title='Titanic'), 'ix_movies_title'),
+    (lambda: Movies.query.filter_by(imdb_id='tt0120338'), 'ix_movies_imdb_id'),
+    (lambda: UserMovies.query.filter_by(user_id=1, movie_id=1),
+     'ux_favorite_movies_user_movie'),
+    (lambda: db.session.query(UserMovies, Movies).
+     join(Movies, UserMovies.movie_id == Movies.movie_id).
+     filter(UserMovies.user_id == 1), 'ux_favorite_movies_user_movie'),
+    (lambda: Reviews.query.filter_by(movie_id=1), 'ix_reviews_movie_id'),
+    (lambda: Movies.query.filter(*movie_filters(actor='Leonardo DiCaprio')),
+     'ix_movie_actors_actor_id'),
+    (lambda: Movies.query.filter(*movie_filters(year_from=1990)),
+     'ix_movies_release_year'),
+])
+def test_lookups_use_indexes(old_database, make_query, index_name):
+    # The data manager upgrades the old database when it starts
+    app = Flask(__name__)
+    SQLiteDataManager(app, old_database)
+    with app.app_context():
+        plan = query_plan(make_query())
+        db.session.remove()
+    assert index_name in plan
+    assert 'SCAN users' not in plan
+    assert 'SCAN favorite_movies' not in plan
@@ -0,0 +1,71 @@
+import multiprocessing
+import threading
+import pytest
+import password_hashing
+from password_hashing import HasherBusy, PasswordHasher, hash_cost
+
+
+def test_hash_and_check_inline():
+    hasher = PasswordHasher(rounds=4, workers=0)
+    pw_hash = hasher.hash("secret")
+    assert hash_cost(pw_hash) == 4
+    assert hasher.check("secret", pw_hash)
+    assert not hasher.check("wrong", pw_hash)
+    assert not hasher.check("secret", "not a bcrypt hash")
+
+
+def test_hash_and_check_in_worker_process():
+    hasher = PasswordHasher(rounds=4, workers=1).start()
+    try:
+        pw_hash = hasher.hash("secret")
+        assert hasher.check("secret", pw_hash)
+    finally:
+        hasher.shutdown()
+    assert hasher.stats()["pending"] == 0
+
+
+def hash_without_shutdown():
+    PasswordHasher(rounds=4, workers=1).hash("secret")
+
+
+def test_child_process_exits_with_pool_running():
+    # The pool is started on the first job and never shut down by the
+    # caller; multiprocessing waits for its workers when the child exits
+    process = multiprocessing.get_context('spawn').Process(
+        target=hash_without_shutdown)
+    process.start()
+    process.join(timeout=60)
+    if process.exitcode is None:
+        process.kill()
+    assert process.exitcode == 0
+
+
+def test_needs_rehash():
+    hasher = PasswordHasher(rounds=5, workers=0)
+    assert hasher.needs_rehash(PasswordHasher(rounds=4, workers=0).hash("pw"))
+    assert not hasher.needs_rehash(hasher.hash("pw"))
+    assert hasher.needs_rehash("plain text")
+
+
+def test_full_queue_is_rejected(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_hash(password, rounds):
+        started.set()
+        release.wait()
+        return "hash", 0.0
+
+    monkeypatch.setattr(password_hashing, "hash_password", slow_hash)
+    hasher = PasswordHasher(rounds=4, workers=0, queue_size=0)
+    worker = threading.Thread(target=hasher.hash, args=("pw",))
+    worker.start()
+    started.wait()
+    try:
+        with pytest.raises(HasherBusy):
+            hasher.hash("pw")
+        assert hasher.stats()["pending"] == 1
+    finally:
+        release.set()
+        worker.join()
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.hash("pw") == "hash"
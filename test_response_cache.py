@@ -0,0 +1,149 @@
+import importlib
+import json
+import sys
+import pytest
+from flask import Flask, jsonify, request
+from response_cache import CacheInvalidatingDataManager, ResponseCache, \
+    SQLiteBackend, user_tag
+
+
+class FakeDataManager:
+    def __init__(self):
+        self.movies = {"1": ["Titanic"], "2": ["Gladiator"]}
+
+    def get_user_movies(self, user_id):
+        return self.movies[user_id]
+
+    def add_movie(self, user_id, movie_title):
+        self.movies[user_id].append(movie_title)
+
+
+def make_app(cache, data_manager):
+    app = Flask(__name__)
+    app.renders = 0
+
+    @app.route('/users/<user_id>/movies')
+    @cache.cached(lambda user_id: [user_tag(user_id)])
+    def movies(user_id):
+        app.renders += 1
+        response = jsonify(data_manager.get_user_movies(user_id))
+        response.headers['X-Next-Cursor'] = request.args.get('after', '')
+        return response
+
+    return app
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache()
+
+
+def test_cached_responses_and_etags(cache):
+    app = make_app(cache, FakeDataManager())
+    client = app.test_client()
+
+    first = client.get('/users/1/movies?after=5')
+    second = client.get('/users/1/movies?after=5')
+    assert first.get_json() == second.get_json() == ["Titanic"]
+    assert second.headers['X-Next-Cursor'] == "5"
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert app.renders == 1
+
+    response = client.get('/users/1/movies?after=5',
+                          headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 304
+    assert response.get_data() == b""
+    assert app.renders == 1
+
+    # Each query string is its own entry
+    client.get('/users/1/movies')
+    assert app.renders == 2
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 2
+    assert cache.stats()['not_modified'] == 1
+    assert cache.stats()['hit_ratio'] == 0.5
+
+
+def test_writes_invalidate_only_the_touched_user(cache):
+    data_manager = CacheInvalidatingDataManager(FakeDataManager(), cache)
+    app = make_app(cache, data_manager)
+    client = app.test_client()
+    etag = client.get('/users/1/movies').headers['ETag']
+    client.get('/users/2/movies')
+
+    data_manager.add_movie("1", "The Matrix")
+    response = client.get('/users/1/movies',
+                          headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json() == ["Titanic", "The Matrix"]
+    client.get('/users/2/movies')
+    assert app.renders == 3
+
+
+# Fixture to import app.py with a JSON data file
+@pytest.fixture
+def json_app(tmpdir, monkeypatch):
+    json_file = tmpdir.join("users.json")
+    json_file.write_text(json.dumps({"1": {
+        "name": "John", "email": "john@example.com", "password": "hash",
+        "movies": {}}}), encoding='utf-8')
+    # app.py picks its data manager when it is imported
+    monkeypatch.setenv('MOVIWEB_DATA_FILE', str(json_file))
+    monkeypatch.delitem(sys.modules, 'app', raising=False)
+    app_module = importlib.import_module('app')
+    app_module.response_cache.clear()
+
+    yield app_module
+
+    app_module.response_cache.clear()
+    sys.modules.pop('app', None)
+
+
+def test_not_found_and_error_pages_are_not_cached(json_app, monkeypatch):
+    client = json_app.app.test_client()
+    assert client.get('/users/2').status_code == 404
+    json_app.data_manager.add_user({"name": "Jane", "movies": {}})
+    response = client.get('/users/2')
+    assert response.status_code == 200
+    assert "Jane" in response.get_data(as_text=True)
+
+    data_manager = json_app.data_manager.data_manager
+    get_collection_page = data_manager.get_collection_page
+    failures = [OSError("disk error")]
+
+    def failing_once(user_id, query):
+        if failures:
+            raise failures.pop()
+        return get_collection_page(user_id, query)
+
+    monkeypatch.setattr(data_manager, "get_collection_page", failing_once)
+    assert client.get('/users/1').status_code == 500
+    response = client.get('/users/1')
+    assert response.status_code == 200
+    assert "John" in response.get_data(as_text=True)
+
+
+def test_sqlite_backend_is_shared_between_workers(tmpdir):
+    path = str(tmpdir.join("responses.sqlite"))
+    data = FakeDataManager()
+    first_cache = ResponseCache(SQLiteBackend(path))
+    second_cache = ResponseCache(SQLiteBackend(path))
+    first_app = make_app(first_cache, data)
+    second_app = make_app(second_cache, data)
+
+    first_app.test_client().get('/users/1/movies')
+    assert second_app.test_client().get(
+        '/users/1/movies').get_json() == ["Titanic"]
+    assert second_app.renders == 0
+
+    # An invalidation in one worker is seen by the other
+    CacheInvalidatingDataManager(data, second_cache).add_movie("1", "Heat")
+    assert first_app.test_client().get(
+        '/users/1/movies').get_json() == ["Titanic", "Heat"]
+    assert first_app.renders == 2
+
+
+def test_genre_filter_is_rejected_on_file_backends(json_app):
+    client = json_app.app.test_client()
+    assert client.get('/users/1?genre=Drama').status_code == 400
+    assert client.get('/users/1').status_code == 200